@@ -12,7 +12,7 @@ from .models import AuditLog
 from .serializers import AdminUserSerializer
 from .models import StaffBoardPermission
 from forum.models import Board
-from .services import staff_allowed_board_ids
+from .services import invalidate_staff_board_perms, staff_allowed_board_ids
 from rbac.permissions import casbin_permission
 
 User = get_user_model()
@@ -468,6 +468,7 @@ class AdminUserBoardPermsView(APIView):
                     for item in cleaned
                 ]
             )
+            invalidate_staff_board_perms(target)
 
         write_audit_log(
             actor=request.user,
@@ -27,3 +27,32 @@ def write_audit_log(
         user_agent=((request.META.get('HTTP_USER_AGENT') or '')[:300] if request is not None else ''),
         metadata=metadata or {},
     )
+
+
+def write_audit_logs(
+    *,
+    actor: Any | None,
+    action: str,
+    target_type: str = '',
+    target_ids: list[str],
+    request=None,
+    metadata: dict[str, Any] | None = None,
+) -> None:
+    """Bulk variant of write_audit_log: one row per target, one INSERT."""
+
+    ip = get_client_ip(request) if request is not None else None
+    user_agent = (request.META.get('HTTP_USER_AGENT') or '')[:300] if request is not None else ''
+    AuditLog.objects.bulk_create(
+        [
+            AuditLog(
+                actor=actor,
+                action=action,
+                target_type=target_type,
+                target_id=target_id,
+                ip=ip,
+                user_agent=user_agent,
+                metadata=dict(metadata or {}),
+            )
+            for target_id in target_ids
+        ]
+    )
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0010_user_banner'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='staff_perms_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
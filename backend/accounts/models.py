@@ -40,6 +40,9 @@ class User(AbstractUser):
 	# - When False: staff users keep legacy behavior (can moderate/delete across all boards).
 	# - When True: staff users can only moderate/delete boards explicitly granted.
 	staff_board_scoped = models.BooleanField(default=False)
+	# Bumped in the same transaction as any StaffBoardPermission change; part of
+	# the cache key, so every worker stops using the old grants on its next request.
+	staff_perms_version = models.PositiveIntegerField(default=0)
 
 	@property
 	def level(self) -> int:
@@ -115,6 +115,8 @@ class MeSerializer(serializers.ModelSerializer):
     downloads_today = serializers.SerializerMethodField()
     downloads_remaining_today = serializers.SerializerMethodField()
     avatar_url = serializers.SerializerMethodField()
+    avatar_srcset = serializers.SerializerMethodField()
+    avatar_meta = serializers.SerializerMethodField()
     pid = serializers.CharField(read_only=True)
     nickname = serializers.CharField(read_only=True)
     bio = serializers.CharField(read_only=True)
@@ -166,6 +168,8 @@ class MeSerializer(serializers.ModelSerializer):
             'username_changes_used',
             'username_changes_limit',
             'avatar_url',
+            'avatar_srcset',
+            'avatar_meta',
             'is_banned',
             'banned_until',
             'ban_reason',
@@ -192,6 +196,12 @@ class MeSerializer(serializers.ModelSerializer):
             return url
         return request.build_absolute_uri(url)
 
+    def get_avatar_srcset(self, obj) -> dict:
+        return _media_srcset(self, obj, 'avatar')
+
+    def get_avatar_meta(self, obj):
+        return _media_meta(self, obj, 'avatar')
+
     def get_downloads_today(self, obj) -> int:
         stat = get_or_create_today_stat(obj)
         return int(stat.count)
@@ -236,6 +246,20 @@ class MeSerializer(serializers.ModelSerializer):
         return int(getattr(stat, 'post_points_earned', 0) or 0)
 
 
+def _media_srcset(serializer, obj, field_name: str) -> dict:
+    # Responsive variants, absolute like the *_url fields (see forum.image_variants).
+    from forum.image_variants import image_srcset
+
+    return image_srcset(serializer, obj, field_name, absolute=True)
+
+
+def _media_meta(serializer, obj, field_name: str):
+    # Dimensions, dominant color and placeholder from ImageAsset; no file access.
+    from forum.image_variants import image_meta
+
+    return image_meta(serializer, obj, field_name)
+
+
 def _build_abs_media_url(request, file_field) -> str:
     if not file_field:
         return ''
@@ -250,7 +274,11 @@ def _build_abs_media_url(request, file_field) -> str:
 
 class PublicUserSerializer(serializers.ModelSerializer):
     avatar_url = serializers.SerializerMethodField()
+    avatar_srcset = serializers.SerializerMethodField()
+    avatar_meta = serializers.SerializerMethodField()
     banner_url = serializers.SerializerMethodField()
+    banner_srcset = serializers.SerializerMethodField()
+    banner_meta = serializers.SerializerMethodField()
     followers_count = serializers.IntegerField(read_only=True)
     following_count = serializers.IntegerField(read_only=True)
     is_following = serializers.BooleanField(read_only=True, required=False, default=False)
@@ -263,7 +291,11 @@ class PublicUserSerializer(serializers.ModelSerializer):
             'nickname',
             'bio',
             'avatar_url',
+            'avatar_srcset',
+            'avatar_meta',
             'banner_url',
+            'banner_srcset',
+            'banner_meta',
             'followers_count',
             'following_count',
             'is_following',
@@ -272,13 +304,29 @@ class PublicUserSerializer(serializers.ModelSerializer):
     def get_avatar_url(self, obj) -> str:
         return _build_abs_media_url(self.context.get('request'), getattr(obj, 'avatar', None))
 
+    def get_avatar_srcset(self, obj) -> dict:
+        return _media_srcset(self, obj, 'avatar')
+
+    def get_avatar_meta(self, obj):
+        return _media_meta(self, obj, 'avatar')
+
     def get_banner_url(self, obj) -> str:
         return _build_abs_media_url(self.context.get('request'), getattr(obj, 'banner', None))
 
+    def get_banner_srcset(self, obj) -> dict:
+        return _media_srcset(self, obj, 'banner')
+
+    def get_banner_meta(self, obj):
+        return _media_meta(self, obj, 'banner')
+
 
 class UserSelfSerializer(serializers.ModelSerializer):
     avatar_url = serializers.SerializerMethodField()
+    avatar_srcset = serializers.SerializerMethodField()
+    avatar_meta = serializers.SerializerMethodField()
     banner_url = serializers.SerializerMethodField()
+    banner_srcset = serializers.SerializerMethodField()
+    banner_meta = serializers.SerializerMethodField()
     followers_count = serializers.IntegerField(read_only=True)
     following_count = serializers.IntegerField(read_only=True)
 
@@ -296,8 +344,12 @@ class UserSelfSerializer(serializers.ModelSerializer):
             'bio',
             'avatar',
             'avatar_url',
+            'avatar_srcset',
+            'avatar_meta',
             'banner',
             'banner_url',
+            'banner_srcset',
+            'banner_meta',
             'followers_count',
             'following_count',
         )
@@ -305,7 +357,11 @@ class UserSelfSerializer(serializers.ModelSerializer):
             'pid',
             'username',
             'avatar_url',
+            'avatar_srcset',
+            'avatar_meta',
             'banner_url',
+            'banner_srcset',
+            'banner_meta',
             'followers_count',
             'following_count',
         )
@@ -313,9 +369,66 @@ class UserSelfSerializer(serializers.ModelSerializer):
     def get_avatar_url(self, obj) -> str:
         return _build_abs_media_url(self.context.get('request'), getattr(obj, 'avatar', None))
 
+    def get_avatar_srcset(self, obj) -> dict:
+        return _media_srcset(self, obj, 'avatar')
+
+    def get_avatar_meta(self, obj):
+        return _media_meta(self, obj, 'avatar')
+
     def get_banner_url(self, obj) -> str:
         return _build_abs_media_url(self.context.get('request'), getattr(obj, 'banner', None))
 
+    def get_banner_srcset(self, obj) -> dict:
+        return _media_srcset(self, obj, 'banner')
+
+    def get_banner_meta(self, obj):
+        return _media_meta(self, obj, 'banner')
+
+    def _inspect_image(self, value, field_name):
+        # Header checks only; the image is re-encoded by an ImageJob after save.
+        from django.core.exceptions import ValidationError as DjangoValidationError
+
+        from forum.image_utils import inspect_uploaded_image
+
+        if value is None:
+            return value
+        try:
+            inspect_uploaded_image(uploaded_file=value, field_name=field_name)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.message_dict.get(field_name) or exc.messages)
+        return value
+
+    def validate_avatar(self, value):
+        return self._inspect_image(value, 'avatar')
+
+    def validate_banner(self, value):
+        return self._inspect_image(value, 'banner')
+
+    def update(self, instance, validated_data):
+        from forum.image_jobs import cancel_image_jobs, queue_image_job
+        from forum.image_store import refresh_blob_refs
+        from forum.models import ImageJob
+
+        uploads = []
+        cleared = []
+        for field_name, kind in (('avatar', ImageJob.Kind.AVATAR), ('banner', ImageJob.Kind.BANNER)):
+            if field_name not in validated_data:
+                continue
+            value = validated_data.pop(field_name)
+            if value is None:
+                cleared.append(getattr(getattr(instance, field_name, None), 'name', '') or '')
+                setattr(instance, field_name, None)
+                cancel_image_jobs(kind=kind, target_id=instance.id)
+            else:
+                uploads.append((field_name, kind, value))
+
+        # ModelSerializer.update() saves the instance, including cleared fields.
+        updated = super().update(instance, validated_data)
+        refresh_blob_refs(cleared)
+        for field_name, kind, value in uploads:
+            queue_image_job(user=updated, uploaded_file=value, kind=kind, target_id=updated.id, field_name=field_name)
+        return updated
+
 
 class AdminUserSerializer(serializers.ModelSerializer):
     level = serializers.IntegerField(read_only=True)
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
 from django.db import transaction
+from django.db.models import F
 
 from datetime import timedelta
 
@@ -124,6 +127,87 @@ def try_consume_download_quota(user: User) -> tuple[bool, int, int]:
         return True, used_today + 1, max(0, limit_today - (used_today + 1))
 
 
+# Staff board permissions
+# - Loaded once per request (memoized on the user object).
+# - Cached across requests only when the default cache is shared between
+#   workers (not LocMem/Dummy), under the user's staff_perms_version.
+# - Changing grants bumps that version in the database, in the same
+#   transaction (invalidate_staff_board_perms); request.user is loaded per
+#   request, so no worker reads the old entry after the commit.
+# - All checks below are then plain set lookups.
+STAFF_BOARD_PERMS_CACHE_TIMEOUT = 300
+_STAFF_BOARD_PERMS_MEMO_ATTR = '_staff_board_perms_memo'
+_PROCESS_LOCAL_CACHES = ('LocMemCache', 'DummyCache')
+
+
+def _shared_cache_enabled() -> bool:
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    return bool(backend) and backend.rsplit('.', 1)[-1] not in _PROCESS_LOCAL_CACHES
+
+
+def _staff_board_perms_cache_key(user_id: int, version: int) -> str:
+    return f'accounts:staff_board_perms:{int(user_id)}:{int(version)}'
+
+
+def get_staff_board_sets(user: User) -> tuple[frozenset[int], frozenset[int]]:
+    """Return (moderate_board_ids, delete_board_ids) for a staff user."""
+
+    memo = getattr(user, _STAFF_BOARD_PERMS_MEMO_ATTR, None)
+    if memo is not None:
+        return memo
+
+    user_id = getattr(user, 'id', None)
+    if not user_id:
+        return frozenset(), frozenset()
+
+    shared = _shared_cache_enabled()
+    key = _staff_board_perms_cache_key(user_id, getattr(user, 'staff_perms_version', 0) or 0)
+    cached = None
+    if shared:
+        try:
+            cached = cache.get(key)
+        except Exception:
+            cached = None
+
+    if cached is None:
+        moderate: set[int] = set()
+        delete: set[int] = set()
+        rows = StaffBoardPermission.objects.filter(user_id=user_id).values_list('board_id', 'can_moderate', 'can_delete')
+        for board_id, can_moderate, can_delete in rows:
+            if can_moderate:
+                moderate.add(int(board_id))
+            if can_delete:
+                delete.add(int(board_id))
+        cached = (sorted(moderate), sorted(delete))
+        if shared:
+            try:
+                cache.set(key, cached, STAFF_BOARD_PERMS_CACHE_TIMEOUT)
+            except Exception:
+                pass
+
+    memo = (frozenset(cached[0]), frozenset(cached[1]))
+    try:
+        setattr(user, _STAFF_BOARD_PERMS_MEMO_ATTR, memo)
+    except Exception:
+        pass
+    return memo
+
+
+def invalidate_staff_board_perms(user: User | int) -> None:
+    """Bump the user's staff_perms_version. Call inside the transaction that changes the grants."""
+
+    user_id = user if isinstance(user, int) else getattr(user, 'id', None)
+    if not user_id:
+        return
+    User.objects.filter(pk=user_id).update(staff_perms_version=F('staff_perms_version') + 1)
+    if not isinstance(user, int):
+        user.refresh_from_db(fields=['staff_perms_version'])
+        try:
+            delattr(user, _STAFF_BOARD_PERMS_MEMO_ATTR)
+        except AttributeError:
+            pass
+
+
 def staff_can_moderate_board(user: User, board_id: int | None) -> bool:
     if not board_id:
         return False
@@ -131,7 +215,7 @@ def staff_can_moderate_board(user: User, board_id: int | None) -> bool:
         return True
     if not getattr(user, 'is_staff', False):
         return False
-    return StaffBoardPermission.objects.filter(user=user, board_id=int(board_id), can_moderate=True).exists()
+    return int(board_id) in get_staff_board_sets(user)[0]
 
 
 def staff_can_delete_board(user: User, board_id: int | None) -> bool:
@@ -141,7 +225,7 @@ def staff_can_delete_board(user: User, board_id: int | None) -> bool:
         return True
     if not getattr(user, 'is_staff', False):
         return False
-    return StaffBoardPermission.objects.filter(user=user, board_id=int(board_id), can_delete=True).exists()
+    return int(board_id) in get_staff_board_sets(user)[1]
 
 
 def staff_allowed_board_ids(user: User, *, for_action: str) -> list[int]:
@@ -154,6 +238,5 @@ def staff_allowed_board_ids(user: User, *, for_action: str) -> list[int]:
         return []
     if not getattr(user, 'is_staff', False):
         return []
-    field = 'can_moderate' if for_action == 'moderate' else 'can_delete'
-    qs = StaffBoardPermission.objects.filter(user=user).filter(**{field: True}).values_list('board_id', flat=True)
-    return [int(x) for x in qs]
\ No newline at end of file
+    moderate, delete = get_staff_board_sets(user)
+    return sorted(moderate if for_action == 'moderate' else delete)
@@ -1,3 +1,58 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from forum.models import Board
+
+from .models import StaffBoardPermission
+from .services import invalidate_staff_board_perms, staff_allowed_board_ids, staff_can_delete_board, staff_can_moderate_board
+
+
+class StaffBoardPermsCacheTests(TestCase):
+	def setUp(self):
+		cache.clear()
+		self.staff = get_user_model().objects.create_user(username='@mod', password='pw', is_staff=True, staff_board_scoped=True)
+		self.b1 = Board.objects.create(slug='perm-b1', title='b1', sort_order=0)
+		self.b2 = Board.objects.create(slug='perm-b2', title='b2', sort_order=0)
+		StaffBoardPermission.objects.create(user=self.staff, board=self.b1, can_moderate=True, can_delete=False)
+
+	def test_checks_share_one_query_per_request(self):
+		with self.assertNumQueries(1):
+			self.assertTrue(staff_can_moderate_board(self.staff, self.b1.id))
+			self.assertFalse(staff_can_moderate_board(self.staff, self.b2.id))
+			self.assertFalse(staff_can_delete_board(self.staff, self.b1.id))
+			self.assertEqual(staff_allowed_board_ids(self.staff, for_action='moderate'), [self.b1.id])
+
+		# The default per-process cache is never used across requests.
+		fresh = get_user_model().objects.get(id=self.staff.id)
+		with self.assertNumQueries(1):
+			self.assertTrue(staff_can_moderate_board(fresh, self.b1.id))
+
+	def test_shared_cache_is_keyed_on_the_permission_version(self):
+		import shutil
+		import tempfile
+
+		from django.test import override_settings
+
+		location = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, location, True)
+		shared = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': location}}
+		with override_settings(CACHES=shared):
+			self.assertTrue(staff_can_moderate_board(self.staff, self.b1.id))
+			fresh = get_user_model().objects.get(id=self.staff.id)
+			with self.assertNumQueries(0):
+				self.assertTrue(staff_can_moderate_board(fresh, self.b1.id))
+
+			# Revoke from "another worker": the cached entry stays, but the
+			# next request loads the bumped version and misses it.
+			StaffBoardPermission.objects.filter(user=self.staff).delete()
+			invalidate_staff_board_perms(self.staff.id)
+			fresh = get_user_model().objects.get(id=self.staff.id)
+			self.assertFalse(staff_can_moderate_board(fresh, self.b1.id))
+
+	def test_invalidation_picks_up_new_grants(self):
+		self.assertFalse(staff_can_moderate_board(self.staff, self.b2.id))
+		StaffBoardPermission.objects.create(user=self.staff, board=self.b2, can_moderate=True, can_delete=True)
+		invalidate_staff_board_perms(self.staff)
+		self.assertTrue(staff_can_moderate_board(self.staff, self.b2.id))
+		self.assertTrue(staff_can_delete_board(self.staff, self.b2.id))
@@ -8,6 +8,7 @@ from django.utils import timezone
 from django.core.cache import cache
 from datetime import timedelta
 
+from django.db import transaction
 from django.db.models import BooleanField, Count, Exists, OuterRef, Q, Value
 from django.shortcuts import get_object_or_404
 from rest_framework import permissions, status
@@ -55,6 +56,17 @@ def _count_audit_actions(user, action: str) -> int:
     return AuditLog.objects.filter(actor=user, action=action, created_at__gte=start, created_at__lt=end).count()
 
 
+def _enqueue_user_search(user) -> None:
+    # Keep the federated search user index in sync; never block account changes.
+    try:
+        from forum.models import SearchOutbox
+        from forum.search_outbox import enqueue_search_changes
+
+        enqueue_search_changes(SearchOutbox.Entity.USERS, [user.id])
+    except Exception:
+        pass
+
+
 def _reject_angle_brackets(s: str) -> str:
     if '<' in s or '>' in s:
         raise ValueError('不允许包含 < 或 >。')
@@ -153,6 +165,7 @@ class RegisterView(APIView):
                 user.save(update_fields=['pid'])
         except Exception:
             pass
+        _enqueue_user_search(user)
 
         # Optional email verification marker (best-effort audit only).
         try:
@@ -403,6 +416,7 @@ class MeNicknameView(APIView):
         user.nickname = nickname
         user.activity_score = points - cost
         user.save(update_fields=['nickname', 'activity_score'])
+        _enqueue_user_search(user)
 
         write_audit_log(
             actor=user,
@@ -467,6 +481,7 @@ class MeUsernameView(APIView):
         user.username = username
         user.activity_score = points - cost
         user.save(update_fields=['username', 'activity_score'])
+        _enqueue_user_search(user)
 
         write_audit_log(
             actor=user,
@@ -778,23 +793,25 @@ class MeAvatarView(APIView):
         if not uploaded:
             return Response({'avatar': ['请上传头像文件。']}, status=status.HTTP_400_BAD_REQUEST)
 
-        # 复用论坛图片安全处理（限制 20MB、仅 JPEG/PNG/WEBP、重编码）。
+        # 复用论坛图片安全处理（限制 20MB、仅 JPEG/PNG/WEBP）：请求内只校验文件头，
+        # 解码/重编码由 ImageJob 在请求外完成，完成后才替换 user.avatar。
         # 备注：后续如果要对头像做更严格的尺寸限制，可以在 image_utils 增加可选参数。
-        from forum.image_utils import validate_and_process_uploaded_image
+        from forum.image_jobs import job_payload, queue_image_job
+        from forum.image_utils import inspect_uploaded_image
+        from forum.models import ImageJob
 
-        processed = validate_and_process_uploaded_image(uploaded_file=uploaded, field_name='avatar')
-        processed.content.name = f"avatar.{processed.ext}"
+        inspect_uploaded_image(uploaded_file=uploaded, field_name='avatar')
 
         cost = self._change_cost(user)
         points = int(getattr(user, 'activity_score', 0) or 0)
         if cost > 0 and points < cost:
             return Response({'detail': '积分不足，无法更换头像。'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Save avatar + deduct points atomically-ish (single row update).
-        user.avatar = processed.content
-        if cost > 0:
-            user.activity_score = max(0, points - cost)
-        user.save(update_fields=['avatar', 'activity_score'])
+        # Points are deducted when the job assigns the new avatar, not here.
+        with transaction.atomic():
+            job = queue_image_job(
+                user=user, uploaded_file=uploaded, kind=ImageJob.Kind.AVATAR, target_id=user.id, field_name='avatar', cost=cost
+            )
 
         write_audit_log(
             actor=user,
@@ -802,12 +819,15 @@ class MeAvatarView(APIView):
             target_type='user',
             target_id=str(user.id),
             request=request,
-            metadata={'cost': cost},
+            metadata={'cost': cost, 'image_job': str(job.pk)},
         )
 
+        user.refresh_from_db(fields=['avatar', 'activity_score'])
+        job.refresh_from_db()
         return Response(
             {
                 'avatar_url': self._avatar_url(request, user),
+                'image_job': job_payload(job, request),
                 'points': int(getattr(user, 'activity_score', 0) or 0),
                 'change_cost': self._change_cost(user),
                 'has_avatar': bool(getattr(user, 'avatar', None)),
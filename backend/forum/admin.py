@@ -1,6 +1,11 @@
+from functools import partial
+
 from django.contrib import admin
+from django.db import transaction
 
+from .image_jobs import dispatch_variants
 from .models import Board, BoardFollow, BoardHeroSlide, Comment, HomeHeroSlide, Post, PostFavorite, PostLike
+from .post_images import sync_post_images
 
 
 @admin.register(Board)
@@ -16,6 +21,11 @@ class PostAdmin(admin.ModelAdmin):
 	list_filter = ('board', 'is_pinned', 'is_locked')
 	search_fields = ('title', 'body', 'author__username')
 
+	def save_model(self, request, obj, form, change):
+		super().save_model(request, obj, form, change)
+		if {'body', 'cover_image'} & set(form.changed_data):
+			sync_post_images([obj.id])
+
 
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
@@ -45,6 +55,13 @@ class BoardFollowAdmin(admin.ModelAdmin):
 	search_fields = ('board__title', 'user__username')
 
 
+def _schedule_hero_variants(obj, form):
+	# Hero images are uploaded here as-is; render their srcset variants off-request.
+	name = getattr(obj.image, 'name', '') if obj.image else ''
+	if name and 'image' in form.changed_data:
+		transaction.on_commit(partial(dispatch_variants, name, 'hero'), robust=True)
+
+
 @admin.register(HomeHeroSlide)
 class HomeHeroSlideAdmin(admin.ModelAdmin):
 	list_display = ('id', 'title', 'link_url', 'sort_order', 'is_active', 'updated_at')
@@ -52,6 +69,10 @@ class HomeHeroSlideAdmin(admin.ModelAdmin):
 	search_fields = ('title', 'description', 'link_url')
 	ordering = ('sort_order', 'id')
 
+	def save_model(self, request, obj, form, change):
+		super().save_model(request, obj, form, change)
+		_schedule_hero_variants(obj, form)
+
 
 @admin.register(BoardHeroSlide)
 class BoardHeroSlideAdmin(admin.ModelAdmin):
@@ -59,3 +80,7 @@ class BoardHeroSlideAdmin(admin.ModelAdmin):
 	list_filter = ('is_active', 'board')
 	search_fields = ('title', 'description', 'post__title', 'board__title')
 	ordering = ('board', 'sort_order', 'id')
+
+	def save_model(self, request, obj, form, change):
+		super().save_model(request, obj, form, change)
+		_schedule_hero_variants(obj, form)
@@ -0,0 +1,461 @@
+"""Off-request image processing.
+
+Request handlers only sniff the image header (inspect_uploaded_image) and
+store the original; decoding, EXIF transpose, resizing and re-encoding happen
+in an ImageJob after the request's transaction commits:
+- IMAGE_PROCESS_WORKERS > 0: a per-process ProcessPoolExecutor (spawned
+  workers, recycled every MAX_TASKS_PER_CHILD jobs). At most
+  IMAGE_PROCESS_MAX_QUEUED jobs are in flight per process; further jobs stay
+  pending instead of piling up in memory.
+- IMAGE_PROCESS_WORKERS == 0: inline right after commit (dev/tests).
+`manage.py process_image_jobs` drains pending jobs and re-queues jobs stuck in
+`processing` (e.g. the web process restarted), so no upload depends on the pool
+surviving. Jobs that did not fit in the pool, and failed jobs waiting for a
+retry, are only picked up there: deployments must run it (DEPLOYMENT.md).
+
+Covers, avatars and banners also get their responsive variants and layout
+metadata (size, dominant color, placeholder) rendered in the same pool task
+(forum.image_variants); dispatch_variants() does the same for images that
+bypass ImageJob (admin-uploaded hero slides).
+
+Results go to the content-addressed store (forum.image_store): re-uploading a
+file that was processed before resolves to the existing blob in the request,
+and identical output is written once (variants are still rendered if the blob
+had none). Applying a result points the target field (Post.cover_image,
+User.avatar/banner) at the blob unless a newer job for the same target exists,
+recounts the new and previous image (ImageBlob.ref_count), and deletes the
+original. Clients poll the job (job_payload) until it is ready or failed.
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import timedelta
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from .image_utils import (
+    ImageProcessingError,
+    ImageSummary,
+    Variant,
+    inspect_uploaded_image,
+    process_image_file_with_variants,
+    render_variants_file,
+)
+from .image_store import blob_for_source, refresh_blob_refs, sha256_upload, store_blob
+from .image_variants import PRESET_FOR_KIND, store_variants
+from .post_images import sync_post_images
+from .models import ImageAsset, ImageJob, Post
+
+
+logger = logging.getLogger(__name__)
+
+ORIGINALS_DIR = 'image_originals'
+# Model field each kind of job assigns its result to.
+TARGET_FIELDS = {
+    ImageJob.Kind.COVER: 'cover_image',
+    ImageJob.Kind.AVATAR: 'avatar',
+    ImageJob.Kind.BANNER: 'banner',
+}
+MAX_TASKS_PER_CHILD = 50
+MAX_ATTEMPTS = 3
+# A job still `processing` after this long lost its worker; the command re-queues it.
+STALE_PROCESSING_SECONDS = 600
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+_slots: Optional[threading.BoundedSemaphore] = None
+
+
+def _workers() -> int:
+    return max(0, int(getattr(settings, 'IMAGE_PROCESS_WORKERS', 0) or 0))
+
+
+def _get_executor() -> Tuple[ProcessPoolExecutor, threading.BoundedSemaphore]:
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            # spawn: the web process has threads and DB connections that must not be forked.
+            _executor = ProcessPoolExecutor(
+                max_workers=_workers(),
+                mp_context=multiprocessing.get_context('spawn'),
+                max_tasks_per_child=MAX_TASKS_PER_CHILD,
+            )
+            _slots = threading.BoundedSemaphore(max(1, int(getattr(settings, 'IMAGE_PROCESS_MAX_QUEUED', 16) or 16)))
+        return _executor, _slots
+
+
+def shutdown_executor() -> None:
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+        _executor = None
+        _slots = None
+
+
+# --- request side ---
+
+
+def queue_image_job(
+    *, user, uploaded_file, kind: str, target_id: Optional[int] = None, field_name: str = 'image', cost: int = 0
+) -> ImageJob:
+    """Validate the header, store the original and dispatch processing on commit.
+
+    `cost` points are charged to the user only once the result is assigned, so
+    failed, cancelled and superseded jobs cost nothing.
+
+    Raises django ValidationError({field_name: ...}) for files that are not
+    acceptable images.
+    """
+
+    header = inspect_uploaded_image(uploaded_file=uploaded_file, field_name=field_name)
+    source_sha256 = sha256_upload(uploaded_file)
+
+    blob = blob_for_source(source_sha256)
+    if blob is not None:
+        # Seen before: finish now, without storing or decoding anything.
+        job = ImageJob.objects.create(
+            user=user,
+            kind=kind,
+            target_id=target_id,
+            source_sha256=source_sha256,
+            content_type=header.content_type,
+            status=ImageJob.Status.READY,
+            result_name=blob.name,
+            width=blob.width,
+            height=blob.height,
+            started_at=timezone.now(),
+            finished_at=timezone.now(),
+            cost=cost,
+        )
+        _assign(job, blob.name)
+        preset = PRESET_FOR_KIND.get(kind, '')
+        if preset and not ImageAsset.objects.filter(name=blob.name).exclude(placeholder='').exists():
+            # First seen as an editor upload (no variants); render them like apply_result would.
+            transaction.on_commit(partial(dispatch_variants, blob.name, preset), robust=True)
+        return job
+
+    source_name = default_storage.save(f'{ORIGINALS_DIR}/{uuid.uuid4().hex}.{header.ext}', uploaded_file)
+    job = ImageJob.objects.create(
+        user=user,
+        kind=kind,
+        target_id=target_id,
+        source_name=source_name,
+        source_sha256=source_sha256,
+        content_type=header.content_type,
+        cost=cost,
+    )
+    # robust: a dispatch error leaves the job pending for the worker command.
+    transaction.on_commit(partial(dispatch_image_job, job.pk), robust=True)
+    return job
+
+
+def cancel_image_jobs(*, kind: str, target_id: int) -> int:
+    """Stop unfinished jobs for a target from being applied (e.g. cover removed)."""
+
+    return ImageJob.objects.filter(
+        kind=kind,
+        target_id=target_id,
+        status__in=[ImageJob.Status.PENDING, ImageJob.Status.PROCESSING],
+    ).update(status=ImageJob.Status.FAILED, error='Cancelled.', finished_at=timezone.now())
+
+
+def job_payload(job: ImageJob, request=None) -> Dict[str, Any]:
+    url = ''
+    if job.status == ImageJob.Status.READY and job.result_name:
+        try:
+            url = default_storage.url(job.result_name)
+        except Exception:
+            url = ''
+        if url and request is not None:
+            url = request.build_absolute_uri(url)
+    return {
+        'id': str(job.pk),
+        'kind': job.kind,
+        'status': job.status,
+        'url': url,
+        'width': job.width,
+        'height': job.height,
+        'error': job.error,
+    }
+
+
+# --- processing ---
+
+
+def _claim(job_id) -> Optional[ImageJob]:
+    claimed = ImageJob.objects.filter(pk=job_id, status=ImageJob.Status.PENDING).update(
+        status=ImageJob.Status.PROCESSING,
+        started_at=timezone.now(),
+        attempts=F('attempts') + 1,
+    )
+    if not claimed:
+        return None
+    return ImageJob.objects.filter(pk=job_id).first()
+
+
+def local_file(name: str) -> Tuple[str, Callable[[], None]]:
+    """A local path for a stored file (downloaded to a temp file for remote storages)."""
+
+    try:
+        return default_storage.path(name), lambda: None
+    except NotImplementedError:
+        pass
+    ext = os.path.splitext(name)[1]
+    with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp, default_storage.open(name, 'rb') as src:
+        shutil.copyfileobj(src, tmp)
+    return tmp.name, partial(_unlink, tmp.name)
+
+
+def _unlink(path: str) -> None:
+    try:
+        os.unlink(path)
+    except OSError:
+        pass
+
+
+def _delete_file(name: str) -> None:
+    if not name:
+        return
+    try:
+        default_storage.delete(name)
+    except Exception:
+        logger.warning('could not delete %s', name, exc_info=True)
+
+
+def _assign(job: ImageJob, name: str) -> bool:
+    """Point the job's target field at `name`. False if there is no target to update."""
+
+    field = TARGET_FIELDS.get(job.kind)
+    if field is None:
+        return True  # editor upload: referenced from post bodies
+    if not job.target_id:
+        return False
+    newer = (
+        ImageJob.objects.filter(kind=job.kind, target_id=job.target_id, created_at__gt=job.created_at)
+        .exclude(status=ImageJob.Status.FAILED)
+        .exists()
+    )
+    if newer:
+        return False
+    model = Post if job.kind == ImageJob.Kind.COVER else get_user_model()
+    old = model.objects.filter(pk=job.target_id).values_list(field, flat=True).first()
+    if not model.objects.filter(pk=job.target_id).update(**{field: name}):
+        return False
+    if job.cost:
+        get_user_model().objects.filter(pk=job.user_id).update(activity_score=Greatest(F('activity_score') - job.cost, 0))
+    if job.kind == ImageJob.Kind.COVER:
+        sync_post_images([job.target_id])
+    else:
+        refresh_blob_refs([old, name])
+    return True
+
+
+def apply_result(
+    job: ImageJob,
+    result: Tuple[bytes, str, int, int],
+    variants: Iterable[Variant] = (),
+    summary: Optional[ImageSummary] = None,
+) -> bool:
+    """Store the processed image (its variants and metadata) and finish the job. False if it was cancelled meanwhile."""
+
+    data, ext, width, height = result
+    blob, created = store_blob(data, ext, width, height, source_sha256=job.source_sha256)
+    variants = list(variants)
+    if variants and (created or not ImageAsset.objects.filter(name=blob.name).exclude(placeholder='').exists()):
+        store_variants(blob.name, variants, summary, size=blob.size)
+    with transaction.atomic():
+        done = ImageJob.objects.filter(pk=job.pk, status=ImageJob.Status.PROCESSING).update(
+            status=ImageJob.Status.READY,
+            result_name=blob.name,
+            width=blob.width,
+            height=blob.height,
+            error='',
+            finished_at=timezone.now(),
+        )
+        if done:
+            _assign(job, blob.name)
+    _delete_file(job.source_name)
+    return bool(done)
+
+
+def _fail(job: ImageJob, error: str, *, retry: bool = False) -> None:
+    if retry and job.attempts < MAX_ATTEMPTS:
+        ImageJob.objects.filter(pk=job.pk, status=ImageJob.Status.PROCESSING).update(status=ImageJob.Status.PENDING)
+        return
+    ImageJob.objects.filter(pk=job.pk, status=ImageJob.Status.PROCESSING).update(
+        status=ImageJob.Status.FAILED,
+        error=error[:200],
+        finished_at=timezone.now(),
+    )
+    _delete_file(job.source_name)
+
+
+def run_image_job(job_id) -> Optional[str]:
+    """Claim and process one pending job in this process. Returns the final status."""
+
+    job = _claim(job_id)
+    if job is None:
+        return None
+    try:
+        path, cleanup = local_file(job.source_name)
+    except Exception:
+        logger.exception('image job %s: original unavailable', job.pk)
+        _fail(job, 'Original file is missing.')
+        return ImageJob.Status.FAILED
+    try:
+        result, variants, summary = process_image_file_with_variants(path, job.content_type, PRESET_FOR_KIND.get(job.kind, ''))
+    except ImageProcessingError as exc:
+        _fail(job, str(exc))
+        return ImageJob.Status.FAILED
+    except Exception:
+        logger.exception('image job %s failed', job.pk)
+        _fail(job, 'Processing failed.', retry=True)
+        return ImageJob.Status.PENDING
+    finally:
+        cleanup()
+    return ImageJob.Status.READY if apply_result(job, result, variants, summary) else ImageJob.Status.FAILED
+
+
+def _on_done(
+    job: ImageJob, cleanup: Callable[[], None], slots: threading.BoundedSemaphore, caller: int, future: Future
+) -> None:
+    # Normally runs on the executor's management thread, which has its own DB
+    # connection. If the future was already done, add_done_callback() runs it
+    # right away on the dispatching thread, whose connection is not ours to close.
+    own_thread = threading.get_ident() != caller
+    try:
+        if own_thread:
+            close_old_connections()
+        try:
+            result = future.result()
+        except ImageProcessingError as exc:
+            _fail(job, str(exc))
+        except Exception:
+            logger.exception('image job %s failed in the pool', job.pk)
+            _fail(job, 'Processing failed.', retry=True)
+        else:
+            apply_result(job, *result)
+    except Exception:
+        logger.exception('image job %s: could not record the result', job.pk)
+    finally:
+        cleanup()
+        slots.release()
+        if own_thread:
+            connection.close()
+
+
+def dispatch_image_job(job_id) -> None:
+    """Hand a pending job to the process pool (or run it inline when WORKERS=0)."""
+
+    if _workers() <= 0:
+        run_image_job(job_id)
+        return
+
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        logger.info('image pool is full; job %s stays pending for process_image_jobs', job_id)
+        return
+    job = None
+    cleanup: Callable[[], None] = lambda: None
+    try:
+        job = _claim(job_id)
+        if job is None:
+            slots.release()
+            return
+        path, cleanup = local_file(job.source_name)
+        future = executor.submit(process_image_file_with_variants, path, job.content_type, PRESET_FOR_KIND.get(job.kind, ''))
+    except Exception:
+        slots.release()
+        cleanup()
+        logger.exception('could not dispatch image job %s', job_id)
+        if job is not None:
+            _fail(job, 'Processing failed.', retry=True)
+        return
+    future.add_done_callback(partial(_on_done, job, cleanup, slots, threading.get_ident()))
+
+
+def build_variants(name: str, preset: str) -> None:
+    """Render and store variants of a stored image in this process."""
+
+    path, cleanup = local_file(name)
+    try:
+        variants, summary = render_variants_file(path, preset)
+    finally:
+        cleanup()
+    store_variants(name, variants, summary)
+
+
+def _on_variants_done(
+    name: str, cleanup: Callable[[], None], slots: threading.BoundedSemaphore, caller: int, future: Future
+) -> None:
+    # See _on_done for when this runs on the dispatching thread.
+    own_thread = threading.get_ident() != caller
+    try:
+        if own_thread:
+            close_old_connections()
+        store_variants(name, *future.result())
+    except Exception:
+        logger.exception('could not build variants for %s', name)
+    finally:
+        cleanup()
+        slots.release()
+        if own_thread:
+            connection.close()
+
+
+def dispatch_variants(name: str, preset: str) -> None:
+    """Build variants for an image stored outside ImageJob, in the pool when there is one."""
+
+    if not name:
+        return
+    if _workers() <= 0:
+        build_variants(name, preset)
+        return
+    executor, slots = _get_executor()
+    if not slots.acquire(blocking=False):
+        logger.info('image pool is full; build variants for %s with build_image_variants', name)
+        return
+    cleanup: Callable[[], None] = lambda: None
+    try:
+        path, cleanup = local_file(name)
+        future = executor.submit(render_variants_file, path, preset)
+    except Exception:
+        slots.release()
+        cleanup()
+        logger.exception('could not dispatch variants for %s', name)
+        return
+    future.add_done_callback(partial(_on_variants_done, name, cleanup, slots, threading.get_ident()))
+
+
+def requeue_stale_jobs(*, older_than_seconds: int = STALE_PROCESSING_SECONDS) -> int:
+    """Put jobs whose worker vanished back to pending (or fail them after MAX_ATTEMPTS)."""
+
+    cutoff = timezone.now() - timedelta(seconds=older_than_seconds)
+    stale = ImageJob.objects.filter(status=ImageJob.Status.PROCESSING, started_at__lt=cutoff)
+    failed = stale.filter(attempts__gte=MAX_ATTEMPTS).update(
+        status=ImageJob.Status.FAILED, error='Processing timed out.', finished_at=timezone.now()
+    )
+    return failed + stale.update(status=ImageJob.Status.PENDING)
+
+
+def pending_job_ids(limit: int) -> Iterable:
+    return list(
+        ImageJob.objects.filter(status=ImageJob.Status.PENDING).order_by('created_at').values_list('pk', flat=True)[:limit]
+    )
@@ -0,0 +1,117 @@
+"""Content-addressed storage for processed images.
+
+- Processed bytes are stored once as `images/<sha[:2]>/<sha256>.<ext>`
+  (ImageBlob). Identical output from different uploads shares the file.
+- The sha256 of each uploaded original is recorded (ImageBlobSource), so
+  uploading the same file again resolves to the existing blob in the request:
+  no original is stored and nothing is decoded or re-encoded.
+- ImageBlob.ref_count is the number of rows naming the blob: PostImage (post
+  bodies and covers), User.avatar/banner and hero slides. refresh_blob_refs()
+  recounts names after any of those change, so an editor upload counts once a
+  saved post links it and stops counting when the link is edited out. Files
+  are removed by garbage collection only, never when the count drops.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from collections import Counter
+from typing import Iterable, Optional, Tuple
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+from django.db.models import Count
+
+from .models import BoardHeroSlide, HomeHeroSlide, ImageBlob, ImageBlobSource, PostImage
+
+
+BLOB_DIR = 'images'
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+def sha256_upload(uploaded_file) -> str:
+    """Hash an uploaded file in chunks and rewind it."""
+
+    digest = hashlib.sha256()
+    uploaded_file.seek(0)
+    for chunk in uploaded_file.chunks(HASH_CHUNK_BYTES):
+        digest.update(chunk)
+    uploaded_file.seek(0)
+    return digest.hexdigest()
+
+
+def blob_name(sha256: str, ext: str) -> str:
+    return f'{BLOB_DIR}/{sha256[:2]}/{sha256}.{ext}'
+
+
+def blob_for_source(source_sha256: str) -> Optional[ImageBlob]:
+    """The blob an identical original was processed into, if its file still exists."""
+
+    if not source_sha256:
+        return None
+    link = ImageBlobSource.objects.filter(sha256=source_sha256).select_related('blob').first()
+    if link is None:
+        return None
+    if not default_storage.exists(link.blob.name):
+        link.delete()
+        return None
+    return link.blob
+
+
+def store_blob(data: bytes, ext: str, width: int, height: int, *, source_sha256: str = '') -> Tuple[ImageBlob, bool]:
+    """Store processed bytes unless identical content exists. Returns (blob, created).
+
+    Does not count references; see refresh_blob_refs().
+    """
+
+    sha = hashlib.sha256(data).hexdigest()
+    blob = ImageBlob.objects.filter(sha256=sha).first()
+    created = False
+    if blob is None or not default_storage.exists(blob.name):
+        name = blob_name(sha, ext)
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(data))
+        try:
+            with transaction.atomic():
+                blob, created = ImageBlob.objects.update_or_create(
+                    sha256=sha,
+                    defaults={'name': name, 'size': len(data), 'width': width, 'height': height},
+                )
+        except IntegrityError:
+            # A concurrent job stored the same content first.
+            blob = ImageBlob.objects.get(sha256=sha)
+
+    if source_sha256:
+        try:
+            with transaction.atomic():
+                ImageBlobSource.objects.update_or_create(sha256=source_sha256, defaults={'blob': blob})
+        except IntegrityError:
+            pass
+    return blob, created
+
+
+def refresh_blob_refs(names: Iterable[str]) -> int:
+    """Set ref_count of the blobs among `names` from the rows naming them. Returns blobs changed.
+
+    Call after the write that added or dropped a reference; names outside the
+    blob store are ignored.
+    """
+
+    names = {n for n in names if n}
+    blobs = list(ImageBlob.objects.filter(name__in=names).values_list('id', 'name', 'ref_count')) if names else []
+    if not blobs:
+        return 0
+    names = {name for _id, name, _count in blobs}
+    User = get_user_model()
+    counts: Counter = Counter(
+        dict(PostImage.objects.filter(name__in=names).values_list('name').annotate(n=Count('id')).values_list('name', 'n'))
+    )
+    for model, field in ((User, 'avatar'), (User, 'banner'), (HomeHeroSlide, 'image'), (BoardHeroSlide, 'image')):
+        counts.update(model.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    changed = 0
+    for blob_id, name, ref_count in blobs:
+        if counts[name] != ref_count:
+            changed += ImageBlob.objects.filter(pk=blob_id).update(ref_count=counts[name])
+    return changed
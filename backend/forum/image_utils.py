@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+import base64
+import os
+import tempfile
+import time
+from contextlib import contextmanager
 from dataclasses import dataclass
 from io import BytesIO
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 from django.core.exceptions import ValidationError
 from django.core.files.base import ContentFile
 
-from PIL import Image, ImageOps, UnidentifiedImageError
+from PIL import ExifTags, Image, UnidentifiedImageError, features
 
 
 # Max single image size (bytes).
@@ -15,6 +21,25 @@ MAX_IMAGE_BYTES = 20 * 1024 * 1024
 MAX_IMAGE_PIXELS = 30_000_000  # hard safety cap
 MAX_IMAGE_SIDE = 4096
 
+# Memory per processed image (see peak_memory_bound()):
+# - Uploads above FILE_UPLOAD_MAX_MEMORY_SIZE are spooled to disk by Django;
+#   workers read originals from a path, so the encoded file is never held whole.
+# - Pixels: at most two frames alive at once plus the output, 4 bytes per
+#   pixel. Worst case ~245 MiB: a 30 MP image decoded in full and resized to
+#   4096x4096. JPEGs at least twice the target size per side decode at
+#   1/2-1/8 scale instead (a 10000x3000 JPEG panorama: ~67 MiB).
+BYTES_PER_PIXEL = 4
+
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
 ALLOWED_MIME = {
     'image/jpeg': 'jpg',
     'image/png': 'png',
@@ -22,6 +47,67 @@ ALLOWED_MIME = {
 }
 
 
+# Encoder settings per output extension (bench_images compares alternatives).
+OUTPUT_ENCODERS = {
+    'png': {'format': 'PNG', 'optimize': True},
+    'jpg': {'format': 'JPEG', 'quality': 85, 'optimize': True, 'progressive': True},
+    'webp': {'format': 'WEBP', 'quality': 82, 'method': 6},
+}
+
+# Responsive variants (srcset widths in px) per image role. Widths at or above
+# the source width are skipped; a source narrower than all of them gets one
+# variant at its own width.
+VARIANT_WIDTHS = {
+    'cover': (320, 640, 960, 1280),
+    'hero': (640, 1024, 1600, 2048),
+    'avatar': (48, 96, 192),
+    'banner': (640, 1024, 1600),
+}
+VARIANT_ENCODERS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60, 'speed': 8},
+}
+
+# (format, width, height, encoded bytes)
+Variant = Tuple[str, int, int, bytes]
+
+# Low-quality placeholder: a tiny WebP served inline as a data: URI (~200-400
+# bytes), shown blurred while the real image loads.
+PLACEHOLDER_SIDE = 16
+PLACEHOLDER_ENCODER = {'format': 'WEBP', 'quality': 40}
+
+PIL_FORMAT_EXT = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+
+FORMAT_MIME = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+    'WEBP': 'image/webp',
+}
+
+
+class ImageProcessingError(ValueError):
+    """Raised by the processing step; picklable so it can cross a process pool."""
+
+
+@dataclass(frozen=True)
+class ImageHeader:
+    content_type: str
+    ext: str
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class ImageSummary:
+    """Layout metadata for a stored image (ImageAsset), computed while rendering variants."""
+
+    width: int
+    height: int
+    format: str
+    dominant_color: str
+    placeholder: str
+
+
 @dataclass(frozen=True)
 class ProcessedImage:
     content: ContentFile
@@ -34,14 +120,11 @@ def _is_png_with_alpha(img: Image.Image) -> bool:
     return img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
 
 
-def validate_and_process_uploaded_image(*, uploaded_file, field_name: str = 'image') -> ProcessedImage:
-    """Validate that the upload is a real image and return a compressed/normalized ContentFile.
+def inspect_uploaded_image(*, uploaded_file, field_name: str = 'image') -> ImageHeader:
+    """Cheap request-time checks: size, MIME and the image header (no pixel decode).
 
-    - Max 20MB
-    - Only JPEG/PNG/WEBP by MIME
-    - EXIF orientation normalized
-    - Max side <= 4096 (downscale)
-    - Re-encode to reduce size without excessive quality loss
+    The declared MIME must be allowed; the format sniffed from the header wins
+    when they disagree (browsers derive the MIME from the file extension).
     """
 
     size = int(getattr(uploaded_file, 'size', 0) or 0)
@@ -54,51 +137,330 @@ def validate_and_process_uploaded_image(*, uploaded_file, field_name: str = 'ima
     if content_type not in ALLOWED_MIME:
         raise ValidationError({field_name: 'Only JPEG/PNG/WEBP images are allowed.'})
 
-    raw = uploaded_file.read()
-    if len(raw) > MAX_IMAGE_BYTES:
-        raise ValidationError({field_name: 'Image too large (max 20MB).'})
-
     try:
         Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
-        img = Image.open(BytesIO(raw))
-        img.verify()  # validate structure
-        img = Image.open(BytesIO(raw))  # reopen after verify
-        img = ImageOps.exif_transpose(img)
+        uploaded_file.seek(0)
+        with Image.open(uploaded_file) as img:
+            fmt = img.format
+            width, height = img.size
     except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
         raise ValidationError({field_name: 'Invalid or unsafe image file.'})
+    finally:
+        uploaded_file.seek(0)
 
-    width, height = img.size
+    content_type = FORMAT_MIME.get(fmt or '')
+    if not content_type:
+        raise ValidationError({field_name: 'Only JPEG/PNG/WEBP images are allowed.'})
     if width <= 0 or height <= 0:
         raise ValidationError({field_name: 'Invalid image dimensions.'})
+    if width * height > MAX_IMAGE_PIXELS:
+        raise ValidationError({field_name: 'Invalid or unsafe image file.'})
+    return ImageHeader(content_type=content_type, ext=ALLOWED_MIME[content_type], width=width, height=height)
 
-    # Downscale very large images
-    max_side = max(width, height)
-    if max_side > MAX_IMAGE_SIDE:
-        scale = MAX_IMAGE_SIDE / float(max_side)
-        new_w = max(1, int(width * scale))
-        new_h = max(1, int(height * scale))
-        img = img.resize((new_w, new_h), Image.Resampling.LANCZOS)
-        width, height = img.size
 
-    out = BytesIO()
+def _target_size(width: int, height: int, max_side: int = MAX_IMAGE_SIDE) -> Tuple[int, int]:
+    longest = max(width, height)
+    if longest <= max_side:
+        return width, height
+    scale = max_side / float(longest)
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def decoded_size(width: int, height: int, fmt: str, max_side: int = MAX_IMAGE_SIDE) -> Tuple[int, int]:
+    """Size decode_scaled() decodes at: JPEG uses DCT scaling (1/2, 1/4, 1/8), others decode in full."""
+
+    target_w, target_h = _target_size(width, height, max_side)
+    if fmt != 'JPEG' or (target_w, target_h) == (width, height):
+        return width, height
+    ratio = min(width // target_w, height // target_h)
+    scale = next(s for s in (8, 4, 2, 1) if ratio >= s)
+    return -(-width // scale), -(-height // scale)
+
+
+def peak_memory_bound(width: int, height: int, fmt: str, max_side: int = MAX_IMAGE_SIDE) -> int:
+    """Upper bound (bytes) of pixel memory process_image_file() holds for one image.
+
+    At most two frames are alive at once (source + resized, then resized +
+    transposed/converted) plus the encoded output, which is never larger than
+    one frame. Pillow stores up to 4 bytes per pixel (RGB is padded to 32 bits).
+    """
+
+    dw, dh = decoded_size(width, height, fmt, max_side)
+    tw, th = _target_size(width, height, max_side)
+    return BYTES_PER_PIXEL * (max(dw * dh + tw * th, 2 * tw * th) + tw * th)
+
+
+def _orientation(img: Image.Image) -> int:
+    try:
+        return int(img.getexif().get(ExifTags.Base.Orientation, 1) or 1)
+    except Exception:
+        return 1
+
+
+class _StageTimer:
+    """Adds elapsed seconds per stage into a dict (no-op without one)."""
+
+    def __init__(self, stages: Optional[Dict[str, float]]) -> None:
+        self.stages = stages
+        self.t = time.perf_counter()
+
+    def mark(self, stage: str) -> None:
+        if self.stages is None:
+            return
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self.t)
+        self.t = now
+
+
+def decode_scaled(img: Image.Image, max_side: int = MAX_IMAGE_SIDE, *, stages: Optional[Dict[str, float]] = None) -> Image.Image:
+    """Decode an opened image once, no larger than `max_side`, EXIF orientation applied.
+
+    - JPEG: draft() lets libjpeg decode at 1/2, 1/4 or 1/8 scale when the
+      source is at least twice the target size, so the full frame never exists.
+    - Resizing happens before the EXIF transpose, so the rotation copies the
+      smaller frame.
+
+    `stages` (optional) accumulates seconds for decode/resize/transpose.
+    """
+
+    timer = _StageTimer(stages)
+    orientation = _orientation(img)
+    width, height = img.size
+    target = _target_size(width, height, max_side)
+    if img.format == 'JPEG' and target != (width, height):
+        img.draft(None, target)
+    img.load()
+    timer.mark('decode')
+    if img.size != target:
+        img = img.resize(target, Image.Resampling.LANCZOS)
+    timer.mark('resize')
+    transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        img = img.transpose(transpose)
+    timer.mark('transpose')
+    return img
+
+
+def _open_verified(source) -> Image.Image:
+    """Open a path or file object after a structural verify() pass (no pixel decode)."""
+
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    with Image.open(source) as probe:
+        probe.verify()
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    return Image.open(source)
+
+
+def process_image_source(
+    source,
+    content_type: str,
+    *,
+    encoders: Optional[Dict[str, Dict[str, Any]]] = None,
+    stages: Optional[Dict[str, float]] = None,
+) -> Tuple[bytes, str, int, int]:
+    """Decode, normalize and re-encode an image. Returns (bytes, ext, width, height).
+
+    `source` is a path or a seekable file object; it is read incrementally, never
+    loaded whole into memory. Peak pixel memory is peak_memory_bound().
 
-    # Re-encode based on MIME, keeping alpha when needed
-    if content_type == 'image/png':
-        if _is_png_with_alpha(img):
-            img.save(out, format='PNG', optimize=True)
-            ext = 'png'
-        else:
-            img = img.convert('RGB')
-            img.save(out, format='JPEG', quality=85, optimize=True, progressive=True)
-            ext = 'jpg'
+    - EXIF orientation normalized
+    - Max side <= 4096 (downscale, JPEG decoded at reduced resolution when possible)
+    - Re-encode with OUTPUT_ENCODERS (per output ext; `encoders` overrides them)
+
+    `stages` (optional) receives seconds spent in verify/decode/resize/transpose/encode.
+    Pure CPU work with no Django state, so it can run in a worker process.
+    Raises ImageProcessingError for files that fail to decode.
+    """
+
+    timer = _StageTimer(stages)
+    try:
+        img = _open_verified(source)
+        timer.mark('verify')
+        alpha = _is_png_with_alpha(img)
+        img = decode_scaled(img, stages=stages)
+    except (UnidentifiedImageError, OSError, SyntaxError, Image.DecompressionBombError):
+        raise ImageProcessingError('Invalid or unsafe image file.')
+    timer = _StageTimer(stages)
+
+    width, height = img.size
+    if width <= 0 or height <= 0:
+        raise ImageProcessingError('Invalid image dimensions.')
+
+    # Output format by MIME: PNG keeps alpha, opaque PNGs become JPEG.
+    if content_type == 'image/png' and alpha:
+        ext = 'png'
     elif content_type == 'image/webp':
-        img = img.convert('RGB') if img.mode not in ('RGB',) else img
-        img.save(out, format='WEBP', quality=82, method=6)
         ext = 'webp'
-    else:  # jpeg
-        img = img.convert('RGB')
-        img.save(out, format='JPEG', quality=85, optimize=True, progressive=True)
+    else:
         ext = 'jpg'
+    if ext != 'png' and img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    params = dict(OUTPUT_ENCODERS[ext])
+    params.update((encoders or {}).get(ext) or {})
+    out = BytesIO()
+    img.save(out, **params)
+    timer.mark('encode')
+    return out.getvalue(), ext, width, height
+
+
+def process_image_bytes(raw: bytes, content_type: str) -> Tuple[bytes, str, int, int]:
+    """process_image_source() for bytes already in memory."""
+
+    return process_image_source(BytesIO(raw), content_type)
+
+
+def process_image_file(path: str, content_type: str) -> Tuple[bytes, str, int, int]:
+    """process_image_source() for a file on local disk (the process-pool entry point)."""
+
+    return process_image_source(path, content_type)
+
+
+@contextmanager
+def spooled_upload(uploaded_file) -> Iterator[str]:
+    """A local path for an upload: Django's own temp file, or the chunks spooled to one."""
+
+    temporary_path = getattr(uploaded_file, 'temporary_file_path', None)
+    if temporary_path is not None:
+        yield temporary_path()
+        return
+    suffix = os.path.splitext(getattr(uploaded_file, 'name', '') or '')[1]
+    with tempfile.NamedTemporaryFile(suffix=suffix) as tmp:
+        uploaded_file.seek(0)
+        for chunk in uploaded_file.chunks():
+            tmp.write(chunk)
+        tmp.flush()
+        uploaded_file.seek(0)
+        yield tmp.name
+
+
+def validate_and_process_uploaded_image(*, uploaded_file, field_name: str = 'image') -> ProcessedImage:
+    """Validate that the upload is a real image and return a compressed/normalized ContentFile.
+
+    Synchronous: inspect_uploaded_image() + process_image_source() on the
+    spooled upload. Request handlers queue an ImageJob instead (see forum.image_jobs).
+    """
+
+    header = inspect_uploaded_image(uploaded_file=uploaded_file, field_name=field_name)
+    try:
+        with spooled_upload(uploaded_file) as path:
+            data, ext, width, height = process_image_file(path, header.content_type)
+    except ImageProcessingError as exc:
+        raise ValidationError({field_name: str(exc)})
+    return ProcessedImage(content=ContentFile(data), ext=ext, width=width, height=height)
+
+
+def variant_formats() -> Tuple[str, ...]:
+    """WebP always; AVIF when this Pillow build has an AVIF encoder."""
+
+    try:
+        has_avif = bool(features.check('avif'))
+    except Exception:
+        has_avif = False
+    return ('webp', 'avif') if has_avif else ('webp',)
+
+
+def _dominant_color(frame: Image.Image) -> str:
+    """Most common color of a coarse palette, as '#rrggbb'."""
+
+    small = frame.convert('RGB')
+    small.thumbnail((32, 32))
+    quantized = small.quantize(colors=8)
+    count_index = max(quantized.getcolors() or [(1, 0)])
+    palette = quantized.getpalette() or [0, 0, 0]
+    r, g, b = palette[count_index[1] * 3 : count_index[1] * 3 + 3]
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+def _placeholder(frame: Image.Image) -> str:
+    thumb = frame.copy()
+    thumb.thumbnail((PLACEHOLDER_SIDE, PLACEHOLDER_SIDE))
+    buf = BytesIO()
+    thumb.save(buf, **PLACEHOLDER_ENCODER)
+    return 'data:image/webp;base64,' + base64.b64encode(buf.getvalue()).decode('ascii')
+
+
+def summarize_frame(frame: Image.Image, width: int, height: int, fmt: str) -> ImageSummary:
+    """ImageSummary for a source of (display) size width x height, from a small decoded `frame`."""
+
+    return ImageSummary(
+        width=width,
+        height=height,
+        format=PIL_FORMAT_EXT.get(fmt or '', (fmt or '').lower()),
+        dominant_color=_dominant_color(frame),
+        placeholder=_placeholder(frame),
+    )
+
+
+def _display_size(img: Image.Image) -> Tuple[int, int]:
+    width, height = img.size
+    if _orientation(img) in (5, 6, 7, 8):
+        width, height = height, width
+    return width, height
+
+
+def render_variants(img: Image.Image, preset: str) -> Tuple[List[Variant], ImageSummary]:
+    """Downscaled copies of `img` for the widths of `preset`, in every variant format.
+
+    Also returns the image's ImageSummary, taken from the smallest variant frame.
+    """
+
+    alpha = _is_png_with_alpha(img)
+    fmt = img.format or ''
+    src_w, src_h = _display_size(img)
+    widths = sorted({w for w in VARIANT_WIDTHS[preset] if w < src_w} or {src_w}, reverse=True)
+    # One reduced decode at the largest variant size (JPEG DCT scaling applies here too).
+    frame = decode_scaled(img, max(widths[0], round(src_h * widths[0] / src_w)))
+    mode = 'RGBA' if alpha else 'RGB'
+    frame = frame if frame.mode == mode else frame.convert(mode)
+    formats = variant_formats()
+
+    out: List[Variant] = []
+    # Largest first, each step resized from the previous one (cheaper than from the source).
+    for width in widths:
+        height = max(1, round(src_h * width / src_w))
+        if frame.size != (width, height):
+            frame = frame.resize((width, height), Image.Resampling.LANCZOS)
+        for variant_fmt in formats:
+            buf = BytesIO()
+            frame.save(buf, **VARIANT_ENCODERS[variant_fmt])
+            out.append((variant_fmt, width, height, buf.getvalue()))
+    return out, summarize_frame(frame, src_w, src_h, fmt)
+
+
+def render_variants_file(path: str, preset: str) -> Tuple[List[Variant], ImageSummary]:
+    """render_variants() for an image on local disk (process-pool entry point)."""
+
+    try:
+        Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+        with Image.open(path) as img:
+            return render_variants(img, preset)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ImageProcessingError('Invalid or unsafe image file.')
+
+
+def summarize_file(path: str) -> ImageSummary:
+    """ImageSummary alone, decoding at placeholder scale (process-pool entry point)."""
+
+    try:
+        Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+        with Image.open(path) as img:
+            fmt = img.format or ''
+            width, height = _display_size(img)
+            return summarize_frame(decode_scaled(img, 64), width, height, fmt)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError):
+        raise ImageProcessingError('Invalid or unsafe image file.')
+
+
+def process_image_file_with_variants(
+    path: str, content_type: str, preset: str = ''
+) -> Tuple[Tuple[bytes, str, int, int], List[Variant], Optional[ImageSummary]]:
+    """process_image_file() plus render_variants() of its output, in one pool task."""
 
-    content = ContentFile(out.getvalue())
-    return ProcessedImage(content=content, ext=ext, width=width, height=height)
+    result = process_image_file(path, content_type)
+    if not preset:
+        return result, [], None
+    with Image.open(BytesIO(result[0])) as img:
+        variants, summary = render_variants(img, preset)
+    return result, variants, summary
@@ -0,0 +1,177 @@
+"""Responsive image variants (srcset) for covers, hero slides, avatars and banners.
+
+- Rendering (image_utils.render_variants) is pure CPU work and runs in the
+  image process pool: together with the upload's own processing for ImageJobs
+  (forum.image_jobs), on its own for admin-uploaded hero images, and in bulk
+  from `manage.py build_image_variants`.
+- store_variants() saves the files next to the source under `variants/` and
+  records them in ImageAsset.variants, keyed by the source's storage name,
+  together with the ImageSummary rendered alongside (dimensions, format,
+  dominant color, placeholder) and the source's byte size.
+- Serializers call image_srcset() / image_meta(); asset_for() loads the
+  ImageAssets of a whole list page in one query and keeps them in the
+  serializer context, so no file is opened and there is no per-row query.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from .image_utils import ImageSummary, Variant
+from .models import ImageAsset, ImageJob
+
+
+PRESET_FOR_KIND = {
+    ImageJob.Kind.COVER: 'cover',
+    ImageJob.Kind.AVATAR: 'avatar',
+    ImageJob.Kind.BANNER: 'banner',
+}
+
+_CONTEXT_KEY = '_image_assets'
+
+
+def variant_name(name: str, fmt: str, width: int) -> str:
+    folder, base = os.path.split(name)
+    stem = os.path.splitext(base)[0]
+    return f'{folder}/variants/{stem}-{width}.{fmt}' if folder else f'variants/{stem}-{width}.{fmt}'
+
+
+def variant_names(asset: Optional[ImageAsset]) -> List[str]:
+    if asset is None:
+        return []
+    return [n for widths in (asset.variants or {}).values() for n in widths.values() if n]
+
+
+def _summary_fields(name: str, summary: ImageSummary, size: Optional[int]) -> Dict[str, Any]:
+    if size is None:
+        try:
+            size = default_storage.size(name)
+        except Exception:
+            size = 0
+    return {
+        'width': summary.width,
+        'height': summary.height,
+        'size': size,
+        'format': summary.format,
+        'dominant_color': summary.dominant_color,
+        'placeholder': summary.placeholder,
+    }
+
+
+def store_summary(name: str, summary: ImageSummary, *, size: Optional[int] = None) -> ImageAsset:
+    """Record metadata for `name`, keeping its variants."""
+
+    asset, _created = ImageAsset.objects.update_or_create(name=name, defaults=_summary_fields(name, summary, size))
+    return asset
+
+
+def store_variants(
+    name: str, variants: Iterable[Variant], summary: Optional[ImageSummary] = None, *, size: Optional[int] = None
+) -> ImageAsset:
+    """Save rendered variants of `name` and record them (replacing older ones) with its metadata.
+
+    `size` is the source's byte size; without it the storage is asked (a stat, not a read).
+    """
+
+    previous = ImageAsset.objects.filter(name=name).first()
+    for old in variant_names(previous):
+        try:
+            default_storage.delete(old)
+        except Exception:
+            pass
+
+    stored: Dict[str, Dict[str, str]] = {}
+    for fmt, width, _height, data in variants:
+        saved = default_storage.save(variant_name(name, fmt, width), ContentFile(data))
+        stored.setdefault(fmt, {})[str(width)] = saved
+    defaults: Dict[str, Any] = {'variants': stored}
+    if summary is not None:
+        defaults.update(_summary_fields(name, summary, size))
+    asset, _created = ImageAsset.objects.update_or_create(name=name, defaults=defaults)
+    return asset
+
+
+def file_name(value) -> str:
+    return str(getattr(value, 'name', None) or value or '')
+
+
+def srcset_map(asset: Optional[ImageAsset], request=None) -> Dict[str, str]:
+    """{"webp": "<url> 320w, <url> 640w", "avif": ...} for an asset."""
+
+    out: Dict[str, str] = {}
+    if asset is None:
+        return out
+    for fmt, widths in (asset.variants or {}).items():
+        parts = []
+        for width, name in sorted(((int(w), n) for w, n in widths.items()), key=lambda x: x[0]):
+            try:
+                url = default_storage.url(name)
+            except Exception:
+                continue
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            parts.append(f'{url} {width}w')
+        if parts:
+            out[fmt] = ', '.join(parts)
+    return out
+
+
+def _resolve(obj, path: str):
+    for attr in path.split('.'):
+        obj = getattr(obj, attr, None)
+        if obj is None:
+            return None
+    return obj
+
+
+def asset_for(serializer, obj, path: str) -> Optional[ImageAsset]:
+    """The ImageAsset of the file at attribute `path` (e.g. 'post.cover_image') of obj.
+
+    The first lookup fetches the assets for every item of the enclosing list
+    serializer, so a page of results costs one query per image field.
+    """
+
+    name = file_name(_resolve(obj, path))
+    if not name:
+        return None
+    cache: Dict[str, Optional[ImageAsset]] = serializer.context.setdefault(_CONTEXT_KEY, {})
+    if name not in cache:
+        names = {name}
+        parent = getattr(serializer, 'parent', None)
+        items = getattr(parent, 'instance', None) if isinstance(parent, serializers.ListSerializer) else None
+        if items is not None:
+            names.update(file_name(_resolve(item, path)) for item in items)
+        names = {n for n in names if n and n not in cache}
+        found = {a.name: a for a in ImageAsset.objects.filter(name__in=names)}
+        for n in names:
+            cache[n] = found.get(n)
+    return cache.get(name)
+
+
+def image_srcset(serializer, obj, path: str, *, absolute: bool = False) -> Dict[str, str]:
+    request = serializer.context.get('request') if absolute else None
+    return srcset_map(asset_for(serializer, obj, path), request)
+
+
+def meta_map(asset: Optional[ImageAsset]) -> Optional[Dict[str, Any]]:
+    """{"width", "height", "bytes", "format", "dominant_color", "placeholder"}, or None if unknown."""
+
+    if asset is None or not asset.width:
+        return None
+    return {
+        'width': asset.width,
+        'height': asset.height,
+        'bytes': asset.size,
+        'format': asset.format,
+        'dominant_color': asset.dominant_color,
+        'placeholder': asset.placeholder,
+    }
+
+
+def image_meta(serializer, obj, path: str) -> Optional[Dict[str, Any]]:
+    return meta_map(asset_for(serializer, obj, path))
@@ -0,0 +1,288 @@
+"""Benchmark the upload image pipeline (forum.image_utils.process_image_source).
+
+Usage:
+  python manage.py bench_images
+  python manage.py bench_images --sizes 0.5,2,8 --formats jpeg,webp --repeat 3
+  python manage.py bench_images --preset current --preset fast
+  python manage.py bench_images --encoder q78:jpg.quality=78,webp.quality=78
+  python manage.py bench_images --corpus-dir /tmp/corpus --json /tmp/bench.json
+
+Notes:
+- Builds a synthetic corpus: JPEG/PNG/WebP at each --sizes megapixels (4:3,
+  gradient + noise so encoders have real work), each with and without an
+  EXIF rotation, PNG/WebP also with an alpha channel.
+- Every case runs in a fresh spawned process; `rss` is its peak RSS above
+  the RSS just before the first run (the peak mark is reset through
+  /proc/self/clear_refs on Linux, elsewhere imports may hide small cases). `py_peak` is tracemalloc's
+  peak, which only sees Python allocations (output buffers), not Pillow's
+  pixel memory. `bound` is image_utils.peak_memory_bound() for comparison.
+- Stage times are medians over --repeat runs: verify, decode (incl. JPEG
+  draft), resize, transpose, encode.
+- Encoder presets override image_utils.OUTPUT_ENCODERS per output extension
+  (jpg/png/webp); the summary compares each preset against the first one.
+"""
+
+from __future__ import annotations
+
+import json
+import math
+import multiprocessing
+import os
+import resource
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.image_utils import FORMAT_MIME, peak_memory_bound, process_image_source
+
+
+STAGES = ('verify', 'decode', 'resize', 'transpose', 'encode')
+ENCODER_PRESETS: Dict[str, Dict[str, Dict[str, Any]]] = {
+    'current': {},
+    'fast': {
+        'jpg': {'optimize': False},
+        'png': {'optimize': False, 'compress_level': 6},
+        'webp': {'method': 4},
+    },
+    'smaller': {
+        'jpg': {'quality': 78},
+        'webp': {'quality': 75},
+    },
+}
+FORMAT_EXT = {'jpeg': ('JPEG', 'jpg'), 'png': ('PNG', 'png'), 'webp': ('WEBP', 'webp')}
+
+
+def _rss_bytes() -> int:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _reset_peak_rss() -> int:
+    """Reset the peak-RSS mark where Linux allows it; return the RSS to measure from."""
+
+    try:
+        with open('/proc/self/clear_refs', 'w') as fh:
+            fh.write('5')
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return _rss_bytes()
+
+
+def _peak_rss_bytes() -> int:
+    try:
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return _rss_bytes()
+
+
+def _measure(path: str, content_type: str, encoders: Dict[str, Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    """Runs in a fresh process: process `path` `repeat` times and report timings/memory."""
+
+    baseline = _reset_peak_rss()
+    runs: List[Dict[str, float]] = []
+    totals: List[float] = []
+    py_peak = 0
+    result: Tuple[bytes, str, int, int] = (b'', '', 0, 0)
+    for i in range(repeat):
+        stages: Dict[str, float] = {}
+        if i == 0:
+            tracemalloc.start()
+        started = time.perf_counter()
+        result = process_image_source(path, content_type, encoders=encoders, stages=stages)
+        totals.append(time.perf_counter() - started)
+        if i == 0:
+            py_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        runs.append(stages)
+    data, ext, width, height = result
+    return {
+        'stages_ms': {s: round(statistics.median(r.get(s, 0.0) for r in runs) * 1000, 1) for s in STAGES},
+        'total_ms': round(statistics.median(totals) * 1000, 1),
+        'out_bytes': len(data),
+        'out_ext': ext,
+        'out_size': [width, height],
+        'py_peak_bytes': py_peak,
+        'rss_bytes': max(0, _peak_rss_bytes() - baseline),
+    }
+
+
+def _synthetic(width: int, height: int, alpha: bool):
+    from PIL import Image
+
+    gradient = Image.linear_gradient('L').resize((width, height))
+    noise = Image.effect_noise((width, height), 48)
+    img = Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.FLIP_LEFT_RIGHT)))
+    if alpha:
+        img.putalpha(Image.radial_gradient('L').resize((width, height)))
+    return img
+
+
+def _parse_encoder(spec: str) -> Tuple[str, Dict[str, Dict[str, Any]]]:
+    """'name:jpg.quality=80,webp.method=4' -> (name, {'jpg': {'quality': 80}, 'webp': {'method': 4}})."""
+
+    name, _, body = spec.partition(':')
+    if not name or not body:
+        raise CommandError(f'Bad --encoder {spec!r}; expected name:ext.key=value,...')
+    out: Dict[str, Dict[str, Any]] = {}
+    for item in body.split(','):
+        key, _, raw = item.partition('=')
+        ext, _, param = key.strip().partition('.')
+        if ext not in ('jpg', 'png', 'webp') or not param or not raw:
+            raise CommandError(f'Bad --encoder item {item!r}')
+        value: Any = raw.strip()
+        if value.lower() in ('true', 'false'):
+            value = value.lower() == 'true'
+        else:
+            try:
+                value = int(value)
+            except ValueError:
+                pass
+        out.setdefault(ext, {})[param] = value
+    return name, out
+
+
+class Command(BaseCommand):
+    help = 'Benchmark image processing latency, output size and memory on a synthetic corpus.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='0.5,2,8,16,30', help='Comma-separated megapixels.')
+        parser.add_argument('--formats', default='jpeg,png,webp')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per case (timings are medians).')
+        parser.add_argument('--preset', action='append', choices=sorted(ENCODER_PRESETS), help='Encoder presets to compare.')
+        parser.add_argument('--encoder', action='append', default=[], help='Extra preset: name:ext.key=value,...')
+        parser.add_argument('--no-rotation', action='store_true', help='Skip the EXIF-rotated cases.')
+        parser.add_argument('--no-alpha', action='store_true', help='Skip the alpha cases.')
+        parser.add_argument('--corpus-dir', default='', help='Keep the corpus here (reused if present).')
+        parser.add_argument('--json', default='', help='Also write all results to this file.')
+
+    def _corpus(self, directory: str, sizes: List[float], formats: List[str], rotation: bool, alpha: bool) -> List[Dict[str, Any]]:
+        from PIL import Image
+
+        cases = []
+        for fmt in formats:
+            pil_format, ext = FORMAT_EXT[fmt]
+            for mp in sizes:
+                width = int(math.sqrt(mp * 1_000_000 * 4 / 3))
+                height = int(width * 3 / 4)
+                for rotated in (False, True) if rotation else (False,):
+                    for with_alpha in (False, True) if (alpha and fmt != 'jpeg') else (False,):
+                        name = f"{fmt}-{mp:g}mp-{'rot' if rotated else 'up'}-{'alpha' if with_alpha else 'opaque'}.{ext}"
+                        path = os.path.join(directory, name)
+                        if not os.path.exists(path):
+                            img = _synthetic(width, height, with_alpha)
+                            params: Dict[str, Any] = {'format': pil_format}
+                            if rotated:
+                                exif = Image.Exif()
+                                exif[0x0112] = 6
+                                params['exif'] = exif.tobytes()
+                            if pil_format == 'JPEG':
+                                params['quality'] = 92
+                            img.save(path, **params)
+                        cases.append(
+                            {
+                                'file': name,
+                                'path': path,
+                                'content_type': FORMAT_MIME[pil_format],
+                                'megapixels': mp,
+                                'width': width,
+                                'height': height,
+                                'format': pil_format,
+                                'in_bytes': os.path.getsize(path),
+                            }
+                        )
+        return cases
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [float(x) for x in options['sizes'].split(',') if x.strip()]
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated numbers.')
+        formats = [f.strip().lower() for f in options['formats'].split(',') if f.strip()]
+        unknown = [f for f in formats if f not in FORMAT_EXT]
+        if unknown:
+            raise CommandError(f'Unknown formats: {", ".join(unknown)}')
+        repeat = max(1, int(options['repeat']))
+
+        presets = {name: ENCODER_PRESETS[name] for name in (options['preset'] or ['current', 'fast', 'smaller'])}
+        for spec in options['encoder']:
+            name, encoders = _parse_encoder(spec)
+            presets[name] = encoders
+
+        directory = options['corpus_dir'] or tempfile.mkdtemp(prefix='bench_images_')
+        os.makedirs(directory, exist_ok=True)
+        try:
+            self.stdout.write(f'corpus: {directory}')
+            cases = self._corpus(directory, sizes, formats, not options['no_rotation'], not options['no_alpha'])
+            results = self._run(cases, presets, repeat)
+        finally:
+            if not options['corpus_dir']:
+                shutil.rmtree(directory, ignore_errors=True)
+
+        self._summary(results, list(presets))
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, indent=2)
+            self.stdout.write(f"wrote {options['json']}")
+
+    def _run(self, cases: List[Dict[str, Any]], presets: Dict[str, Dict[str, Dict[str, Any]]], repeat: int) -> List[Dict[str, Any]]:
+        header = f"{'file':34} {'preset':8} " + ' '.join(f'{s[:6]:>7}' for s in STAGES)
+        header += f" {'total':>8} {'in KiB':>8} {'out KiB':>8} {'py_peak':>8} {'rss':>8} {'bound':>8}"
+        self.stdout.write(header)
+        self.stdout.write('(times in ms, memory in MiB)')
+
+        results = []
+        mib = 1024 * 1024
+        # One fresh process per case: ru_maxrss is a process-lifetime high-water mark.
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn'), max_tasks_per_child=1) as pool:
+            for case in cases:
+                bound = peak_memory_bound(case['width'], case['height'], case['format'])
+                for preset, encoders in presets.items():
+                    try:
+                        measured = pool.submit(_measure, case['path'], case['content_type'], encoders, repeat).result()
+                    except Exception as exc:
+                        self.stderr.write(f"{case['file']} {preset}: {exc}")
+                        continue
+                    row = {k: v for k, v in case.items() if k != 'path'}
+                    row.update(measured, preset=preset, bound_bytes=bound)
+                    results.append(row)
+                    line = f"{case['file']:34} {preset:8} " + ' '.join(f'{measured["stages_ms"][s]:7.1f}' for s in STAGES)
+                    line += f" {measured['total_ms']:8.1f} {case['in_bytes'] / 1024:8.0f} {measured['out_bytes'] / 1024:8.0f}"
+                    line += f" {measured['py_peak_bytes'] / mib:8.1f} {measured['rss_bytes'] / mib:8.1f} {bound / mib:8.1f}"
+                    self.stdout.write(line)
+        return results
+
+    def _summary(self, results: List[Dict[str, Any]], presets: List[str]) -> None:
+        if not results:
+            return
+        by_preset: Dict[str, Dict[str, float]] = {}
+        for row in results:
+            agg = by_preset.setdefault(row['preset'], {'ms': 0.0, 'bytes': 0.0, 'rss': 0.0, 'cases': 0})
+            agg['ms'] += row['total_ms']
+            agg['bytes'] += row['out_bytes']
+            agg['rss'] = max(agg['rss'], row['rss_bytes'])
+            agg['cases'] += 1
+        base = by_preset.get(presets[0])
+        self.stdout.write('')
+        self.stdout.write(f"{'preset':10} {'cases':>5} {'total s':>9} {'out MiB':>9} {'max rss':>9} {'time':>7} {'size':>7}")
+        for name in presets:
+            agg = by_preset.get(name)
+            if not agg:
+                continue
+            time_ratio = agg['ms'] / base['ms'] if base and base['ms'] else 1.0
+            size_ratio = agg['bytes'] / base['bytes'] if base and base['bytes'] else 1.0
+            self.stdout.write(
+                f"{name:10} {agg['cases']:5d} {agg['ms'] / 1000:9.2f} {agg['bytes'] / 1048576:9.2f} "
+                f"{agg['rss'] / 1048576:9.1f} {time_ratio:7.2f} {size_ratio:7.2f}"
+            )
@@ -0,0 +1,124 @@
+"""Render responsive variants (srcset) and metadata for images that lack them.
+
+Usage:
+  python manage.py build_image_variants
+  python manage.py build_image_variants --only cover --workers 4
+  python manage.py build_image_variants --force      # re-render everything
+  python manage.py build_image_variants --dry-run
+
+Notes:
+- Covers post covers, home/board hero slides, avatars and banners. New
+  uploads get variants from their ImageJob; this is for existing files and
+  after changing VARIANT_WIDTHS/VARIANT_ENCODERS (with --force).
+- Images that already have variants but no metadata (ImageAsset.width,
+  dominant_color, placeholder, ...) only get the metadata, decoded at
+  thumbnail scale; variants are not re-rendered.
+- Rendering runs in a ProcessPoolExecutor with at most 2x --workers files in
+  flight; files are written and recorded in this process as results arrive.
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Tuple
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from forum.image_jobs import local_file
+from forum.image_utils import render_variants_file, summarize_file
+from forum.image_variants import store_summary, store_variants
+from forum.models import BoardHeroSlide, HomeHeroSlide, ImageAsset, Post
+
+
+# (option name, preset, model, field)
+SOURCES = [
+    ('cover', 'cover', Post, 'cover_image'),
+    ('hero', 'hero', HomeHeroSlide, 'image'),
+    ('hero', 'hero', BoardHeroSlide, 'image'),
+    ('avatar', 'avatar', None, 'avatar'),
+    ('banner', 'banner', None, 'banner'),
+]
+
+
+def _store_rendered(name: str, rendered) -> None:
+    variants, summary = rendered
+    store_variants(name, variants, summary)
+
+
+class Command(BaseCommand):
+    help = 'Render responsive image variants and metadata for stored covers, hero images, avatars and banners.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', choices=sorted({s[0] for s in SOURCES}), help='Limit to one kind of image.')
+        parser.add_argument('--workers', type=int, default=max(1, (multiprocessing.cpu_count() or 2) - 1))
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many files (0 = all).')
+        parser.add_argument('--force', action='store_true', help='Re-render files that already have variants.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be rendered.')
+
+    def _names(self, only: str, force: bool) -> List[Tuple[str, str, bool]]:
+        """(name, preset, summary_only) for every file that needs work."""
+
+        wanted: Dict[str, str] = {}
+        for option, preset, model, field in SOURCES:
+            if only and option != only:
+                continue
+            model = model or get_user_model()
+            qs = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''})
+            for name in qs.values_list(field, flat=True).distinct().iterator():
+                wanted.setdefault(name, preset)
+        if force:
+            return [(n, p, False) for n, p in sorted(wanted.items())]
+        has_variants = ImageAsset.objects.exclude(variants={})
+        done = set(has_variants.exclude(placeholder='').values_list('name', flat=True))
+        rendered = set(has_variants.filter(placeholder='').values_list('name', flat=True))
+        return [(n, p, n in rendered) for n, p in sorted(wanted.items()) if n not in done]
+
+    def handle(self, *args, **options):
+        todo = self._names(options.get('only') or '', bool(options['force']))
+        if options['limit'] and options['limit'] > 0:
+            todo = todo[: options['limit']]
+        self.stdout.write(f'files={len(todo)}')
+        if options['dry_run'] or not todo:
+            return
+
+        workers = max(1, int(options['workers']))
+        done = failed = reported = 0
+        pending = {}
+        queue = iter(todo)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            while True:
+                while len(pending) < workers * 2:
+                    item = next(queue, None)
+                    if item is None:
+                        break
+                    name, preset, summary_only = item
+                    if not default_storage.exists(name):
+                        failed += 1
+                        self.stderr.write(f'missing: {name}')
+                        continue
+                    path, cleanup = local_file(name)
+                    if summary_only:
+                        future = pool.submit(summarize_file, path)
+                    else:
+                        future = pool.submit(render_variants_file, path, preset)
+                    pending[future] = (name, cleanup, store_summary if summary_only else _store_rendered)
+                if not pending:
+                    break
+                finished, _rest = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name, cleanup, store = pending.pop(future)
+                    cleanup()
+                    try:
+                        store(name, future.result())
+                        done += 1
+                    except Exception as exc:
+                        failed += 1
+                        self.stderr.write(f'failed: {name}: {exc}')
+                if done + failed - reported >= 100:
+                    reported = done + failed
+                    self.stdout.write(f'... done={done} failed={failed}')
+
+        self.stdout.write(self.style.SUCCESS(f'done={done} failed={failed}'))
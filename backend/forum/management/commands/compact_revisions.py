@@ -0,0 +1,42 @@
+"""Compact post revision chains into snapshot + delta storage.
+
+Usage:
+  python manage.py compact_revisions [--post-id ID] [--dry-run]
+
+Notes:
+- Existing revisions were stored as full copies. This rewrites every chain so
+  only every REVISION_SNAPSHOT_INTERVAL-th revision keeps the full body.
+- Safe to re-run: chains already in the target form are left untouched.
+"""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from forum.models import PostRevision
+from forum.revisions import compact_post_revisions
+
+
+class Command(BaseCommand):
+    help = 'Rewrite post revisions as periodic full snapshots plus compressed deltas.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--post-id', type=int, default=None, help='Only compact this post.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many chains would be visited.')
+
+    def handle(self, *args, **options):
+        qs = PostRevision.objects.values_list('post_id', flat=True).distinct().order_by('post_id')
+        if options.get('post_id'):
+            qs = qs.filter(post_id=options['post_id'])
+
+        if options.get('dry_run'):
+            self.stdout.write(f'Would compact {qs.count()} revision chains.')
+            return
+
+        posts = 0
+        rewritten = 0
+        for post_id in qs.iterator(chunk_size=500):
+            rewritten += compact_post_revisions(post_id)
+            posts += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Compacted {posts} chains, rewrote {rewritten} revisions.'))
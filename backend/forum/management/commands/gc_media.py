@@ -0,0 +1,70 @@
+"""Delete stored images that nothing references any more.
+
+Usage:
+  python manage.py gc_media --dry-run            # report only
+  python manage.py gc_media --dry-run -v 2       # ... and list every orphan
+  python manage.py gc_media
+  python manage.py gc_media --grace-hours 24 --dir uploads --dir images
+  python manage.py gc_media --reindex --recount
+
+Notes:
+- What counts as referenced is documented in forum.media_gc; post bodies and
+  covers come from the PostImage index (forum.post_images).
+- Files modified within --grace-hours are kept, so uploads the author has not
+  saved into a post yet survive.
+- --reindex rebuilds PostImage for every post first (the index is maintained
+  on save; use this after editing bodies outside the API/admin).
+- --recount rewrites ImageBlob.ref_count from actual references afterwards.
+"""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from forum.media_gc import GC_BATCH_SIZE, GC_DIRS, GC_GRACE_HOURS, collect_garbage, recount_blob_refs
+from forum.models import Post
+from forum.post_images import SYNC_BATCH_SIZE, sync_post_images
+
+
+class Command(BaseCommand):
+    help = 'Delete unreferenced uploaded images older than a grace period.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted.')
+        parser.add_argument('--grace-hours', type=float, default=GC_GRACE_HOURS)
+        parser.add_argument('--dir', action='append', dest='dirs', help=f'Directory to scan (repeatable; default: {", ".join(GC_DIRS)}).')
+        parser.add_argument('--batch-size', type=int, default=GC_BATCH_SIZE)
+        parser.add_argument('--limit', type=int, default=0, help='Stop after this many orphans (0 = all).')
+        parser.add_argument('--reindex', action='store_true', help='Rebuild the PostImage index before scanning.')
+        parser.add_argument('--recount', action='store_true', help='Rewrite ImageBlob.ref_count afterwards.')
+
+    def handle(self, *args, **options):
+        dry_run = bool(options['dry_run'])
+        if options['reindex']:
+            ids = list(Post.objects.order_by('id').values_list('id', flat=True))
+            for start in range(0, len(ids), SYNC_BATCH_SIZE):
+                sync_post_images(ids[start : start + SYNC_BATCH_SIZE])
+            self.stdout.write(f'reindexed posts={len(ids)}')
+
+        verbose = int(options.get('verbosity') or 1) >= 2
+
+        def on_orphan(name: str, size: int) -> None:
+            if verbose:
+                self.stdout.write(f'{"would delete" if dry_run else "delete"}: {name} ({size} bytes)')
+
+        stats = collect_garbage(
+            grace_hours=max(0.0, float(options['grace_hours'])),
+            dirs=options['dirs'] or GC_DIRS,
+            batch_size=max(1, int(options['batch_size'])),
+            dry_run=dry_run,
+            limit=max(0, int(options['limit'])),
+            on_orphan=on_orphan,
+        )
+        summary = (
+            f"scanned={stats['scanned']} recent={stats['recent']} referenced={stats['referenced']} "
+            f"orphaned={stats['orphaned']} bytes={stats['bytes']} deleted={stats['deleted']}"
+        )
+        self.stdout.write(f'[dry-run] {summary}' if dry_run else self.style.SUCCESS(summary))
+
+        if options['recount'] and not dry_run:
+            self.stdout.write(f'recounted blobs={recount_blob_refs()}')
@@ -0,0 +1,62 @@
+"""Process queued image uploads (ImageJob) outside the web process.
+
+Usage:
+  python manage.py process_image_jobs            # run forever
+  python manage.py process_image_jobs --once     # drain pending jobs, then exit
+
+Notes:
+- Web processes dispatch jobs to their own bounded process pool; jobs that did
+  not fit (pool full) or whose worker died stay pending/processing and are
+  picked up here.
+- Jobs are claimed with a conditional UPDATE, so several workers may run at once.
+- Each job is processed in this process; run more workers for more throughput.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from forum.image_jobs import STALE_PROCESSING_SECONDS, pending_job_ids, requeue_stale_jobs, run_image_job
+
+
+class Command(BaseCommand):
+    help = 'Process pending image uploads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when no job is pending.')
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when idle.')
+        parser.add_argument(
+            '--stale-seconds',
+            type=int,
+            default=STALE_PROCESSING_SECONDS,
+            help='Re-queue jobs stuck in processing for longer than this.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, int(options['batch_size']))
+        interval = max(0.1, float(options['interval']))
+        once = bool(options['once'])
+        stale_seconds = max(1, int(options['stale_seconds']))
+
+        while True:
+            requeued = requeue_stale_jobs(older_than_seconds=stale_seconds)
+            if requeued:
+                self.stdout.write(f'requeued={requeued}')
+
+            ids = pending_job_ids(batch_size)
+            counts = {}
+            for job_id in ids:
+                status = run_image_job(job_id)
+                if status:
+                    counts[status] = counts.get(status, 0) + 1
+            if counts:
+                self.stdout.write(' '.join(f'{k}={v}' for k, v in sorted(counts.items())))
+
+            if ids:
+                continue
+            if once:
+                return
+            time.sleep(interval)
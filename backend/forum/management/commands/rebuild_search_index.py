@@ -0,0 +1,30 @@
+"""Rebuild the in-database search index (forum.search_backends).
+
+Usage:
+  python manage.py rebuild_search_index
+
+Notes:
+- This index serves search without MEILI_URL and during Meilisearch failover
+  (use reindex_posts for Meilisearch itself). Post writes keep it current; run
+  this after bulk imports, raw SQL edits, or a tokenizer change.
+- Rebuilds whichever backend this database uses: SQLite FTS5, PostgreSQL
+  tsvector, or the portable inverted index.
+"""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from forum.search_backends import get_database_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the built-in post search index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        backend = get_database_backend()
+        done = backend.rebuild(chunk_size=max(1, int(options['chunk_size'])))
+        self.stdout.write(self.style.SUCCESS(f'Indexed {done} posts ({backend.name}).'))
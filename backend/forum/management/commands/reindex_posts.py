@@ -2,38 +2,205 @@
 
 Usage:
   python manage.py reindex_posts
+  python manage.py reindex_posts --chunk-size 2000 --workers 4
+  python manage.py reindex_posts --resume      # continue a failed run
+  python manage.py reindex_posts --in-place    # write straight into the live index
 
 Notes:
-- This is intentionally a manual command (not automatic hooks) so that devs can
-  bootstrap search quickly.
-- In production you may want:
-  - a background job / queue
-  - incremental updates on post create/update/moderation
+- Posts are streamed with .iterator() and sent in chunks; at most --workers
+  batches are in flight at once, so memory stays flat regardless of table size.
+- By default documents go into a shadow index (<name>__reindex) that is
+  atomically swapped with the live one at the end; search keeps serving the
+  old data until the new index is complete.
+- After each contiguous run of finished batches the last post id is written to
+  a checkpoint file (default: reindex_posts-<index>.json in the system temp
+  directory; pass --checkpoint to keep it elsewhere, e.g. across reboots);
+  --resume continues from there into the same shadow index.
+- Posts touched while the reindex ran are re-enqueued to the search outbox
+  after the swap, so `search_sync` brings them up to date.
 """
 
 from __future__ import annotations
 
-from django.core.management.base import BaseCommand
+import json
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 
 from forum.models import Post
-from forum.search_meili import ensure_posts_index_settings, get_posts_index, meili_enabled, post_to_document
+from forum.search_meili import (
+    INDEX_TIMEOUT_SECONDS,
+    ensure_posts_index_settings,
+    get_client,
+    get_posts_index,
+    meili_enabled,
+    post_to_document,
+    posts_index_name,
+)
+from forum.search_outbox import enqueue_post_changes
+
+
+CHECKPOINT_FILE = 'reindex_posts-{}.json'
 
 
 class Command(BaseCommand):
     help = 'Reindex posts into Meilisearch.'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help='Documents per add_documents call.')
+        parser.add_argument('--workers', type=int, default=4, help='Batches in flight at once.')
+        parser.add_argument('--resume', action='store_true', help='Continue from the last checkpoint.')
+        parser.add_argument('--in-place', action='store_true', help='Skip the shadow index and swap.')
+        parser.add_argument('--checkpoint', help='Checkpoint file (default: in the system temp directory).')
+        parser.add_argument('--task-timeout', type=float, default=300.0, help='Seconds to wait for each Meilisearch task.')
+
     def handle(self, *args, **options):
         if not meili_enabled():
             self.stdout.write(self.style.ERROR('MEILI_URL not configured or meilisearch package missing.'))
             self.stdout.write('Set MEILI_URL/MEILI_API_KEY in backend/.env and run again.')
             return
 
-        ensure_posts_index_settings()
-        index = get_posts_index()
+        chunk_size = max(1, int(options['chunk_size']))
+        workers = max(1, int(options['workers']))
+        self.timeout_ms = int(max(1.0, float(options['task_timeout'])) * 1000)
+        in_place = bool(options['in_place'])
+
+        client = get_client(timeout=INDEX_TIMEOUT_SECONDS)
+        live_name = posts_index_name()
+        checkpoint = Path(options['checkpoint'] or Path(tempfile.gettempdir()) / CHECKPOINT_FILE.format(live_name))
+        target_name = live_name if in_place else f'{live_name}__reindex'
+
+        state = self._load_checkpoint(checkpoint) if options['resume'] else None
+        if state is not None:
+            if state.get('index') != target_name:
+                raise CommandError('Checkpoint belongs to a different target index; run again without --resume.')
+            last_id = int(state.get('last_id') or 0)
+            started_at = parse_datetime(state.get('started_at') or '') or timezone.now()
+            self.stdout.write(f'Resuming after post id {last_id}.')
+        else:
+            last_id = 0
+            started_at = timezone.now()
+            if not in_place:
+                # Leftovers from an abandoned run would mix stale documents in.
+                self._wait(client, client.delete_index(target_name), allow_failure=True)
+            self._wait(client, client.create_index(target_name, {'primaryKey': 'id'}), allow_failure=True)
+            self._save_checkpoint(checkpoint, target_name, last_id, started_at)
+
+        ensure_posts_index_settings(get_posts_index(target_name, timeout=INDEX_TIMEOUT_SECONDS))
+
+        qs = (
+            Post.objects.select_related('board', 'author')
+            .filter(is_deleted=False, id__gt=last_id)
+            .order_by('id')
+        )
+
+        t0 = time.monotonic()
+        indexed = 0
+        seq = 0
+        next_seq = 0
+        in_flight: Dict[object, Tuple[int, int, int]] = {}
+        finished: Dict[int, Tuple[int, int]] = {}
+
+        def collect(futures) -> None:
+            nonlocal indexed, next_seq, last_id
+            for fut in futures:
+                batch_seq, batch_last_id, count = in_flight.pop(fut)
+                fut.result()
+                finished[batch_seq] = (batch_last_id, count)
+            # Batches finish out of order; only checkpoint the contiguous prefix.
+            advanced = False
+            while next_seq in finished:
+                batch_last_id, count = finished.pop(next_seq)
+                next_seq += 1
+                last_id = batch_last_id
+                indexed += count
+                advanced = True
+            if advanced:
+                self._save_checkpoint(checkpoint, target_name, last_id, started_at)
+                if int(options.get('verbosity', 1)) > 1:
+                    self.stdout.write(f'{indexed} posts, last id {last_id}, {self._rate(indexed, t0):.0f} docs/s')
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            try:
+                for docs in self._batches(qs, chunk_size):
+                    if len(in_flight) >= workers:
+                        done, _pending = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                        collect(done)
+                    fut = pool.submit(self._send, target_name, docs)
+                    in_flight[fut] = (seq, int(docs[-1]['id']), len(docs))
+                    seq += 1
+                if in_flight:
+                    collect(wait(list(in_flight)).done)
+            except Exception as exc:
+                raise CommandError(f'Reindex stopped after post id {last_id} ({exc}); rerun with --resume.') from exc
+
+        if not in_place:
+            # swap_indexes needs both sides to exist (first run on a fresh server).
+            self._wait(client, client.create_index(live_name, {'primaryKey': 'id'}), allow_failure=True)
+            self._wait(client, client.swap_indexes([{'indexes': [live_name, target_name]}]))
+            self._wait(client, client.delete_index(target_name), allow_failure=True)
+
+        touched = Post.objects.filter(
+            Q(updated_at__gte=started_at) | Q(reviewed_at__gte=started_at) | Q(deleted_at__gte=started_at)
+        ).values_list('id', flat=True)
+        with transaction.atomic():
+            enqueue_post_changes(list(touched))
+
+        checkpoint.unlink(missing_ok=True)
+        elapsed = time.monotonic() - t0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f'Indexed {indexed} posts into {live_name} in {elapsed:.1f}s ({self._rate(indexed, t0):.0f} docs/s).'
+            )
+        )
+
+    @staticmethod
+    def _batches(qs, size: int) -> Iterator[List[dict]]:
+        batch: List[dict] = []
+        for post in qs.iterator(chunk_size=size):
+            batch.append(post_to_document(post))
+            if len(batch) >= size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _send(self, index_name: str, docs: List[dict]) -> None:
+        # Runs in a worker thread: use that thread's pooled client, not the main one.
+        index = get_posts_index(index_name, timeout=INDEX_TIMEOUT_SECONDS)
+        self._wait(get_client(timeout=INDEX_TIMEOUT_SECONDS), index.add_documents(docs, primary_key='id'))
+
+    def _wait(self, client, task_info, *, allow_failure: bool = False):
+        task = client.wait_for_task(task_info.task_uid, timeout_in_ms=self.timeout_ms, interval_in_ms=100)
+        if task.status != 'succeeded' and not allow_failure:
+            raise CommandError(f'Meilisearch task {task.uid} {task.status}: {task.error}')
+        return task
+
+    @staticmethod
+    def _rate(count: int, t0: float) -> float:
+        elapsed = time.monotonic() - t0
+        return (count / elapsed) if elapsed > 0 else 0.0
 
-        qs = Post.objects.select_related('board', 'author').all().order_by('id')
-        docs = [post_to_document(p) for p in qs]
+    @staticmethod
+    def _load_checkpoint(path: Path) -> Optional[dict]:
+        try:
+            return json.loads(path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return None
 
-        # Meilisearch can accept batch documents. For large data, chunking is advised.
-        task = index.add_documents(docs, primary_key='id')
-        self.stdout.write(self.style.SUCCESS(f'Indexed {len(docs)} posts. task={task}'))
+    @staticmethod
+    def _save_checkpoint(path: Path, index_name: str, last_id: int, started_at) -> None:
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(
+            json.dumps({'index': index_name, 'last_id': int(last_id), 'started_at': started_at.isoformat()}),
+            encoding='utf-8',
+        )
+        tmp.replace(path)
@@ -0,0 +1,91 @@
+"""Rebuild the Meilisearch indexes behind /api/search/all/ (everything but posts).
+
+Usage:
+  python manage.py reindex_search_entities
+  python manage.py reindex_search_entities --entity comments --entity tags
+  python manage.py reindex_search_entities --clear   # drop stale documents first
+
+Notes:
+- Posts have their own command (reindex_posts, with a shadow-index swap).
+- Rows are streamed by id in chunks; rows that should not be searchable
+  (deleted comments, comments on hidden posts, inactive users) are deleted
+  from the index instead of added.
+- Day-to-day changes go through the search outbox (`search_sync`); this is for
+  the first setup and for repairs.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from forum.search_federated import (
+    ENTITIES,
+    ensure_entity_index_settings,
+    entity_documents,
+    entity_index_name,
+    entity_queryset,
+)
+from forum.search_meili import INDEX_TIMEOUT_SECONDS, get_client, get_index, meili_enabled
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the comments/users/tags/resources Meilisearch indexes.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--entity',
+            action='append',
+            choices=[e for e in ENTITIES if e != 'posts'],
+            help='Entity to rebuild (repeatable; default: all).',
+        )
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--clear', action='store_true', help='Delete all documents before indexing.')
+        parser.add_argument('--task-timeout', type=float, default=300.0, help='Seconds to wait for each Meilisearch task.')
+
+    def handle(self, *args, **options):
+        if not meili_enabled():
+            self.stdout.write(self.style.ERROR('MEILI_URL not configured or meilisearch package missing.'))
+            return
+
+        entities = options['entity'] or [e for e in ENTITIES if e != 'posts']
+        chunk_size = max(1, int(options['chunk_size']))
+        self.timeout_ms = int(max(1.0, float(options['task_timeout'])) * 1000)
+        client = get_client(timeout=INDEX_TIMEOUT_SECONDS)
+
+        for entity in entities:
+            t0 = time.monotonic()
+            name = entity_index_name(entity)
+            self._wait(client, client.create_index(name, {'primaryKey': 'id'}), allow_failure=True)
+            index = get_index(name, timeout=INDEX_TIMEOUT_SECONDS)
+            ensure_entity_index_settings(entity, index)
+            if options['clear']:
+                self._wait(client, index.delete_all_documents())
+
+            added = removed = 0
+            last_id = 0
+            while True:
+                ids = list(
+                    entity_queryset(entity).filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size]
+                )
+                if not ids:
+                    break
+                last_id = ids[-1]
+                docs, missing = entity_documents(entity, ids)
+                if docs:
+                    self._wait(client, index.add_documents(docs, primary_key='id'))
+                if missing and not options['clear']:
+                    self._wait(client, index.delete_documents([str(x) for x in missing]))
+                added += len(docs)
+                removed += len(missing)
+
+            self.stdout.write(
+                self.style.SUCCESS(f'{name}: indexed {added}, skipped {removed} in {time.monotonic() - t0:.1f}s.')
+            )
+
+    def _wait(self, client, task_info, *, allow_failure: bool = False):
+        task = client.wait_for_task(task_info.task_uid, timeout_in_ms=self.timeout_ms, interval_in_ms=100)
+        if task.status != 'succeeded' and not allow_failure:
+            raise CommandError(f'Meilisearch task {task.uid} {task.status}: {task.error}')
+        return task
@@ -0,0 +1,58 @@
+"""Drain the search outbox into Meilisearch.
+
+Usage:
+  python manage.py search_sync            # run forever
+  python manage.py search_sync --once     # drain what is queued, then exit
+
+Notes:
+- Post writes (create/update/approve/reject/delete) and comment, user, tag
+  and resource changes enqueue SearchOutbox rows in their own transaction;
+  this worker applies them in batches to the matching index.
+- Several workers may run at once on databases with SKIP LOCKED support.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from forum.search_meili import meili_enabled
+from forum.search_outbox import SEARCH_OUTBOX_BATCH_SIZE, drain_search_outbox
+
+
+class Command(BaseCommand):
+    help = 'Apply queued post changes to the Meilisearch index.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Exit when the outbox is empty.')
+        parser.add_argument('--batch-size', type=int, default=SEARCH_OUTBOX_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=2.0, help='Seconds to sleep when idle.')
+
+    def handle(self, *args, **options):
+        if not meili_enabled():
+            self.stdout.write(self.style.ERROR('MEILI_URL not configured or meilisearch package missing.'))
+            return
+
+        batch_size = int(options['batch_size'])
+        interval = max(0.1, float(options['interval']))
+        once = bool(options['once'])
+
+        while True:
+            try:
+                result = drain_search_outbox(batch_size=batch_size)
+            except Exception as exc:
+                self.stderr.write(f'search_sync batch failed: {exc!r}')
+                if once:
+                    raise
+                time.sleep(interval)
+                continue
+
+            if result['rows']:
+                self.stdout.write(
+                    f"rows={result['rows']} upserted={result['upserted']} deleted={result['deleted']}"
+                )
+                continue
+            if once:
+                return
+            time.sleep(interval)
@@ -0,0 +1,24 @@
+"""Release expired moderation claims.
+
+Usage:
+  python manage.py sweep_moderation_claims
+
+Notes:
+- Claims older than MODERATION_CLAIM_TTL_MINUTES are already ignored by
+  claim/claim-next, so this is housekeeping: it keeps the "claimed by" badge in
+  the moderation UI honest. Run it from cron every few minutes.
+"""
+
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from forum.moderation import claim_ttl, release_stale_claims
+
+
+class Command(BaseCommand):
+    help = 'Release moderation claims older than the claim TTL.'
+
+    def handle(self, *args, **options):
+        released = release_stale_claims()
+        self.stdout.write(self.style.SUCCESS(f'Released {released} stale claims (ttl={claim_ttl()}).'))
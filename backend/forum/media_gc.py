@@ -0,0 +1,207 @@
+"""Garbage collection of stored images nothing references any more.
+
+A file under GC_DIRS is referenced when any of these names it:
+- PostImage (post bodies and covers, forum.post_images) or Post.cover_image
+- User.avatar / User.banner, HomeHeroSlide.image / BoardHeroSlide.image
+- a pending/processing ImageJob's original, or a job result produced within
+  the grace period (an upload the author has not saved into a post yet)
+- for `<dir>/variants/...` files: the ImageAsset listing it, whose source is
+  referenced
+
+Storage is walked one directory listing at a time and checked in batches, so
+memory does not grow with the number of files. Files modified within the
+grace period are never deleted. Deleting a file also drops its ImageBlob and
+ImageAsset rows; variants of a deleted source become orphans themselves.
+
+ImageBlob.ref_count is not consulted: it is maintained on write and not a
+guarantee. recount_blob_refs() rewrites it for every blob (for rows changed
+outside the API/admin).
+"""
+
+from __future__ import annotations
+
+import posixpath
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+
+from .image_jobs import ORIGINALS_DIR
+from .image_store import BLOB_DIR, refresh_blob_refs
+from .models import BoardHeroSlide, HomeHeroSlide, ImageAsset, ImageBlob, ImageJob, Post, PostImage
+
+
+# Every directory images are written to (upload_to of the image fields, the
+# blob store, job originals, and pre-blob editor uploads).
+GC_DIRS = ('uploads', BLOB_DIR, 'covers', 'avatars', 'banners', 'hero', 'board_hero', ORIGINALS_DIR)
+GC_BATCH_SIZE = 500
+GC_GRACE_HOURS = 72
+VARIANTS_DIR = 'variants'
+# Extensions a variant's source may have (variant names drop the source's).
+SOURCE_EXTS = ('jpg', 'png', 'webp', 'jpeg', 'gif')
+
+
+def iter_storage_files(top: str, storage=default_storage) -> Iterator[str]:
+    """Yield the names of all files under `top`, one directory listing at a time."""
+
+    stack = [top]
+    while stack:
+        folder = stack.pop()
+        try:
+            dirs, files = storage.listdir(folder)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        for name in sorted(files):
+            yield f'{folder}/{name}' if folder else name
+        stack.extend(f'{folder}/{d}' if folder else d for d in sorted(dirs, reverse=True))
+
+
+def _variant_source_candidates(name: str) -> List[str]:
+    folder, base = posixpath.split(name)
+    parent, leaf = posixpath.split(folder)
+    if leaf != VARIANTS_DIR:
+        return []
+    stem = posixpath.splitext(base)[0].rpartition('-')[0]
+    if not stem:
+        return []
+    return [posixpath.join(parent, f'{stem}.{ext}') for ext in SOURCE_EXTS]
+
+
+def _directly_referenced(names: Set[str], since: datetime) -> Set[str]:
+    if not names:
+        return set()
+    User = get_user_model()
+    found: Set[str] = set()
+    found.update(PostImage.objects.filter(name__in=names).values_list('name', flat=True))
+    found.update(Post.objects.filter(cover_image__in=names).values_list('cover_image', flat=True))
+    for field in ('avatar', 'banner'):
+        found.update(User.objects.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+    for model in (HomeHeroSlide, BoardHeroSlide):
+        found.update(model.objects.filter(image__in=names).values_list('image', flat=True))
+    found.update(
+        ImageJob.objects.filter(
+            source_name__in=names, status__in=(ImageJob.Status.PENDING, ImageJob.Status.PROCESSING)
+        ).values_list('source_name', flat=True)
+    )
+    found.update(
+        ImageJob.objects.filter(result_name__in=names)
+        .filter(Q(finished_at__gte=since) | Q(finished_at__isnull=True, created_at__gte=since))
+        .values_list('result_name', flat=True)
+    )
+    return found
+
+
+def referenced_names(names: Iterable[str], *, since: datetime) -> Set[str]:
+    """The subset of `names` still in use (see the module docstring)."""
+
+    names = set(names)
+    found = _directly_referenced(names, since)
+
+    candidates: Dict[str, List[str]] = {}
+    for name in names - found:
+        sources = _variant_source_candidates(name)
+        if sources:
+            candidates[name] = sources
+    if candidates:
+        assets = ImageAsset.objects.filter(name__in={s for sources in candidates.values() for s in sources})
+        owner: Dict[str, str] = {}
+        for asset in assets:
+            for widths in (asset.variants or {}).values():
+                for variant in widths.values():
+                    if variant in candidates:
+                        owner[variant] = asset.name
+        live_sources = _directly_referenced(set(owner.values()), since)
+        found.update(v for v, source in owner.items() if source in live_sources)
+    return found
+
+
+def _delete(names: List[str], storage) -> List[str]:
+    deleted = []
+    for name in names:
+        try:
+            storage.delete(name)
+        except Exception:
+            continue
+        deleted.append(name)
+    if deleted:
+        ImageBlob.objects.filter(name__in=deleted).delete()
+        ImageAsset.objects.filter(name__in=deleted).delete()
+    return deleted
+
+
+def collect_garbage(
+    *,
+    grace_hours: float = GC_GRACE_HOURS,
+    dirs: Iterable[str] = GC_DIRS,
+    batch_size: int = GC_BATCH_SIZE,
+    dry_run: bool = False,
+    limit: int = 0,
+    on_orphan: Optional[Callable[[str, int], None]] = None,
+    storage=default_storage,
+) -> Counter:
+    """Delete unreferenced files older than the grace period. Returns counts.
+
+    Keys: scanned, recent, referenced, orphaned, deleted, bytes (of orphans).
+    With dry_run nothing is deleted; on_orphan(name, size) sees each orphan.
+    `limit` stops after that many orphans (0 = no limit).
+    """
+
+    stats: Counter = Counter()
+    cutoff = timezone.now() - timedelta(hours=grace_hours)
+    batch: List[str] = []
+
+    def flush() -> bool:
+        referenced = referenced_names(batch, since=cutoff)
+        stats['referenced'] += len(referenced)
+        orphans = [n for n in batch if n not in referenced]
+        if limit:
+            orphans = orphans[: max(0, limit - stats['orphaned'])]
+        for name in orphans:
+            try:
+                size = storage.size(name)
+            except Exception:
+                size = 0
+            stats['bytes'] += size
+            if on_orphan is not None:
+                on_orphan(name, size)
+        stats['orphaned'] += len(orphans)
+        if orphans and not dry_run:
+            stats['deleted'] += len(_delete(orphans, storage))
+        batch.clear()
+        return bool(limit) and stats['orphaned'] >= limit
+
+    for top in dirs:
+        for name in iter_storage_files(top, storage):
+            stats['scanned'] += 1
+            try:
+                modified = storage.get_modified_time(name)
+            except Exception:
+                continue
+            if timezone.is_naive(modified):
+                modified = timezone.make_aware(modified)
+            if modified >= cutoff:
+                stats['recent'] += 1
+                continue
+            batch.append(name)
+            if len(batch) >= batch_size and flush():
+                return stats
+    if batch:
+        flush()
+    return stats
+
+
+def recount_blob_refs(*, batch_size: int = GC_BATCH_SIZE) -> int:
+    """Set ImageBlob.ref_count to the number of rows naming each blob. Returns rows changed."""
+
+    changed = 0
+    last_id = 0
+    while True:
+        blobs = list(ImageBlob.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'name')[:batch_size])
+        if not blobs:
+            return changed
+        last_id = blobs[-1][0]
+        changed += refresh_blob_refs(name for _id, name in blobs)
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0016_tag_post_tags'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='postrevision',
+            name='body_delta',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='postrevision',
+            name='storage',
+            field=models.CharField(choices=[('full', 'Full'), ('delta', 'Delta')], default='full', max_length=8),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:26
+
+from django.db import migrations, models
+from django.db.models import Max, OuterRef, Subquery
+
+
+def backfill_revision_seq(apps, schema_editor):
+    Post = apps.get_model('forum', 'Post')
+    PostRevision = apps.get_model('forum', 'PostRevision')
+
+    last_seq = (
+        PostRevision.objects.filter(post_id=OuterRef('pk'))
+        .values('post_id')
+        .annotate(m=Max('sequence'))
+        .values('m')
+    )
+    Post.objects.filter(id__in=PostRevision.objects.values('post_id')).update(revision_seq=Subquery(last_seq))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0017_postrevision_delta_storage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='revision_seq',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_revision_seq, migrations.RunPython.noop),
+    ]
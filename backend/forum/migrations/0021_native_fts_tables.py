@@ -0,0 +1,118 @@
+import re
+from collections import Counter
+
+from django.db import migrations
+
+
+SQLITE_FTS_TABLE = 'forum_post_fts'
+POSTGRES_FTS_TABLE = 'forum_post_search'
+
+# Frozen copy of forum.search_local's tokenizer as of this migration, so later
+# changes to the app code do not change what this migration writes.
+TITLE_WEIGHT = 3
+MAX_TERM_LENGTH = 64
+_CJK = r'\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af'
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W{_CJK}]+', re.UNICODE)
+_CJK_RE = re.compile(rf'[{_CJK}]')
+
+
+def tokenize(text):
+    tokens = []
+    for run in _TOKEN_RE.findall((text or '').lower()):
+        if _CJK_RE.match(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+        elif len(run) <= MAX_TERM_LENGTH:
+            tokens.append(run)
+    return tokens
+
+
+def _live_posts(Post):
+    last_id = 0
+    while True:
+        rows = list(
+            Post.objects.filter(id__gt=last_id, is_deleted=False).order_by('id').values_list('id', 'title', 'body')[:500]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+def fill_inverted_index(apps):
+    SearchDocument = apps.get_model('forum', 'SearchDocument')
+    SearchPosting = apps.get_model('forum', 'SearchPosting')
+    for rows in _live_posts(apps.get_model('forum', 'Post')):
+        documents = []
+        postings = []
+        for post_id, title, body in rows:
+            title_tokens = tokenize(title)
+            body_tokens = tokenize(body)
+            tf = Counter(body_tokens)
+            for token in title_tokens:
+                tf[token] += TITLE_WEIGHT
+            documents.append(SearchDocument(post_id=post_id, length=len(title_tokens) + len(body_tokens)))
+            postings.extend(SearchPosting(term=term, post_id=post_id, tf=count) for term, count in tf.items())
+        SearchDocument.objects.bulk_create(documents)
+        SearchPosting.objects.bulk_create(postings, batch_size=1000)
+
+
+def create_fts_tables(apps, schema_editor):
+    from django.db import DatabaseError
+
+    connection = schema_editor.connection
+    Post = apps.get_model('forum', 'Post')
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            try:
+                cursor.execute(f"CREATE VIRTUAL TABLE {SQLITE_FTS_TABLE} USING fts5(title, body, tokenize='unicode61')")
+            except DatabaseError:
+                # SQLite built without FTS5: the portable inverted index is used instead.
+                fill_inverted_index(apps)
+                return
+            insert = f'INSERT INTO {SQLITE_FTS_TABLE} (rowid, title, body) VALUES (%s, %s, %s)'
+        elif connection.vendor == 'postgresql':
+            cursor.execute(
+                f'CREATE TABLE {POSTGRES_FTS_TABLE} ('
+                'post_id bigint PRIMARY KEY REFERENCES forum_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, '
+                'document tsvector NOT NULL)'
+            )
+            cursor.execute(f'CREATE INDEX {POSTGRES_FTS_TABLE}_document_gin ON {POSTGRES_FTS_TABLE} USING GIN (document)')
+            insert = (
+                f'INSERT INTO {POSTGRES_FTS_TABLE} (post_id, document) '
+                "VALUES (%s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))"
+            )
+        else:
+            fill_inverted_index(apps)
+            return
+
+        for rows in _live_posts(Post):
+            cursor.executemany(
+                insert,
+                [(post_id, ' '.join(tokenize(title)), ' '.join(tokenize(body))) for post_id, title, body in rows],
+            )
+
+
+def drop_fts_tables(apps, schema_editor):
+    apps.get_model('forum', 'SearchPosting').objects.all().delete()
+    apps.get_model('forum', 'SearchDocument').objects.all().delete()
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {SQLITE_FTS_TABLE}')
+        elif connection.vendor == 'postgresql':
+            cursor.execute(f'DROP TABLE IF EXISTS {POSTGRES_FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0020_builtin_search_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts_tables, drop_fts_tables),
+    ]
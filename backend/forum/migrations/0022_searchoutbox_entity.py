@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0021_native_fts_tables'),
+    ]
+
+    operations = [
+        migrations.RenameField(
+            model_name='searchoutbox',
+            old_name='post_id',
+            new_name='object_id',
+        ),
+        migrations.AddField(
+            model_name='searchoutbox',
+            name='entity',
+            field=models.CharField(choices=[('posts', 'Posts'), ('comments', 'Comments'), ('users', 'Users'), ('tags', 'Tags'), ('resources', 'Resources')], default='posts', max_length=16),
+        ),
+    ]
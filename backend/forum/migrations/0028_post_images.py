@@ -0,0 +1,71 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:17
+
+import posixpath
+import re
+from urllib.parse import unquote
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Frozen copy of forum.post_images' extractor as of this migration, so later
+# changes to the app code do not change what this migration writes.
+MAX_NAME_LENGTH = 300
+
+
+def image_refs(body, cover_name):
+    media_url = settings.MEDIA_URL or '/media/'
+    pattern = re.compile(re.escape(media_url) + r'([^\s"\'()<>\[\]?#]+)')
+    refs = set()
+    for match in pattern.finditer(body or ''):
+        name = posixpath.normpath(unquote(match.group(1)))
+        if name.startswith(('.', '/')) or len(name) > MAX_NAME_LENGTH:
+            continue
+        refs.add((name, 'body'))
+    if cover_name:
+        refs.add((cover_name, 'cover'))
+    return refs
+
+
+def backfill_post_images(apps, schema_editor):
+    Post = apps.get_model('forum', 'Post')
+    PostImage = apps.get_model('forum', 'PostImage')
+
+    last_id = 0
+    while True:
+        rows = list(Post.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'body', 'cover_image')[:500])
+        if not rows:
+            return
+        PostImage.objects.bulk_create(
+            [
+                PostImage(post_id=post_id, name=name, source=source)
+                for post_id, body, cover in rows
+                for name, source in image_refs(body, cover or '')
+            ],
+            batch_size=1000,
+        )
+        last_id = rows[-1][0]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0027_image_asset_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PostImage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(db_index=True, max_length=300)),
+                ('source', models.CharField(choices=[('body', 'Body'), ('cover', 'Cover')], default='body', max_length=8)),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='images', to='forum.post')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('post', 'name', 'source'), name='uniq_post_image')],
+            },
+        ),
+        migrations.RunPython(backfill_post_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0028_post_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='imagejob',
+            name='cost',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
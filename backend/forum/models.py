@@ -1,3 +1,5 @@
+import uuid
+
 from django.conf import settings
 from django.db import models
 
@@ -77,6 +79,8 @@ class Post(models.Model):
 		related_name='claimed_posts',
 	)
 	moderation_claimed_at = models.DateTimeField(null=True, blank=True)
+	# Last PostRevision.sequence handed out (advanced atomically by forum.revisions).
+	revision_seq = models.PositiveIntegerField(default=0)
 
 	class Meta:
 		ordering = ['-is_pinned', '-created_at']
@@ -94,11 +98,27 @@ class Post(models.Model):
 
 
 class PostRevision(models.Model):
+	"""A snapshot of a post's editable fields.
+
+	Storage:
+	- FULL rows keep the whole body in `body`.
+	- DELTA rows leave `body` empty and store a zlib-compressed line delta
+	  against the previous revision in `body_delta` (see forum.revisions).
+	- Every REVISION_SNAPSHOT_INTERVAL-th revision is FULL, so rebuilding any
+	  body applies at most interval-1 deltas.
+	"""
+
+	class Storage(models.TextChoices):
+		FULL = 'full', 'Full'
+		DELTA = 'delta', 'Delta'
+
 	post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='revisions')
 	editor = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL, related_name='post_revisions')
 	sequence = models.PositiveIntegerField()
 	title = models.CharField(max_length=200)
 	body = models.TextField(blank=True)
+	storage = models.CharField(max_length=8, choices=Storage.choices, default=Storage.FULL)
+	body_delta = models.BinaryField(null=True, blank=True)
 	cover_image_name = models.CharField(max_length=300, blank=True)
 	created_at = models.DateTimeField(auto_now_add=True)
 
@@ -113,6 +133,121 @@ class PostRevision(models.Model):
 		return f"post:{self.post_id} rev:{self.sequence}"
 
 
+class PostChange(models.Model):
+	"""Log of committed post writes, shared by every process (forum.suggest_index).
+
+	The highest id is the "posts version": processes keep the id they last
+	applied and re-read only the posts logged after it. Rows older than
+	suggest_index.CHANGE_LOG_TTL_SECONDS are pruned.
+	"""
+
+	id = models.BigAutoField(primary_key=True)
+	post_id = models.BigIntegerField()
+	created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+	def __str__(self) -> str:
+		return f"post-change:{self.id} post:{self.post_id}"
+
+
+class SearchOutbox(models.Model):
+	"""Pending search-index changes, written in the same transaction as the change.
+
+	The `search_sync` command drains rows in batches. Multiple rows for one object
+	are coalesced: the worker indexes the object's current state (or deletes it).
+	`entity` is also the default Meilisearch index name (see search_federated).
+	"""
+
+	class Entity(models.TextChoices):
+		POSTS = 'posts', 'Posts'
+		COMMENTS = 'comments', 'Comments'
+		USERS = 'users', 'Users'
+		TAGS = 'tags', 'Tags'
+		RESOURCES = 'resources', 'Resources'
+
+	class Op(models.TextChoices):
+		UPSERT = 'upsert', 'Upsert'
+		DELETE = 'delete', 'Delete'
+
+	entity = models.CharField(max_length=16, choices=Entity.choices, default=Entity.POSTS)
+	object_id = models.BigIntegerField(db_index=True)
+	op = models.CharField(max_length=10, choices=Op.choices, default=Op.UPSERT)
+	created_at = models.DateTimeField(auto_now_add=True)
+	# Set while a worker is sending the row; stale claims are taken over.
+	claimed_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		ordering = ['id']
+
+	def __str__(self) -> str:
+		return f"outbox:{self.id} {self.entity}:{self.object_id} {self.op}"
+
+
+class SearchDocument(models.Model):
+	"""Per-post stats for the built-in search engine (see forum.search_local)."""
+
+	post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+	# Token count (title + body); BM25 length normalization.
+	length = models.PositiveIntegerField(default=0)
+	indexed_at = models.DateTimeField(auto_now=True)
+
+
+class SearchPosting(models.Model):
+	"""Inverted index row: `term` occurs `tf` times (title weighted) in `post`."""
+
+	term = models.CharField(max_length=64)
+	post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='search_postings')
+	tf = models.PositiveIntegerField(default=1)
+
+	class Meta:
+		unique_together = (('term', 'post'),)
+
+	def __str__(self) -> str:
+		return f"{self.term}:{self.post_id}"
+
+
+class SavedSearch(models.Model):
+	"""A user's stored query; newly published posts that match it notify the user.
+
+	The query is stored parsed (like search_meili.AdvancedQuery) plus its
+	required keys in SavedSearchKey, the reverse index forum.saved_searches
+	matches new posts against.
+	"""
+
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='saved_searches')
+	query = models.CharField(max_length=200)
+	text = models.CharField(max_length=200, blank=True, default='')
+	filters = models.JSONField(default=list, blank=True)
+	qualifiers = models.JSONField(default=list, blank=True)
+	# Number of SavedSearchKey rows; a post matches when it has all of them.
+	key_count = models.PositiveSmallIntegerField(default=0)
+	is_active = models.BooleanField(default=True)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	class Meta:
+		ordering = ['-created_at', '-id']
+		constraints = [
+			models.UniqueConstraint(fields=['user', 'query'], name='uniq_saved_search_user_query'),
+		]
+
+	def advanced_query(self):
+		from .search_meili import AdvancedQuery
+
+		return AdvancedQuery(text=self.text, filters=list(self.filters or []), qualifiers=[tuple(x) for x in self.qualifiers or []])
+
+	def __str__(self) -> str:
+		return f"saved_search:{self.id} user:{self.user_id} {self.query}"
+
+
+class SavedSearchKey(models.Model):
+	"""Reverse index: one row per required token/filter of a saved search."""
+
+	saved_search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name='keys')
+	key = models.CharField(max_length=100, db_index=True)
+
+	class Meta:
+		unique_together = ('saved_search', 'key')
+
+
 class Comment(models.Model):
 	post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
 	author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, related_name='comments')
@@ -239,3 +374,141 @@ class BoardHeroSlide(models.Model):
 
 	def __str__(self) -> str:
 		return f"board:{self.board_id} hero:{self.id} post:{self.post_id}"
+
+
+class ImageAsset(models.Model):
+	"""Derived data for a stored image, keyed by its storage name.
+
+	- variants: {"webp": {"320": "<storage name>", ...}, "avif": {...}}, the
+	  downscaled copies serializers expose as a srcset map (forum.image_variants).
+	- width/height (as displayed), size (bytes), format, dominant_color and
+	  placeholder (a tiny WebP data: URI) let clients lay out and paint a
+	  preview before the image loads; serializers embed them without opening
+	  the file.
+	"""
+
+	name = models.CharField(max_length=300, unique=True)
+	variants = models.JSONField(default=dict, blank=True)
+	width = models.PositiveIntegerField(default=0)
+	height = models.PositiveIntegerField(default=0)
+	size = models.PositiveIntegerField(default=0)
+	format = models.CharField(max_length=8, blank=True, default='')
+	dominant_color = models.CharField(max_length=7, blank=True, default='')
+	placeholder = models.TextField(blank=True, default='')
+	created_at = models.DateTimeField(auto_now_add=True)
+	updated_at = models.DateTimeField(auto_now=True)
+
+	def __str__(self) -> str:
+		return f"image-asset:{self.name}"
+
+
+class ImageBlob(models.Model):
+	"""A processed image stored once under its content hash (forum.image_store).
+
+	Notes:
+	- name is `images/<sha[:2]>/<sha256>.<ext>`; sha256 is of the processed bytes.
+	- ref_count: rows naming this blob (PostImage, avatars/banners, hero
+	  slides), recounted on write (image_store.refresh_blob_refs). Files are
+	  only removed by garbage collection (`manage.py gc_media`, which decides
+	  from actual references and can --recount this), never when the count drops.
+	"""
+
+	sha256 = models.CharField(max_length=64, unique=True)
+	name = models.CharField(max_length=300, unique=True)
+	size = models.PositiveIntegerField(default=0)
+	width = models.PositiveIntegerField(default=0)
+	height = models.PositiveIntegerField(default=0)
+	ref_count = models.PositiveIntegerField(default=0)
+	created_at = models.DateTimeField(auto_now_add=True)
+
+	def __str__(self) -> str:
+		return f"image-blob:{self.name} refs={self.ref_count}"
+
+
+class ImageBlobSource(models.Model):
+	"""sha256 of an uploaded original -> the blob it was processed into.
+
+	Lets a re-upload of the same file resolve to the existing blob without
+	storing or re-encoding it.
+	"""
+
+	sha256 = models.CharField(max_length=64, unique=True)
+	blob = models.ForeignKey(ImageBlob, on_delete=models.CASCADE, related_name='sources')
+	created_at = models.DateTimeField(auto_now_add=True)
+
+
+class ImageJob(models.Model):
+	"""An uploaded original waiting for (or done with) off-request processing.
+
+	Notes:
+	- Requests only sniff the header and store the original under `source_name`;
+	  forum.image_jobs decodes/re-encodes it in a worker process.
+	- target_id is the Post (cover) or User (avatar/banner) the result is assigned to;
+	  plain editor uploads (kind=upload) just expose `result_name` once ready.
+	- The id is what clients poll: GET /api/posts/images/<id>/.
+	"""
+
+	class Kind(models.TextChoices):
+		UPLOAD = 'upload', 'Upload'
+		COVER = 'cover', 'Cover'
+		AVATAR = 'avatar', 'Avatar'
+		BANNER = 'banner', 'Banner'
+
+	class Status(models.TextChoices):
+		PENDING = 'pending', 'Pending'
+		PROCESSING = 'processing', 'Processing'
+		READY = 'ready', 'Ready'
+		FAILED = 'failed', 'Failed'
+
+	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+	user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='image_jobs')
+	kind = models.CharField(max_length=10, choices=Kind.choices, default=Kind.UPLOAD)
+	status = models.CharField(max_length=12, choices=Status.choices, default=Status.PENDING)
+	target_id = models.BigIntegerField(null=True, blank=True)
+	source_name = models.CharField(max_length=300, blank=True)
+	# Hash of the original; blank for jobs created before deduplication.
+	source_sha256 = models.CharField(max_length=64, blank=True)
+	content_type = models.CharField(max_length=30)
+	result_name = models.CharField(max_length=300, blank=True)
+	width = models.PositiveIntegerField(null=True, blank=True)
+	height = models.PositiveIntegerField(null=True, blank=True)
+	error = models.CharField(max_length=200, blank=True)
+	attempts = models.PositiveSmallIntegerField(default=0)
+	# Points taken from `user` when the result is assigned (paid avatar changes).
+	cost = models.PositiveIntegerField(default=0)
+	created_at = models.DateTimeField(auto_now_add=True)
+	started_at = models.DateTimeField(null=True, blank=True)
+	finished_at = models.DateTimeField(null=True, blank=True)
+
+	class Meta:
+		indexes = [
+			models.Index(fields=['status', 'created_at']),
+			models.Index(fields=['kind', 'target_id', 'created_at']),
+		]
+
+	def __str__(self) -> str:
+		return f"image-job:{self.id} {self.kind} {self.status}"
+
+
+class PostImage(models.Model):
+	"""A stored image referenced by a post: linked from its body, or its cover.
+
+	Maintained by forum.post_images.sync_post_images(); `manage.py gc_media`
+	keeps every name listed here.
+	"""
+
+	class Source(models.TextChoices):
+		BODY = 'body', 'Body'
+		COVER = 'cover', 'Cover'
+
+	post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='images')
+	name = models.CharField(max_length=300, db_index=True)
+	source = models.CharField(max_length=8, choices=Source.choices, default=Source.BODY)
+
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['post', 'name', 'source'], name='uniq_post_image'),
+		]
+
+	def __str__(self) -> str:
+		return f"post-image:{self.post_id} {self.source} {self.name}"
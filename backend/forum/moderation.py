@@ -0,0 +1,212 @@
+"""Moderation queue helpers.
+
+Claims are taken with conditional UPDATEs so two moderators can never both
+own a post:
+- claim_post(): one post, "UPDATE ... WHERE unclaimed OR stale OR mine".
+- claim_next_posts(): next N pending posts, using SELECT ... FOR UPDATE SKIP LOCKED
+  where the database supports it, otherwise per-row conditional UPDATEs.
+
+A claim older than MODERATION_CLAIM_TTL_MINUTES is considered stale: it can be
+taken over by anyone, and release_stale_claims() (run by the
+`sweep_moderation_claims` command) clears it for good.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from accounts.audit import write_audit_logs
+from notifications.models import Notification
+
+from .models import Post
+from .saved_searches import notify_saved_searches
+from .search_outbox import enqueue_post_changes
+
+
+BULK_MODERATION_MAX_IDS = 300
+
+
+def claim_ttl() -> timedelta:
+    minutes = int(getattr(settings, 'MODERATION_CLAIM_TTL_MINUTES', 30) or 30)
+    return timedelta(minutes=max(1, minutes))
+
+
+def stale_before(now=None):
+    return (now or timezone.now()) - claim_ttl()
+
+
+def claimable_q(*, user=None, now=None) -> Q:
+    """Posts that are unclaimed, whose claim expired, or (optionally) claimed by user."""
+
+    q = Q(moderation_claimed_by__isnull=True) | Q(moderation_claimed_at__lt=stale_before(now))
+    if user is not None:
+        q |= Q(moderation_claimed_by_id=user.id)
+    return q
+
+
+def pending_queue(*, allowed_board_ids: Optional[Iterable[int]] = None):
+    qs = Post.objects.filter(status=Post.Status.PENDING, is_deleted=False)
+    if allowed_board_ids is not None:
+        qs = qs.filter(board_id__in=list(allowed_board_ids))
+    return qs
+
+
+def claim_post(*, post_id: int, user, force: bool = False) -> bool:
+    """Atomically claim a single pending post. Returns False if someone else holds it."""
+
+    now = timezone.now()
+    qs = pending_queue().filter(id=post_id)
+    if not force:
+        qs = qs.filter(claimable_q(user=user, now=now))
+    return qs.update(moderation_claimed_by=user, moderation_claimed_at=now) == 1
+
+
+def claim_next_posts(*, user, limit: int, allowed_board_ids: Optional[Iterable[int]] = None, board_id: Optional[int] = None) -> List[int]:
+    """Claim up to `limit` of the oldest claimable pending posts. Returns claimed IDs."""
+
+    limit = max(1, int(limit))
+    now = timezone.now()
+    qs = pending_queue(allowed_board_ids=allowed_board_ids).filter(claimable_q(now=now))
+    if board_id:
+        qs = qs.filter(board_id=board_id)
+    qs = qs.order_by('created_at', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(qs.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            if ids:
+                Post.objects.filter(id__in=ids).update(moderation_claimed_by=user, moderation_claimed_at=now)
+            return ids
+
+    # No row locks (e.g. SQLite): race per row; the conditional UPDATE decides the winner.
+    claimed: List[int] = []
+    candidates = list(qs.values_list('id', flat=True)[: limit * 3])
+    for post_id in candidates:
+        won = (
+            pending_queue()
+            .filter(id=post_id)
+            .filter(claimable_q(now=now))
+            .update(moderation_claimed_by=user, moderation_claimed_at=now)
+        )
+        if won:
+            claimed.append(post_id)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+def release_stale_claims(*, now=None) -> int:
+    """Clear expired claims. Returns the number of posts released."""
+
+    return Post.objects.filter(
+        moderation_claimed_by__isnull=False,
+        moderation_claimed_at__lt=stale_before(now),
+    ).update(moderation_claimed_by=None, moderation_claimed_at=None)
+
+
+def notify_moderation_outcome(*, posts: Iterable[Any], decision: str, actor) -> None:
+    """Tell authors their posts were approved/rejected (one INSERT)."""
+
+    type_value = Notification.Type.POST_APPROVED if decision == 'approve' else Notification.Type.POST_REJECTED
+    rows = [
+        Notification(recipient_id=p.author_id, actor=actor, type=type_value, post_id=p.id)
+        for p in posts
+        if p.author_id and p.author_id != getattr(actor, 'id', None)
+    ]
+    if rows:
+        Notification.objects.bulk_create(rows)
+
+
+def bulk_moderate(*, user, post_ids: Iterable[int], decision: str, reason: str = '', request=None) -> Dict[str, Any]:
+    """Approve or reject many posts at once.
+
+    - One SELECT for the candidates (board permissions are set lookups).
+      Only pending posts are decided; others are skipped as 'not_pending'.
+    - One UPDATE for the accepted posts, guarded so concurrent decisions don't double-apply.
+    - Audit rows, notifications and search outbox rows are bulk-inserted.
+
+    Returns {'updated': [...ids], 'skipped': {id: reason}}.
+    """
+
+    from accounts.services import staff_allowed_board_ids
+
+    if decision not in ('approve', 'reject'):
+        raise ValueError('decision must be approve or reject')
+
+    ids = list(dict.fromkeys(int(x) for x in post_ids))[:BULK_MODERATION_MAX_IDS]
+    is_superuser = bool(getattr(user, 'is_superuser', False))
+    allowed = None if is_superuser else set(staff_allowed_board_ids(user, for_action='moderate'))
+    now = timezone.now()
+
+    skipped: Dict[int, str] = {}
+    accepted: List[Any] = []
+    rows = Post.objects.filter(id__in=ids).only('id', 'board_id', 'author_id', 'status', 'is_deleted', 'moderation_claimed_by_id', 'moderation_claimed_at')
+    found = {p.id: p for p in rows}
+    for post_id in ids:
+        p = found.get(post_id)
+        if p is None:
+            skipped[post_id] = 'not_found'
+        elif p.is_deleted:
+            skipped[post_id] = 'deleted'
+        elif allowed is not None and p.board_id not in allowed:
+            skipped[post_id] = 'forbidden'
+        elif p.status != Post.Status.PENDING:
+            skipped[post_id] = 'not_pending'
+        elif (
+            not is_superuser
+            and p.moderation_claimed_by_id
+            and p.moderation_claimed_by_id != user.id
+            and p.moderation_claimed_at
+            and p.moderation_claimed_at >= stale_before(now)
+        ):
+            skipped[post_id] = 'claimed'
+        else:
+            accepted.append(p)
+
+    if not accepted:
+        return {'updated': [], 'skipped': skipped}
+
+    status_value = Post.Status.PUBLISHED if decision == 'approve' else Post.Status.REJECTED
+    accepted_ids = [p.id for p in accepted]
+    with transaction.atomic():
+        guard = Post.objects.filter(id__in=accepted_ids, is_deleted=False, status=Post.Status.PENDING)
+        if not is_superuser:
+            guard = guard.filter(claimable_q(user=user, now=now))
+        guard.update(
+            status=status_value,
+            reviewed_by=user,
+            reviewed_at=now,
+            reject_reason=(reason if decision == 'reject' else ''),
+            moderation_claimed_by=None,
+            moderation_claimed_at=None,
+        )
+        # Only posts we actually changed get audit rows/notifications.
+        updated_ids = set(
+            Post.objects.filter(id__in=accepted_ids, reviewed_by=user, reviewed_at=now).values_list('id', flat=True)
+        )
+        for p in accepted:
+            if p.id not in updated_ids:
+                skipped[p.id] = 'claimed'
+        accepted = [p for p in accepted if p.id in updated_ids]
+
+        write_audit_logs(
+            actor=user,
+            action=f'post.{decision}',
+            target_type='post',
+            target_ids=[str(p.id) for p in accepted],
+            request=request,
+            metadata={'bulk': True, **({'reason': reason} if decision == 'reject' else {})},
+        )
+        notify_moderation_outcome(posts=accepted, decision=decision, actor=user)
+
+        enqueue_post_changes([p.id for p in accepted])
+        if decision == 'approve':
+            notify_saved_searches([p.id for p in accepted])
+
+    return {'updated': [p.id for p in accepted], 'skipped': skipped}
@@ -0,0 +1,92 @@
+"""Which stored images each post references (PostImage).
+
+Editor uploads are only linked from markdown/HTML in the body by URL, so
+nothing else records that a file is in use. sync_post_images() extracts the
+storage names under MEDIA_URL from the body plus the cover and rewrites the
+post's PostImage rows to match and recounts ImageBlob.ref_count of the names
+it added or dropped; `manage.py gc_media` treats every name in the table as
+referenced.
+
+Callers sync after writing a post's body or cover: post create/update, the
+cover ImageJob assigning its result, and the admin.
+"""
+
+from __future__ import annotations
+
+import posixpath
+import re
+from typing import Iterable, Set, Tuple
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.db import transaction
+
+from .image_store import refresh_blob_refs
+from .models import Post, PostImage
+
+
+SYNC_BATCH_SIZE = 500
+MAX_NAME_LENGTH = 300
+
+
+def _media_url_re(media_url: str):
+    # Relative (/media/...) or absolute (https://host/media/...) links; the name
+    # stops at whitespace, quotes, brackets, a query string or a fragment.
+    return re.compile(re.escape(media_url) + r'([^\s"\'()<>\[\]?#]+)')
+
+
+def body_image_names(body: str, media_url: str = '') -> Set[str]:
+    """Storage names of media files linked from `body`."""
+
+    media_url = media_url or settings.MEDIA_URL or '/media/'
+    names = set()
+    for match in _media_url_re(media_url).finditer(body or ''):
+        name = posixpath.normpath(unquote(match.group(1)))
+        if name.startswith(('.', '/')) or len(name) > MAX_NAME_LENGTH:
+            continue
+        names.add(name)
+    return names
+
+
+def image_refs(body: str, cover_name: str, media_url: str = '') -> Set[Tuple[str, str]]:
+    """{(name, PostImage.Source)} for a post's body and cover."""
+
+    refs = {(name, PostImage.Source.BODY) for name in body_image_names(body, media_url)}
+    if cover_name:
+        refs.add((cover_name, PostImage.Source.COVER))
+    return refs
+
+
+def sync_post_images(post_ids: Iterable[int]) -> None:
+    """Rewrite the PostImage rows of these posts from their current body and cover."""
+
+    ids = sorted({int(i) for i in post_ids if i})
+    for start in range(0, len(ids), SYNC_BATCH_SIZE):
+        chunk = ids[start : start + SYNC_BATCH_SIZE]
+        wanted = {
+            post_id: image_refs(body, cover or '')
+            for post_id, body, cover in Post.objects.filter(id__in=chunk).values_list('id', 'body', 'cover_image')
+        }
+        existing = {}
+        for row_id, post_id, name, source in PostImage.objects.filter(post_id__in=chunk).values_list('id', 'post_id', 'name', 'source'):
+            existing[(post_id, name, source)] = row_id
+
+        stale = [row_id for (post_id, name, source), row_id in existing.items() if (name, source) not in wanted.get(post_id, ())]
+        stale_ids = set(stale)
+        missing = [
+            PostImage(post_id=post_id, name=name, source=source)
+            for post_id, refs in wanted.items()
+            for name, source in refs
+            if (post_id, name, source) not in existing
+        ]
+        if not stale and not missing:
+            continue
+        with transaction.atomic():
+            if stale:
+                PostImage.objects.filter(id__in=stale).delete()
+            if missing:
+                PostImage.objects.bulk_create(missing, ignore_conflicts=True)
+            refresh_blob_refs(
+                [name for (_post_id, name, _source), row_id in existing.items() if row_id in stale_ids]
+                + [row.name for row in missing]
+            )
@@ -0,0 +1,187 @@
+"""Post revision storage: periodic full snapshots plus compressed forward deltas.
+
+Delta format (before zlib): a JSON list of ops applied to the previous body's
+lines (split with keepends=True):
+- [0, i1, i2]   copy previous lines[i1:i2]
+- [1, [lines]]  insert literal lines
+"""
+
+from __future__ import annotations
+
+import json
+import zlib
+from typing import Dict, List, Optional
+
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from . import textdiff
+from .models import Post, PostRevision
+
+
+# Every Nth revision (1, 11, 21, ...) stores the full body.
+REVISION_SNAPSHOT_INTERVAL = 10
+
+
+def is_snapshot_sequence(sequence: int) -> bool:
+    return (int(sequence) - 1) % REVISION_SNAPSHOT_INTERVAL == 0
+
+
+def encode_delta(base: str, target: str) -> bytes:
+    a = (base or '').splitlines(keepends=True)
+    b = (target or '').splitlines(keepends=True)
+    ops: List[list] = []
+    # Over the diff budget the delta degrades to "insert everything", which is still exact.
+    for tag, i1, i2, j1, j2 in (textdiff.opcodes(a, b) or [('insert', 0, 0, 0, len(b))]):
+        if tag == 'equal':
+            ops.append([0, i1, i2])
+        elif tag in ('replace', 'insert'):
+            ops.append([1, b[j1:j2]])
+        # 'delete': nothing to emit
+    return zlib.compress(json.dumps(ops, ensure_ascii=False, separators=(',', ':')).encode('utf-8'), 6)
+
+
+def apply_delta(base: str, delta: bytes) -> str:
+    a = (base or '').splitlines(keepends=True)
+    ops = json.loads(zlib.decompress(bytes(delta)).decode('utf-8'))
+    out: List[str] = []
+    for op in ops:
+        if op[0] == 0:
+            out.extend(a[op[1] : op[2]])
+        else:
+            out.extend(op[1])
+    return ''.join(out)
+
+
+def _chain(post_id: int, sequence: int, *, start: Optional[int] = None) -> List[PostRevision]:
+    """Rows needed to rebuild start..sequence: the nearest FULL row at or before start, then deltas."""
+
+    base = (
+        PostRevision.objects.filter(post_id=post_id, sequence__lte=(start or sequence), storage=PostRevision.Storage.FULL)
+        .order_by('-sequence')
+        .values_list('sequence', flat=True)
+        .first()
+    )
+    if base is None:
+        base = 1
+    return list(
+        PostRevision.objects.filter(post_id=post_id, sequence__gte=base, sequence__lte=sequence)
+        .only('id', 'sequence', 'storage', 'body', 'body_delta')
+        .order_by('sequence')
+    )
+
+
+def _replay(rows: List[PostRevision]) -> Dict[int, str]:
+    bodies: Dict[int, str] = {}
+    body = ''
+    for row in rows:
+        if row.storage == PostRevision.Storage.DELTA and row.body_delta is not None:
+            body = apply_delta(body, row.body_delta)
+        else:
+            body = row.body or ''
+        bodies[row.sequence] = body
+    return bodies
+
+
+def revision_body(rev: PostRevision) -> str:
+    """Full body of a revision, rebuilding it from the chain if it is stored as a delta."""
+
+    if rev.storage != PostRevision.Storage.DELTA:
+        return rev.body or ''
+    return _replay(_chain(rev.post_id, rev.sequence)).get(rev.sequence, '')
+
+
+def revision_bodies(post_id: int, sequences: List[int]) -> Dict[int, str]:
+    """Rebuild several revisions of one post with a single chain walk."""
+
+    if not sequences:
+        return {}
+    bodies = _replay(_chain(post_id, max(sequences), start=min(sequences)))
+    return {s: bodies.get(s, '') for s in sequences}
+
+
+def build_revision(*, post: Post, editor, sequence: int, previous_body: Optional[str]) -> PostRevision:
+    rev = PostRevision(
+        post=post,
+        editor=editor,
+        sequence=sequence,
+        title=post.title,
+        cover_image_name=(post.cover_image.name if getattr(post, 'cover_image', None) else ''),
+    )
+    body = post.body or ''
+    if previous_body is None or is_snapshot_sequence(sequence):
+        rev.storage = PostRevision.Storage.FULL
+        rev.body = body
+    else:
+        rev.storage = PostRevision.Storage.DELTA
+        rev.body = ''
+        rev.body_delta = encode_delta(previous_body, body)
+    return rev
+
+
+def next_revision_sequence(post_id: int) -> int:
+    """Atomically advance Post.revision_seq and return the new value.
+
+    This locks only the post's own row (for the duration of the caller's
+    transaction), so edits to different posts never contend. The counter
+    never drops below the post's highest stored sequence: a full save() of a
+    Post loaded before the last revision writes an older revision_seq back.
+    """
+
+    latest = Coalesce(
+        Subquery(
+            PostRevision.objects.filter(post_id=OuterRef('id')).order_by('-sequence').values('sequence')[:1]
+        ),
+        0,
+    )
+    with transaction.atomic():
+        if not Post.objects.filter(id=post_id).update(revision_seq=Greatest(F('revision_seq'), latest) + 1):
+            raise Post.DoesNotExist(f'Post {post_id} not found.')
+        return int(Post.objects.filter(id=post_id).values_list('revision_seq', flat=True).get())
+
+
+def create_revision(*, post: Post, editor) -> PostRevision:
+    with transaction.atomic():
+        seq = next_revision_sequence(post.id)
+        post.revision_seq = seq
+
+        # Deltas always chain to sequence-1. If that row is not visible (first
+        # revision, or a concurrent edit has not committed yet) store a full copy.
+        previous_body = None
+        if seq > 1 and not is_snapshot_sequence(seq):
+            bodies = _replay(_chain(post.id, seq - 1))
+            previous_body = bodies.get(seq - 1)
+
+        rev = build_revision(post=post, editor=editor, sequence=seq, previous_body=previous_body)
+        rev.save()
+        return rev
+
+
+def compact_post_revisions(post_id: int) -> int:
+    """Rewrite one post's chain into snapshot+delta form. Returns rows rewritten."""
+
+    rows = list(PostRevision.objects.filter(post_id=post_id).order_by('sequence'))
+    if not rows:
+        return 0
+    bodies = _replay(rows)
+
+    changed: List[PostRevision] = []
+    previous: Optional[str] = None
+    previous_seq = 0
+    for row in rows:
+        body = bodies[row.sequence]
+        if previous is None or previous_seq != row.sequence - 1 or is_snapshot_sequence(row.sequence):
+            storage, new_body, delta = PostRevision.Storage.FULL, body, None
+        else:
+            storage, new_body, delta = PostRevision.Storage.DELTA, '', encode_delta(previous, body)
+        if row.storage != storage or (row.body or '') != new_body or (delta is not None and bytes(row.body_delta or b'') != delta):
+            row.storage, row.body, row.body_delta = storage, new_body, delta
+            changed.append(row)
+        previous = body
+        previous_seq = row.sequence
+
+    if changed:
+        with transaction.atomic():
+            PostRevision.objects.bulk_update(changed, ['storage', 'body', 'body_delta'], batch_size=200)
+    return len(changed)
@@ -0,0 +1,175 @@
+"""Saved searches and percolation of newly published posts.
+
+A saved search ("PLC board:tools") is parsed once with parse_advanced_query()
+and reduced to the keys a post must have to match:
+- t:<token>        every search_local.query_terms() token of the text
+- board:<slug>     board:<slug>
+- author:<name>    author:<username> (case-insensitive, leading '@' ignored)
+- status:<value>   status:<value>
+- is:locked / is:pinned
+
+The keys are stored in SavedSearchKey (a reverse index). When posts are
+published, percolate_posts() computes each post's keys, loads only the saved
+searches that have at least one of them (one indexed query), and keeps those
+whose every key is present. Matches become Notification rows in one
+bulk_create; a user is notified once per post however many searches match.
+
+Token matching follows the database search backends (same tokenizer, all
+terms required); Meilisearch's typo tolerance/prefix matching is not applied.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Set, Tuple
+
+from django.db import IntegrityError, transaction
+
+from notifications.models import Notification
+
+from .models import Post, SavedSearch, SavedSearchKey
+from .search_local import query_terms, tokenize
+from .search_meili import AdvancedQuery, parse_advanced_query
+
+
+MAX_SAVED_SEARCHES_PER_USER = 20
+MAX_KEY_LENGTH = 100
+# Keys per `key__in` query (stays below SQLite's bound parameter limit).
+KEY_QUERY_CHUNK = 500
+
+
+class SavedSearchError(ValueError):
+    pass
+
+
+def _author_key(username: str) -> str:
+    return 'author:' + (username or '').lower().lstrip('@')
+
+
+def query_keys(aq: AdvancedQuery) -> List[str]:
+    """Keys a post must have to match `aq`."""
+
+    keys = [f't:{term}' for term in query_terms(aq.text)]
+    for key, value in aq.qualifiers:
+        if key == 'author':
+            keys.append(_author_key(value))
+        else:
+            keys.append(f'{key}:{value}')
+    return [k[:MAX_KEY_LENGTH] for k in dict.fromkeys(keys)]
+
+
+def post_keys(*, title: str, body: str, board_slug: str, author_username: str, status: str, is_locked: bool, is_pinned: bool) -> Set[str]:
+    keys = {f't:{token}'[:MAX_KEY_LENGTH] for token in tokenize(title)}
+    keys.update(f't:{token}'[:MAX_KEY_LENGTH] for token in tokenize(body))
+    keys.add(f'board:{board_slug}')
+    keys.add(_author_key(author_username))
+    keys.add(f'status:{status}')
+    if is_locked:
+        keys.add('is:locked')
+    if is_pinned:
+        keys.add('is:pinned')
+    return keys
+
+
+def create_saved_search(*, user, raw_query: str) -> SavedSearch:
+    raw_query = ' '.join((raw_query or '').split())[:200]
+    aq = parse_advanced_query(raw_query)
+    keys = query_keys(aq)
+    if not keys:
+        raise SavedSearchError('Query has no searchable words or filters.')
+    if SavedSearch.objects.filter(user=user).count() >= MAX_SAVED_SEARCHES_PER_USER:
+        raise SavedSearchError(f'At most {MAX_SAVED_SEARCHES_PER_USER} saved searches.')
+
+    try:
+        with transaction.atomic():
+            saved = SavedSearch.objects.create(
+                user=user,
+                query=raw_query,
+                text=aq.text,
+                filters=list(aq.filters),
+                qualifiers=[list(x) for x in aq.qualifiers],
+                key_count=len(keys),
+            )
+            SavedSearchKey.objects.bulk_create([SavedSearchKey(saved_search=saved, key=k) for k in keys])
+    except IntegrityError as exc:
+        raise SavedSearchError('This search is already saved.') from exc
+    return saved
+
+
+def _candidate_keys(all_keys: Set[str]) -> Dict[int, Tuple[int, int, Set[str]]]:
+    """saved_search_id -> (user_id, key_count, keys of it found in `all_keys`)."""
+
+    found: Dict[int, Tuple[int, int, Set[str]]] = {}
+    ordered = sorted(all_keys)
+    for i in range(0, len(ordered), KEY_QUERY_CHUNK):
+        rows = SavedSearchKey.objects.filter(
+            key__in=ordered[i : i + KEY_QUERY_CHUNK],
+            saved_search__is_active=True,
+        ).values_list('saved_search_id', 'saved_search__user_id', 'saved_search__key_count', 'key')
+        for saved_id, user_id, key_count, key in rows:
+            found.setdefault(saved_id, (user_id, key_count, set()))[2].add(key)
+    return found
+
+
+def percolate_posts(post_ids: Iterable[int]) -> int:
+    """Notify owners of saved searches matching these posts. Returns notifications created."""
+
+    ids = list(dict.fromkeys(int(x) for x in post_ids if x))
+    if not ids:
+        return 0
+    rows = Post.objects.filter(id__in=ids, is_deleted=False, status=Post.Status.PUBLISHED).values_list(
+        'id', 'title', 'body', 'board__slug', 'author_id', 'author__username', 'status', 'is_locked', 'is_pinned'
+    )
+    posts: Dict[int, Tuple[int, Set[str]]] = {}
+    for post_id, title, body, board_slug, author_id, username, status, is_locked, is_pinned in rows:
+        posts[post_id] = (
+            author_id,
+            post_keys(
+                title=title,
+                body=body,
+                board_slug=board_slug or '',
+                author_username=username or '',
+                status=status,
+                is_locked=is_locked,
+                is_pinned=is_pinned,
+            ),
+        )
+    if not posts:
+        return 0
+
+    candidates = _candidate_keys(set().union(*(keys for _author, keys in posts.values())))
+    matches: Dict[Tuple[int, int], int] = {}
+    for saved_id, (user_id, key_count, found) in sorted(candidates.items()):
+        if len(found) < key_count:
+            continue
+        for post_id, (author_id, keys) in posts.items():
+            if user_id == author_id or (user_id, post_id) in matches:
+                continue
+            if sum(1 for k in found if k in keys) == key_count:
+                matches[(user_id, post_id)] = saved_id
+    if not matches:
+        return 0
+
+    already = set(
+        Notification.objects.filter(
+            type=Notification.Type.SAVED_SEARCH_MATCH,
+            post_id__in=list(posts),
+            recipient_id__in={user_id for user_id, _post_id in matches},
+        ).values_list('recipient_id', 'post_id')
+    )
+    created = Notification.objects.bulk_create(
+        [
+            Notification(recipient_id=user_id, type=Notification.Type.SAVED_SEARCH_MATCH, post_id=post_id, saved_search_id=saved_id)
+            for (user_id, post_id), saved_id in matches.items()
+            if (user_id, post_id) not in already
+        ]
+    )
+    return len(created)
+
+
+def notify_saved_searches(post_ids: Iterable[int]) -> None:
+    """Percolate these posts once the current transaction commits."""
+
+    ids = list(dict.fromkeys(int(x) for x in post_ids if x))
+    if ids:
+        # robust: a percolation error must not fail the request that published the post.
+        transaction.on_commit(lambda: percolate_posts(ids), robust=True)
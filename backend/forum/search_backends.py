@@ -0,0 +1,485 @@
+"""Pluggable post search backends.
+
+get_search_backend() picks one per request:
+- MeiliBackend            MEILI_URL configured (external service, fed by the outbox);
+                          while its circuit breaker is open, search/suggest are
+                          answered by the database backend below (a failover).
+- SqliteFtsBackend        SQLite with FTS5: `forum_post_fts` virtual table.
+- PostgresFtsBackend      PostgreSQL: `forum_post_search` tsvector column + GIN index.
+- InvertedIndexBackend    anything else: forum.search_local tables.
+
+The database backends share:
+- the query grammar (search_meili.parse_advanced_query) and visibility rules,
+- the tokenizer (search_local.tokenize: words + CJK bigrams); the FTS tables
+  store pre-tokenized text so CJK works without extra extensions,
+- the response shape of search_meili.search_posts: compact hits with a cropped,
+  highlighted `_formatted` (see forum.snippets) and `_matchesPosition`
+  ({field: [{start, length}]}, character offsets),
+- total and facets from a single grouped query, cached per normalized query
+  until the next post write (DatabaseBackend._total_and_facets).
+
+The FTS tables are created by migration 0021 (skipped if SQLite lacks FTS5)
+and kept in sync after each post write commits via enqueue_post_changes(),
+with or without Meilisearch.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.db.models.expressions import RawSQL
+
+from . import search_local
+from .models import Post
+from .search_meili import MeiliUnavailable, meili_breaker, meili_enabled, parse_advanced_query
+from .snippets import formatted_fields, markdown_to_plain, match_positions
+from .suggest_index import posts_version
+
+
+SQLITE_FTS_TABLE = 'forum_post_fts'
+POSTGRES_FTS_TABLE = 'forum_post_search'
+
+SUGGEST_PREFIX_EXPANSIONS = 20
+FACET_SIZE = 20
+FACET_CACHE_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+def build_visibility_q(*, user, author_field: str = 'author_id') -> Q:
+    """Same rules as PostViewSet.get_queryset (and search_meili.build_visibility_filter)."""
+
+    if user and getattr(user, 'is_authenticated', False):
+        if getattr(user, 'is_staff', False):
+            return Q()
+        return Q(status=Post.Status.PUBLISHED) | Q(**{author_field: user.id})
+    return Q(status=Post.Status.PUBLISHED)
+
+
+def qualifiers_q(qualifiers: Iterable[Tuple[str, str]]) -> Q:
+    """Translate parse_advanced_query() qualifiers into ORM filters."""
+
+    q = Q()
+    for key, value in qualifiers:
+        if key == 'board':
+            q &= Q(board__slug=value)
+        elif key == 'author':
+            q &= Q(author__username__iexact=value) | Q(author__username__iexact='@' + value.lstrip('@'))
+        elif key == 'status':
+            q &= Q(status=value)
+        elif key == 'is' and value == 'locked':
+            q &= Q(is_locked=True)
+        elif key == 'is' and value == 'pinned':
+            q &= Q(is_pinned=True)
+    return q
+
+
+def matches_position(fields: Dict[str, str], terms: Sequence[str]) -> Dict[str, List[Dict[str, int]]]:
+    out = {}
+    for name, text in fields.items():
+        spans = match_positions(text, terms)
+        if spans:
+            out[name] = spans
+    return out
+
+
+class SearchBackend:
+    """Interface. search()/suggest() return JSON-ready responses."""
+
+    name = ''
+
+    def index_posts(self, post_ids: Iterable[int]) -> None:
+        raise NotImplementedError
+
+    def rebuild(self, *, chunk_size: int = 500) -> int:
+        """Reindex every post (deleted ones are dropped). Returns the number processed."""
+
+        done = 0
+        last_id = 0
+        while True:
+            ids = list(Post.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                return done
+            self.index_posts(ids)
+            done += len(ids)
+            last_id = ids[-1]
+
+    def search(self, *, user, raw_query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def suggest(self, *, user, raw_query: str, limit: int = 8) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    def matching_post_ids(self, text: str):
+        """Subquery of ids of posts containing every term of `text` (list ?q=), or None."""
+
+        return None
+
+
+class MeiliBackend(SearchBackend):
+    name = 'meili'
+
+    def index_posts(self, post_ids: Iterable[int]) -> None:
+        from .search_outbox import enqueue_post_changes
+
+        enqueue_post_changes(post_ids)
+
+    def search(self, *, user, raw_query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        from .search_meili import search_posts
+
+        try:
+            return meili_breaker.call(search_posts, user=user, raw_query=raw_query, limit=limit, offset=offset)
+        except MeiliUnavailable as exc:
+            return self._failover(exc).search(user=user, raw_query=raw_query, limit=limit, offset=offset)
+
+    def suggest(self, *, user, raw_query: str, limit: int = 8) -> Dict[str, Any]:
+        from .search_meili import suggest_posts
+
+        try:
+            return meili_breaker.call(suggest_posts, user=user, raw_query=raw_query, limit=limit)
+        except MeiliUnavailable as exc:
+            return self._failover(exc).suggest(user=user, raw_query=raw_query, limit=limit)
+
+    @staticmethod
+    def _failover(exc: Exception) -> 'SearchBackend':
+        meili_breaker.record_failover()
+        logger.debug('search failover to the database backend: %s', exc)
+        return get_database_backend()
+
+
+class DatabaseBackend(SearchBackend):
+    """Shared flow for backends that live in the application database.
+
+    Subclasses implement:
+    - index_posts()
+    - _match_subquery(terms, prefix): ids of posts containing all terms
+    - _rank(terms, candidates, limit, offset, prefix): one page of ordered ids
+    """
+
+    def _match_subquery(self, terms: List[str], *, prefix: bool = False):
+        raise NotImplementedError
+
+    def _rank(self, terms: List[str], candidates, *, limit: int, offset: int, prefix: bool = False) -> List[int]:
+        raise NotImplementedError
+
+    @staticmethod
+    def _candidates(user, qualifiers):
+        return Post.objects.filter(Q(is_deleted=False) & build_visibility_q(user=user) & qualifiers_q(qualifiers))
+
+    def matching_post_ids(self, text: str):
+        terms = search_local.query_terms(text)
+        if not terms:
+            return None
+        return self._match_subquery(terms)
+
+    def search(self, *, user, raw_query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+        aq = parse_advanced_query(raw_query)
+        limit = int(max(1, min(limit, 50)))
+        offset = int(max(0, offset))
+        candidates = self._candidates(user, aq.qualifiers)
+
+        terms = search_local.query_terms(aq.text)
+        matched_qs = None
+        if terms:
+            matched_qs = candidates.filter(id__in=self._match_subquery(terms))
+        elif not aq.text and aq.qualifiers:
+            # Qualifiers only ("board:tools"): newest first, like an empty Meilisearch query.
+            matched_qs = candidates
+
+        total, facets = 0, {'board_slug': {}, 'author_username': {}}
+        if matched_qs is not None:
+            total, facets = self._total_and_facets(matched_qs, user=user, terms=terms, qualifiers=aq.qualifiers)
+
+        ids: List[int] = []
+        if offset < total:
+            if terms:
+                ids = self._rank(terms, candidates, limit=limit, offset=offset)
+            else:
+                ids = list(candidates.order_by('-created_at').values_list('id', flat=True)[offset : offset + limit])
+
+        return {
+            'engine': self.name,
+            'query': raw_query,
+            'parsed': {'text': aq.text, 'terms': terms, 'qualifiers': [list(x) for x in aq.qualifiers]},
+            'hits': self._hits(ids, terms),
+            'total': total,
+            'limit': limit,
+            'offset': offset,
+            'facets': facets,
+        }
+
+    def _total_and_facets(self, matched_qs, *, user, terms, qualifiers) -> Tuple[int, Dict[str, Dict[str, int]]]:
+        """Total and both facet distributions from one GROUP BY (board, author) pass.
+
+        Cached for FACET_CACHE_SECONDS per normalized query and visibility
+        scope. The key includes suggest_index.posts_version(), the newest row of
+        the shared PostChange log, so a post write committed by any process
+        makes the next search in every process recompute.
+        """
+
+        if user and getattr(user, 'is_authenticated', False):
+            scope = 'staff' if getattr(user, 'is_staff', False) else f'user:{int(user.id)}'
+        else:
+            scope = 'anon'
+        normalized = json.dumps([self.name, scope, sorted(terms), sorted(qualifiers), posts_version()])
+        key = 'forum:search_facets:' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1]
+
+        total = 0
+        boards: Counter = Counter()
+        authors: Counter = Counter()
+        for row in matched_qs.order_by().values('board__slug', 'author__username').annotate(c=Count('id')):
+            count = int(row['c'])
+            total += count
+            boards[row['board__slug'] or ''] += count
+            authors[row['author__username'] or ''] += count
+        facets = {
+            'board_slug': dict(boards.most_common(FACET_SIZE)),
+            'author_username': dict(authors.most_common(FACET_SIZE)),
+        }
+        cache.set(key, (total, facets), timeout=FACET_CACHE_SECONDS)
+        return total, facets
+
+    @staticmethod
+    def _hits(ids: List[int], terms: List[str]) -> List[Dict[str, Any]]:
+        """Same shape as search_meili.search_posts hits: cropped snippet, no full body."""
+
+        rows = Post.objects.filter(id__in=ids).values(
+            'id', 'title', 'body', 'status', 'board_id', 'board__slug', 'author_id', 'author__username', 'created_at', 'updated_at'
+        )
+        by_id = {row['id']: row for row in rows}
+        hits = []
+        for post_id in ids:
+            row = by_id.get(post_id)
+            if row is None:
+                continue
+            hits.append(
+                {
+                    'id': row['id'],
+                    'title': row['title'],
+                    'status': row['status'],
+                    'board_id': row['board_id'],
+                    'board_slug': row['board__slug'] or '',
+                    'author_id': row['author_id'],
+                    'author_username': row['author__username'] or '',
+                    'created_at': row['created_at'].isoformat() if row['created_at'] else None,
+                    'updated_at': row['updated_at'].isoformat() if row['updated_at'] else None,
+                    '_formatted': formatted_fields(title=row['title'], body_plain=markdown_to_plain(row['body']), terms=terms),
+                    '_matchesPosition': matches_position({'title': row['title']}, terms),
+                }
+            )
+        return hits
+
+    def suggest(self, *, user, raw_query: str, limit: int = 8) -> Dict[str, Any]:
+        """Topbar suggestions; the last Latin word is matched as a prefix."""
+
+        aq = parse_advanced_query(raw_query)
+        terms = search_local.query_terms(aq.text)
+        if not terms:
+            return {'engine': self.name, 'query': raw_query, 'hits': []}
+
+        prefix = not search_local.is_cjk_term(terms[-1])
+        ids = self._rank(
+            terms,
+            self._candidates(user, aq.qualifiers),
+            limit=int(max(1, min(limit, 20))),
+            offset=0,
+            prefix=prefix,
+        )
+        posts = Post.objects.select_related('board', 'author').in_bulk(ids)
+        hits = []
+        for post_id in ids:
+            p = posts.get(post_id)
+            if p is None:
+                continue
+            hits.append(
+                {
+                    'id': p.id,
+                    'title': p.title,
+                    'board_slug': getattr(getattr(p, 'board', None), 'slug', ''),
+                    'author_username': getattr(getattr(p, 'author', None), 'username', ''),
+                    '_matchesPosition': matches_position({'title': p.title}, terms),
+                }
+            )
+        return {'engine': self.name, 'query': raw_query, 'hits': hits}
+
+
+class InvertedIndexBackend(DatabaseBackend):
+    name = 'local'
+
+    def index_posts(self, post_ids: Iterable[int]) -> None:
+        search_local.index_posts(post_ids)
+
+    def matching_post_ids(self, text: str):
+        return search_local.matching_post_ids(text)
+
+    def _match_subquery(self, terms: List[str], *, prefix: bool = False):
+        return search_local.posts_with_all_terms(terms)
+
+    def _rank(self, terms, candidates, *, limit, offset, prefix=False):
+        any_of: List[str] = []
+        if prefix:
+            # Like FTS prefix queries: every other term, plus any completion of the last.
+            any_of = search_local.expand_prefix(terms[-1], limit=SUGGEST_PREFIX_EXPANSIONS) or [terms[-1]]
+            terms = terms[:-1]
+        rows = search_local.ranked(terms, candidates.values('id'), any_of=any_of)
+        if rows is None:
+            return []
+        return [row['post_id'] for row in rows[offset : offset + limit]]
+
+
+def _tokenized(text: str) -> str:
+    return ' '.join(search_local.tokenize(text))
+
+
+class _FtsBackend(DatabaseBackend):
+    """FTS tables hold pre-tokenized title/body; subclasses supply the SQL."""
+
+    table = ''
+
+    def _delete_sql(self) -> str:
+        raise NotImplementedError
+
+    def _upsert_sql(self) -> str:
+        raise NotImplementedError
+
+    def _match_expr(self, terms: List[str], *, prefix: bool) -> str:
+        raise NotImplementedError
+
+    def _match_sql(self) -> str:
+        """SELECT <post id> FROM <table> WHERE <match %s>."""
+
+        raise NotImplementedError
+
+    def _rank_sql(self, candidates_sql: str) -> str:
+        """SELECT <post id> ... ORDER BY relevance LIMIT %s OFFSET %s (params: match, *candidates, limit, offset)."""
+
+        raise NotImplementedError
+
+    def index_posts(self, post_ids: Iterable[int]) -> None:
+        ids = list(dict.fromkeys(int(x) for x in post_ids if x))
+        if not ids:
+            return
+        rows = [
+            (post_id, _tokenized(title), _tokenized(body))
+            for post_id, title, body in Post.objects.filter(id__in=ids, is_deleted=False).values_list('id', 'title', 'body')
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(self._delete_sql(), [(post_id,) for post_id in ids])
+            if rows:
+                cursor.executemany(self._upsert_sql(), rows)
+
+    def _match_subquery(self, terms: List[str], *, prefix: bool = False):
+        return RawSQL(self._match_sql(), [self._match_expr(terms, prefix=prefix)])
+
+    def _rank(self, terms, candidates, *, limit, offset, prefix=False):
+        match = self._match_expr(terms, prefix=prefix)
+        cand_sql, cand_params = candidates.order_by().values('id').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(self._rank_sql(cand_sql), [match, *cand_params, limit, offset])
+            return [int(row[0]) for row in cursor.fetchall()]
+
+
+class SqliteFtsBackend(_FtsBackend):
+    name = 'sqlite_fts'
+    table = SQLITE_FTS_TABLE
+
+    def _delete_sql(self) -> str:
+        return f'DELETE FROM {self.table} WHERE rowid = %s'
+
+    def _upsert_sql(self) -> str:
+        return f'INSERT INTO {self.table} (rowid, title, body) VALUES (%s, %s, %s)'
+
+    def _match_expr(self, terms, *, prefix):
+        quoted = ['"' + t.replace('"', '""') + '"' for t in terms]
+        if prefix:
+            quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def _match_sql(self) -> str:
+        return f'SELECT rowid AS post_id FROM {self.table} WHERE {self.table} MATCH %s'
+
+    def _rank_sql(self, candidates_sql: str) -> str:
+        # bm25() is lower-is-better; title column weighted like search_local.TITLE_WEIGHT.
+        return (
+            f'SELECT rowid FROM {self.table} WHERE {self.table} MATCH %s AND rowid IN ({candidates_sql}) '
+            f'ORDER BY bm25({self.table}, {float(search_local.TITLE_WEIGHT)}, 1.0), rowid DESC LIMIT %s OFFSET %s'
+        )
+
+
+class PostgresFtsBackend(_FtsBackend):
+    name = 'postgres_fts'
+    table = POSTGRES_FTS_TABLE
+
+    def _delete_sql(self) -> str:
+        return f'DELETE FROM {self.table} WHERE post_id = %s'
+
+    def _upsert_sql(self) -> str:
+        return (
+            f'INSERT INTO {self.table} (post_id, document) '
+            "VALUES (%s, setweight(to_tsvector('simple', %s), 'A') || setweight(to_tsvector('simple', %s), 'B'))"
+        )
+
+    def _match_expr(self, terms, *, prefix):
+        quoted = ["'" + t.replace("'", "''") + "'" for t in terms]
+        if prefix:
+            quoted[-1] += ':*'
+        return ' & '.join(quoted)
+
+    def _match_sql(self) -> str:
+        return f"SELECT post_id FROM {self.table} WHERE document @@ to_tsquery('simple', %s)"
+
+    def _rank_sql(self, candidates_sql: str) -> str:
+        return (
+            f"SELECT s.post_id FROM {self.table} s, to_tsquery('simple', %s) q "
+            f'WHERE s.document @@ q AND s.post_id IN ({candidates_sql}) '
+            'ORDER BY ts_rank_cd(s.document, q) DESC, s.post_id DESC LIMIT %s OFFSET %s'
+        )
+
+
+_MEILI = MeiliBackend()
+_INVERTED = InvertedIndexBackend()
+_database_backend: Optional[DatabaseBackend] = None
+
+
+def _detect_database_backend() -> DatabaseBackend:
+    tables = set(connection.introspection.table_names())
+    if connection.vendor == 'sqlite' and SQLITE_FTS_TABLE in tables:
+        return SqliteFtsBackend()
+    if connection.vendor == 'postgresql' and POSTGRES_FTS_TABLE in tables:
+        return PostgresFtsBackend()
+    return _INVERTED
+
+
+def get_database_backend() -> DatabaseBackend:
+    """The in-database backend for this process (detected once)."""
+
+    global _database_backend
+    if _database_backend is None:
+        _database_backend = _detect_database_backend()
+    return _database_backend
+
+
+def get_search_backend() -> SearchBackend:
+    if meili_enabled():
+        return _MEILI
+    return get_database_backend()
+
+
+def search_health() -> Dict[str, Any]:
+    """Which engines serve search in this process, and the Meilisearch breaker state."""
+
+    return {
+        'meili_enabled': meili_enabled(),
+        'database_backend': get_database_backend().name,
+        'meili_breaker': meili_breaker.stats(),
+    }
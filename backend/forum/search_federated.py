@@ -0,0 +1,353 @@
+"""Federated search: posts, comments, users, tags and resources in one call.
+
+GET /api/search/all/?q=<query>&limit=5[&types=posts,users]
+
+Meilisearch (MEILI_URL configured):
+- One index per entity. Posts use MEILI_INDEX_POSTS; the others default to the
+  entity name (SearchOutbox.Entity) and can be renamed with MEILI_INDEX_<ENTITY>
+  settings (e.g. MEILI_INDEX_COMMENTS).
+- All indexes are queried with a single multi-search request, through the same
+  circuit breaker as post search (search_meili.meili_breaker).
+- Visibility: posts and resources use build_visibility_filter (resources with
+  created_by_id as the author field). Only comments on published, live posts
+  and active users are indexed at all, so those need no per-user filter.
+- Writes enqueue SearchOutbox rows (enqueue_search_changes); `search_sync`
+  applies them via entity_documents(). `python manage.py
+  reindex_search_entities` rebuilds the non-post indexes.
+
+Local path (no Meilisearch, or the breaker is open):
+- posts come from the database search backend (forum.search_backends);
+- the other entities match every query term with icontains over the same
+  visible rows. Those columns are short (names, titles), except comment bodies.
+
+Response: {engine, query, results: {<entity>: {hits, total}}}. Every hit has a
+`_formatted` dict that is HTML-escaped except <mark> (see forum.snippets).
+Qualifiers (board:, author:, ...) only apply to posts; a qualifier-only query
+returns posts only.
+"""
+
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Q
+
+from resources.models import ResourceEntry
+
+from . import search_local
+from .models import Comment, Post, SearchOutbox, Tag
+from .search_backends import build_visibility_q, get_database_backend
+from .search_meili import (
+    INDEX_TIMEOUT_SECONDS,
+    MeiliUnavailable,
+    build_visibility_filter,
+    compact_hit,
+    get_client,
+    get_index,
+    meili_breaker,
+    meili_enabled,
+    parse_advanced_query,
+    posts_index_name,
+    posts_search_params,
+)
+from .snippets import (
+    CROP_MARKER,
+    HIGHLIGHT_POST_TAG,
+    HIGHLIGHT_PRE_TAG,
+    SNIPPET_CROP_WORDS,
+    format_snippet,
+    highlight,
+    markdown_to_plain,
+    safe_formatted,
+)
+
+
+Entity = SearchOutbox.Entity
+
+ENTITIES: Tuple[str, ...] = tuple(Entity.values)
+FEDERATED_DEFAULT_LIMIT = 5
+FEDERATED_MAX_LIMIT = 20
+# Long text (comment bodies, resource descriptions) is indexed as plain text, truncated.
+INDEX_TEXT_MAX_CHARS = 2000
+
+
+@dataclass(frozen=True)
+class EntitySpec:
+    """Index layout of a non-post entity.
+
+    - attributes: returned for each hit
+    - highlight: fields returned highlighted in `_formatted`
+    - crop: highlighted fields that are also cropped to a snippet
+    """
+
+    searchable: List[str]
+    attributes: List[str]
+    highlight: List[str]
+    filterable: List[str] = field(default_factory=list)
+    crop: List[str] = field(default_factory=list)
+
+
+SPECS: Dict[str, EntitySpec] = {
+    Entity.COMMENTS: EntitySpec(
+        searchable=['body_plain'],
+        attributes=['id', 'post_id', 'post_title', 'author_id', 'author_username', 'created_at'],
+        highlight=['body_plain'],
+        filterable=['post_id', 'author_id'],
+        crop=['body_plain'],
+    ),
+    Entity.USERS: EntitySpec(
+        searchable=['username', 'nickname', 'pid'],
+        attributes=['id', 'username', 'nickname', 'pid'],
+        highlight=['username', 'nickname'],
+    ),
+    Entity.TAGS: EntitySpec(
+        searchable=['name'],
+        attributes=['id', 'name', 'usage_count'],
+        highlight=['name'],
+    ),
+    Entity.RESOURCES: EntitySpec(
+        searchable=['title', 'description_plain'],
+        attributes=['id', 'title', 'status', 'post_id', 'created_by_id', 'created_at'],
+        highlight=['title'],
+        filterable=['status', 'created_by_id'],
+    ),
+}
+
+
+def entity_index_name(entity: str) -> str:
+    if entity == Entity.POSTS:
+        return posts_index_name()
+    return getattr(settings, f'MEILI_INDEX_{entity.upper()}', '') or entity
+
+
+def _iso(value) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+# --- documents ---
+
+
+def _comment_documents(ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+    qs = Comment.objects.select_related('post', 'author').filter(
+        id__in=ids,
+        is_deleted=False,
+        post__is_deleted=False,
+        post__status=Post.Status.PUBLISHED,
+    )
+    return {
+        c.id: {
+            'id': int(c.id),
+            'post_id': int(c.post_id),
+            'post_title': c.post.title or '',
+            'author_id': int(c.author_id) if c.author_id else None,
+            'author_username': getattr(c.author, 'username', '') or '',
+            'body_plain': markdown_to_plain(c.body or '')[:INDEX_TEXT_MAX_CHARS],
+            'created_at': _iso(c.created_at),
+        }
+        for c in qs
+    }
+
+
+def _user_documents(ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+    rows = get_user_model().objects.filter(id__in=ids, is_active=True).values_list('id', 'username', 'nickname', 'pid')
+    return {
+        user_id: {'id': int(user_id), 'username': username or '', 'nickname': nickname or '', 'pid': pid or ''}
+        for user_id, username, nickname, pid in rows
+    }
+
+
+def _tag_documents(ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+    rows = Tag.objects.filter(id__in=ids).values_list('id', 'name', 'usage_count')
+    return {tag_id: {'id': int(tag_id), 'name': name, 'usage_count': int(count or 0)} for tag_id, name, count in rows}
+
+
+def _resource_documents(ids: Sequence[int]) -> Dict[int, Dict[str, Any]]:
+    return {
+        r.id: {
+            'id': int(r.id),
+            'title': r.title or '',
+            'description_plain': markdown_to_plain(r.description or '')[:INDEX_TEXT_MAX_CHARS],
+            'status': r.status,
+            'post_id': int(r.post_id) if r.post_id else None,
+            'created_by_id': int(r.created_by_id) if r.created_by_id else None,
+            'created_at': _iso(r.created_at),
+        }
+        for r in ResourceEntry.objects.filter(id__in=ids)
+    }
+
+
+_DOCUMENTS: Dict[str, Callable[[Sequence[int]], Dict[int, Dict[str, Any]]]] = {
+    Entity.COMMENTS: _comment_documents,
+    Entity.USERS: _user_documents,
+    Entity.TAGS: _tag_documents,
+    Entity.RESOURCES: _resource_documents,
+}
+
+
+def entity_documents(entity: str, ids: Iterable[int]) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """(documents to upsert, ids to delete) for a non-post entity, from current rows."""
+
+    ids = list(dict.fromkeys(int(x) for x in ids))
+    docs = _DOCUMENTS[entity](ids)
+    return [docs[i] for i in ids if i in docs], [i for i in ids if i not in docs]
+
+
+def entity_queryset(entity: str):
+    """Every row of a non-post entity (for full reindexing)."""
+
+    return {
+        Entity.COMMENTS: Comment.objects.all(),
+        Entity.USERS: get_user_model().objects.all(),
+        Entity.TAGS: Tag.objects.all(),
+        Entity.RESOURCES: ResourceEntry.objects.all(),
+    }[entity]
+
+
+def ensure_entity_index_settings(entity: str, index=None) -> None:
+    spec = SPECS[entity]
+    index = index or get_index(entity_index_name(entity), timeout=INDEX_TIMEOUT_SECONDS)
+    index.update_searchable_attributes(spec.searchable)
+    if spec.filterable:
+        index.update_filterable_attributes(spec.filterable)
+    index.update_displayed_attributes(list(dict.fromkeys(spec.attributes + spec.highlight)))
+
+
+# --- search ---
+
+
+def _hit(entity: str, doc: Dict[str, Any], formatted: Dict[str, str]) -> Dict[str, Any]:
+    spec = SPECS[entity]
+    out = {key: doc.get(key) for key in spec.attributes}
+    out['_formatted'] = {name: formatted.get(name, '') for name in spec.highlight}
+    return out
+
+
+def _meili_search(*, user, aq, limit: int, entities: List[str]) -> Dict[str, Dict[str, Any]]:
+    queries: List[Dict[str, Any]] = []
+    for entity in entities:
+        if entity == Entity.POSTS:
+            params = posts_search_params(aq, user=user, limit=limit)
+            params.pop('offset', None)
+        else:
+            spec = SPECS[entity]
+            params = {
+                'limit': limit,
+                'attributesToRetrieve': list(dict.fromkeys(spec.attributes + spec.highlight)),
+                'attributesToHighlight': spec.highlight,
+                'highlightPreTag': HIGHLIGHT_PRE_TAG,
+                'highlightPostTag': HIGHLIGHT_POST_TAG,
+            }
+            if spec.crop:
+                params.update({'attributesToCrop': spec.crop, 'cropLength': SNIPPET_CROP_WORDS, 'cropMarker': CROP_MARKER})
+            if entity == Entity.RESOURCES:
+                params['filter'] = build_visibility_filter(user=user, author_field='created_by_id')
+        queries.append({'indexUid': entity_index_name(entity), 'q': aq.text or '', **params})
+
+    res = get_client().multi_search(queries)
+    results: Dict[str, Dict[str, Any]] = {}
+    for entity, r in zip(entities, res.get('results', [])):
+        raw_hits = r.get('hits', []) or []
+        if entity == Entity.POSTS:
+            hits = [compact_hit(h) for h in raw_hits]
+        else:
+            hits = [
+                _hit(entity, h, {k: safe_formatted(v) for k, v in (h.get('_formatted') or {}).items()})
+                for h in raw_hits
+            ]
+        results[entity] = {'hits': hits, 'total': r.get('estimatedTotalHits', len(hits))}
+    return results
+
+
+def _terms_q(terms: List[str], fields: Sequence[str]) -> Q:
+    q = Q()
+    for term in terms:
+        any_field = Q()
+        for name in fields:
+            any_field |= Q(**{f'{name}__icontains': term})
+        q &= any_field
+    return q
+
+
+def _local_queryset(entity: str, *, user, terms: List[str]):
+    if entity == Entity.COMMENTS:
+        return (
+            Comment.objects.filter(is_deleted=False, post__is_deleted=False, post__status=Post.Status.PUBLISHED)
+            .filter(_terms_q(terms, ['body']))
+            .order_by('-id')
+        )
+    if entity == Entity.USERS:
+        return (
+            get_user_model().objects.filter(is_active=True)
+            .filter(_terms_q(terms, ['username', 'nickname', 'pid']))
+            .order_by('-activity_score', 'id')
+        )
+    if entity == Entity.TAGS:
+        return Tag.objects.filter(_terms_q(terms, ['name'])).order_by('-usage_count', 'name')
+    return (
+        ResourceEntry.objects.filter(build_visibility_q(user=user, author_field='created_by_id'))
+        .filter(_terms_q(terms, ['title', 'description']))
+        .order_by('-id')
+    )
+
+
+def _local_search(*, user, aq, raw_query: str, limit: int, entities: List[str]) -> Dict[str, Dict[str, Any]]:
+    terms = search_local.query_terms(aq.text)
+    results: Dict[str, Dict[str, Any]] = {}
+    for entity in entities:
+        if entity == Entity.POSTS:
+            data = get_database_backend().search(user=user, raw_query=raw_query, limit=limit)
+            results[entity] = {'hits': data['hits'], 'total': data['total']}
+            continue
+        if not terms:
+            results[entity] = {'hits': [], 'total': 0}
+            continue
+
+        qs = _local_queryset(entity, user=user, terms=terms)
+        ids = list(qs.values_list('id', flat=True)[:limit])
+        docs = _DOCUMENTS[entity](ids)
+        spec = SPECS[entity]
+        hits = []
+        for object_id in ids:
+            doc = docs.get(object_id)
+            if doc is None:
+                continue
+            formatted = {
+                name: format_snippet(doc.get(name) or '', terms) if name in spec.crop else highlight(doc.get(name) or '', terms)
+                for name in spec.highlight
+            }
+            hits.append(_hit(entity, doc, formatted))
+        results[entity] = {'hits': hits, 'total': qs.count() if len(ids) >= limit else len(ids)}
+    return results
+
+
+def federated_search(
+    *,
+    user,
+    raw_query: str,
+    limit: int = FEDERATED_DEFAULT_LIMIT,
+    entities: Optional[Iterable[str]] = None,
+) -> Dict[str, Any]:
+    """Top `limit` hits per entity for one query, in a single round trip."""
+
+    selected = set(entities) if entities is not None else set(ENTITIES)
+    wanted = [e for e in ENTITIES if e in selected]
+    limit = int(max(1, min(limit, FEDERATED_MAX_LIMIT)))
+    aq = parse_advanced_query(raw_query)
+    if not aq.text:
+        # Qualifiers select posts; an empty text would list every user/tag/comment.
+        wanted = [e for e in wanted if e == Entity.POSTS] if aq.qualifiers else []
+    if not wanted:
+        return {'engine': 'none', 'query': raw_query, 'results': {}}
+
+    if meili_enabled():
+        try:
+            results = meili_breaker.call(_meili_search, user=user, aq=aq, limit=limit, entities=wanted)
+            return {'engine': 'meili', 'query': raw_query, 'results': results}
+        except MeiliUnavailable:
+            meili_breaker.record_failover()
+
+    results = _local_search(user=user, aq=aq, raw_query=raw_query, limit=limit, entities=wanted)
+    return {'engine': get_database_backend().name, 'query': raw_query, 'results': results}
@@ -0,0 +1,178 @@
+"""Portable inverted-index search engine.
+
+Why?
+- The old fallback was `title__icontains | body__icontains`: a full scan of every
+  post body with no ranking.
+- This keeps an inverted index in the database (SearchPosting/SearchDocument)
+  and ranks with BM25, so it needs no external service or database extension.
+- SQLite (FTS5) and PostgreSQL (tsvector) use their native engines instead; see
+  forum.search_backends. The tokenizer below is shared by all of them.
+
+Tokenization:
+- Latin/number runs become lowercase word tokens.
+- CJK runs become overlapping bigrams ("数据库" -> "数据", "据库"); a lone CJK
+  character is its own token. Queries are tokenized the same way.
+- Title tokens count TITLE_WEIGHT times.
+
+Maintenance:
+- index_posts() runs from the same write paths that feed the search outbox,
+  right after the write transaction commits (enqueue_post_changes).
+- `python manage.py rebuild_search_index` rebuilds everything (any backend).
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import Counter
+from typing import Iterable, List, Sequence, Tuple
+
+from django.db import transaction
+from django.db.models import Avg, Case, Count, FloatField, Q, Sum, Value, When
+from django.db.models.functions import Cast
+
+from .models import Post, SearchDocument, SearchPosting
+
+
+TITLE_WEIGHT = 3
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 16
+
+# BM25 parameters (the usual defaults).
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+_CJK = r'\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af'
+_TOKEN_RE = re.compile(rf'[{_CJK}]+|[^\W{_CJK}]+', re.UNICODE)
+_CJK_RE = re.compile(rf'[{_CJK}]')
+
+
+def is_cjk_term(term: str) -> bool:
+    return bool(_CJK_RE.match(term or ''))
+
+
+def tokenize(text: str) -> List[str]:
+    tokens: List[str] = []
+    for run in _TOKEN_RE.findall((text or '').lower()):
+        if is_cjk_term(run):
+            if len(run) == 1:
+                tokens.append(run)
+            else:
+                tokens.extend(run[i : i + 2] for i in range(len(run) - 1))
+        elif len(run) <= MAX_TERM_LENGTH:
+            tokens.append(run)
+    return tokens
+
+
+def document_terms(title: str, body: str) -> Tuple[Counter, int]:
+    """Return (term -> weighted tf, document length) for one post."""
+
+    title_tokens = tokenize(title)
+    body_tokens = tokenize(body)
+    tf: Counter = Counter(body_tokens)
+    for token in title_tokens:
+        tf[token] += TITLE_WEIGHT
+    return tf, len(title_tokens) + len(body_tokens)
+
+
+def query_terms(text: str) -> List[str]:
+    return list(dict.fromkeys(tokenize(text)))[:MAX_QUERY_TERMS]
+
+
+def index_posts(post_ids: Iterable[int]) -> None:
+    """(Re)index some posts from their current state; deleted/missing posts are dropped."""
+
+    ids = list(dict.fromkeys(int(x) for x in post_ids if x))
+    if not ids:
+        return
+
+    with transaction.atomic():
+        SearchPosting.objects.filter(post_id__in=ids).delete()
+        postings: List[SearchPosting] = []
+        documents: List[SearchDocument] = []
+        live = Post.objects.filter(id__in=ids, is_deleted=False).values_list('id', 'title', 'body')
+        live_ids = set()
+        for post_id, title, body in live:
+            tf, length = document_terms(title, body)
+            postings.extend(SearchPosting(term=term, post_id=post_id, tf=count) for term, count in tf.items())
+            documents.append(SearchDocument(post_id=post_id, length=length))
+            live_ids.add(post_id)
+
+        SearchDocument.objects.filter(post_id__in=[x for x in ids if x not in live_ids]).delete()
+        SearchDocument.objects.bulk_create(
+            documents,
+            update_conflicts=True,
+            unique_fields=['post'],
+            update_fields=['length', 'indexed_at'],
+        )
+        SearchPosting.objects.bulk_create(postings, batch_size=1000)
+
+
+def matching_post_ids(text: str):
+    """Subquery of post ids containing every term of `text`, or None if it has no terms."""
+
+    terms = query_terms(text)
+    if not terms:
+        return None
+    return posts_with_all_terms(terms)
+
+
+def posts_with_all_terms(terms: List[str]):
+    """Subquery of ids of posts containing every one of `terms`."""
+
+    return (
+        SearchPosting.objects.filter(term__in=terms)
+        .values('post_id')
+        .annotate(matched=Count('term'))
+        .filter(matched=len(terms))
+        .values('post_id')
+    )
+
+
+def ranked(terms: List[str], candidates, *, any_of: Sequence[str] = ()):
+    """Rows of {post_id, score} by BM25, or None if nothing can match.
+
+    A post must contain every term of `terms` and, if `any_of` is given, at
+    least one of those (the expansions of a prefix) - the same AND semantics
+    as the FTS backends.
+    """
+
+    any_of = [t for t in any_of if t not in terms]
+    dfs = dict(
+        SearchPosting.objects.filter(term__in=[*terms, *any_of]).values('term').annotate(c=Count('id')).values_list('term', 'c')
+    )
+    if any(not dfs.get(t) for t in terms) or (any_of and not any(dfs.get(t) for t in any_of)):
+        return None
+    scored = [t for t in [*terms, *any_of] if dfs.get(t)]
+
+    n = SearchDocument.objects.count() or 1
+    avgdl = float(SearchDocument.objects.aggregate(a=Avg('length'))['a'] or 1.0) or 1.0
+    idf = {t: math.log(1.0 + (n - dfs[t] + 0.5) / (dfs[t] + 0.5)) for t in scored}
+
+    tf = Cast('tf', FloatField())
+    dl = Cast('post__search_document__length', FloatField())
+    weight = Case(*[When(term=t, then=Value(idf[t])) for t in scored], default=Value(0.0), output_field=FloatField())
+    score = weight * tf * Value(BM25_K1 + 1.0) / (tf + Value(BM25_K1) * (Value(1.0 - BM25_B) + Value(BM25_B) * dl / Value(avgdl)))
+
+    rows = (
+        SearchPosting.objects.filter(term__in=scored, post__in=candidates)
+        .values('post_id')
+        .annotate(score=Sum(score, output_field=FloatField()))
+    )
+    if terms:
+        rows = rows.annotate(required=Count('term', filter=Q(term__in=terms))).filter(required=len(terms))
+    if any_of:
+        rows = rows.annotate(optional=Count('term', filter=Q(term__in=any_of))).filter(optional__gte=1)
+    return rows.order_by('-score', '-post_id')
+
+
+def expand_prefix(term: str, *, limit: int = 20) -> List[str]:
+    """Indexed terms starting with `term` (for as-you-type suggestions)."""
+
+    return list(
+        SearchPosting.objects.filter(term__startswith=term)
+        .values_list('term', flat=True)
+        .order_by('term')
+        .distinct()[:limit]
+    )
+
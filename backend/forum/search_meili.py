@@ -9,26 +9,64 @@ Important maintenance notes:
 - This project has per-user visibility rules (published vs. author vs. staff).
   We keep all posts in the index and apply permission filters at query time.
 - The index schema is intentionally minimal so we can iterate safely.
-- If MEILI_URL is not configured, search endpoints will fall back to DB search.
+- If MEILI_URL is not configured, search endpoints use the built-in engine
+  (forum.search_local).
+
+Connections:
+- All clients send through one process-wide requests.Session (keep-alive
+  connection pool). Client/Index objects are cached per thread because the SDK
+  mutates request headers per call.
+- Search calls use MEILI_TIMEOUT_SECONDS; index writes use INDEX_TIMEOUT_SECONDS.
+- meili_breaker (a CircuitBreaker) opens after MEILI_BREAKER_FAILURES consecutive
+  errors or calls slower than MEILI_BREAKER_SLOW_SECONDS; while it is open,
+  search_backends.MeiliBackend answers from the database backend instead.
 """
 
 from __future__ import annotations
 
+import logging
 import re
-from dataclasses import dataclass
+import threading
+import time
+from dataclasses import dataclass, field
 from typing import Any, Dict, Iterable, List, Optional, Tuple
 
 from django.conf import settings
 
+from .snippets import CROP_MARKER, HIGHLIGHT_POST_TAG, HIGHLIGHT_PRE_TAG, SNIPPET_CROP_WORDS, markdown_to_plain, safe_formatted
+
 
 try:
     import meilisearch  # type: ignore
+    import requests
+    from meilisearch.errors import MeilisearchApiError, MeilisearchError
+    from requests.adapters import HTTPAdapter
 except Exception:  # pragma: no cover
     meilisearch = None
 
 
+logger = logging.getLogger(__name__)
+
+# Writes carry up to a few thousand documents; they get a longer timeout than searches.
+INDEX_TIMEOUT_SECONDS = 30.0
+POOL_MAXSIZE = 32
+
+
 _ADV_TOKEN_RE = re.compile(r"^(?P<key>[a-zA-Z_]+):(?P<value>.+)$")
 
+# Fields returned for each search hit (every engine); see snippets for `_formatted`.
+SEARCH_HIT_ATTRIBUTES = [
+    'id',
+    'title',
+    'status',
+    'board_id',
+    'board_slug',
+    'author_id',
+    'author_username',
+    'created_at',
+    'updated_at',
+]
+
 
 @dataclass(frozen=True)
 class AdvancedQuery:
@@ -41,10 +79,14 @@ class AdvancedQuery:
     - is:locked / is:pinned
 
     Everything else is treated as the free-text query.
+
+    `filters` are Meilisearch filter expressions; `qualifiers` holds the same
+    accepted (key, value) pairs for engines that filter in the database.
     """
 
     text: str
     filters: List[str]
+    qualifiers: List[Tuple[str, str]] = field(default_factory=list)
 
 
 def meili_enabled() -> bool:
@@ -53,29 +95,227 @@ def meili_enabled() -> bool:
     return bool(getattr(settings, 'MEILI_URL', '')) and meilisearch is not None
 
 
-def get_client():
+class MeiliUnavailable(RuntimeError):
+    """Meilisearch is down, too slow, or the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a cool-down and a single half-open probe.
+
+    - closed: calls go through; an error or a call slower than the slow
+      threshold counts as a failure, anything else resets the count.
+    - open: after `failures` failures in a row; calls are refused for
+      `cooldown` seconds.
+    - half-open: after the cool-down one probe call is let through; success
+      closes the breaker, failure reopens it.
+
+    Thresholds are read from settings on every call so tests can override them.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._opened_at = 0.0
+            self._probing = False
+            self.opened_count = 0
+            self.failovers = 0
+            self.last_error = ''
+
+    @staticmethod
+    def _limits() -> Tuple[int, float, float]:
+        return (
+            max(1, int(getattr(settings, 'MEILI_BREAKER_FAILURES', 5))),
+            float(getattr(settings, 'MEILI_BREAKER_SLOW_SECONDS', 1.0)),
+            float(getattr(settings, 'MEILI_BREAKER_COOLDOWN_SECONDS', 30.0)),
+        )
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self._limits()[2]:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at < self._limits()[2]:
+                return False
+            if self._probing:
+                return False
+            self._state = self.HALF_OPEN
+            self._probing = True
+            return True
+
+    def record_success(self, elapsed: float) -> None:
+        failures, slow_seconds, _cooldown = self._limits()
+        if slow_seconds > 0 and elapsed > slow_seconds:
+            self.record_failure(f'slow call ({elapsed:.2f}s)')
+            return
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self, error: str) -> None:
+        failures, _slow, cooldown = self._limits()
+        with self._lock:
+            self._failures += 1
+            self.last_error = error[:200]
+            if self._state == self.HALF_OPEN or self._failures >= failures:
+                if self._state != self.OPEN:
+                    self.opened_count += 1
+                    logger.warning('%s circuit opened for %.0fs: %s', self.name, cooldown, self.last_error)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def record_failover(self) -> None:
+        with self._lock:
+            self.failovers += 1
+
+    def call(self, fn, *args, **kwargs):
+        """Run fn through the breaker; raises MeiliUnavailable instead of outage errors."""
+
+        if not self.allow():
+            raise MeiliUnavailable(f'{self.name} circuit is open')
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except MeilisearchApiError as exc:
+            if int(getattr(exc, 'status_code', 0) or 0) < 500:
+                # A bad request is our bug, not an outage.
+                self.record_success(time.monotonic() - started)
+                raise
+            self.record_failure(repr(exc))
+            raise MeiliUnavailable(str(exc)) from exc
+        except MeilisearchError as exc:
+            self.record_failure(repr(exc))
+            raise MeiliUnavailable(str(exc)) from exc
+        except Exception as exc:
+            # Anything else (a bad response body, a client bug) still counts.
+            self.record_failure(repr(exc))
+            raise
+        finally:
+            # Whatever escaped, a half-open probe must not stay taken forever.
+            with self._lock:
+                self._probing = False
+        self.record_success(time.monotonic() - started)
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        state = self.state
+        with self._lock:
+            return {
+                'state': state,
+                'consecutive_failures': self._failures,
+                'opened_count': self.opened_count,
+                'failovers': self.failovers,
+                'last_error': self.last_error,
+            }
+
+
+meili_breaker = CircuitBreaker('meilisearch')
+
+_session = None
+_session_lock = threading.Lock()
+_local = threading.local()
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_MAXSIZE)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                _session = session
+    return _session
+
+
+def _pooled(http) -> None:
+    # The SDK passes requests.get/post/...; send the same verb through the shared session.
+    send = http.send_request
+
+    def send_request(http_method, path, *args, **kwargs):
+        return send(getattr(_get_session(), http_method.__name__), path, *args, **kwargs)
+
+    http.send_request = send_request
+
+
+def _thread_cache() -> Dict[tuple, Any]:
+    cached = getattr(_local, 'objects', None)
+    if cached is None:
+        cached = _local.objects = {}
+    return cached
+
+
+def get_client(*, timeout: Optional[float] = None):
+    """This thread's pooled client for the configured server."""
+
     if not meili_enabled():
         raise RuntimeError('Meilisearch not configured.')
-    return meilisearch.Client(settings.MEILI_URL, getattr(settings, 'MEILI_API_KEY', '') or None)
+    timeout = float(timeout or getattr(settings, 'MEILI_TIMEOUT_SECONDS', 2.0) or 2.0)
+    api_key = getattr(settings, 'MEILI_API_KEY', '') or None
+    key = (settings.MEILI_URL, api_key, timeout)
+    cached = _thread_cache()
+    client = cached.get(key)
+    if client is None:
+        client = meilisearch.Client(settings.MEILI_URL, api_key, timeout=timeout)
+        _pooled(client.http)
+        _pooled(client.task_handler.http)
+        cached[key] = client
+    return client
 
 
-def get_posts_index():
-    client = get_client()
-    index_name = getattr(settings, 'MEILI_INDEX_POSTS', 'posts') or 'posts'
-    return client.index(index_name)
+def posts_index_name() -> str:
+    return getattr(settings, 'MEILI_INDEX_POSTS', 'posts') or 'posts'
 
 
-def ensure_posts_index_settings() -> None:
+def get_index(name: str, *, timeout: Optional[float] = None):
+    """This thread's pooled Index object for `name`."""
+
+    client = get_client(timeout=timeout)
+    key = (id(client), name)
+    cached = _thread_cache()
+    index = cached.get(key)
+    if index is None:
+        index = client.index(name)
+        _pooled(index.http)
+        _pooled(index.task_handler.http)
+        cached[key] = index
+    return index
+
+
+def get_posts_index(name: Optional[str] = None, *, timeout: Optional[float] = None):
+    return get_index(name or posts_index_name(), timeout=timeout)
+
+
+def ensure_posts_index_settings(index=None) -> None:
     """Best-effort index settings.
 
     This is safe to call multiple times (idempotent-ish). It will be used by the
-    reindex management command.
+    reindex management command (on the shadow index before it is swapped in).
     """
 
-    index = get_posts_index()
+    index = index or get_posts_index(timeout=INDEX_TIMEOUT_SECONDS)
 
-    # Searchable fields: title/body are the primary UX.
-    index.update_searchable_attributes(['title', 'body'])
+    # Searchable fields: title/body are the primary UX. body_plain ranks before the
+    # raw markdown so documents indexed before body_plain existed still match.
+    index.update_searchable_attributes(['title', 'body_plain', 'body'])
 
     # Filterable fields: required for aggregations and advanced filters.
     index.update_filterable_attributes(
@@ -99,6 +339,7 @@ def ensure_posts_index_settings() -> None:
             'id',
             'title',
             'body',
+            'body_plain',
             'status',
             'board_id',
             'board_slug',
@@ -119,12 +360,12 @@ def ensure_posts_index_settings() -> None:
 def post_to_document(post) -> Dict[str, Any]:
     """Convert a Post model instance into an indexable document."""
 
-    # NOTE: we store the raw markdown body; highlighting will work on this text.
-    # If you later want cleaner snippets, add a separate 'body_plain' field.
+    # `body` is the raw markdown; snippets are cropped from `body_plain`.
     return {
         'id': int(post.id),
         'title': post.title or '',
         'body': post.body or '',
+        'body_plain': markdown_to_plain(post.body or ''),
         'status': getattr(post, 'status', '') or '',
         'board_id': int(post.board_id) if getattr(post, 'board_id', None) else None,
         'board_slug': getattr(getattr(post, 'board', None), 'slug', '') or '',
@@ -152,6 +393,7 @@ def parse_advanced_query(raw: str) -> AdvancedQuery:
     parts = [p for p in raw.split() if p.strip()]
     text_parts: List[str] = []
     filters: List[str] = []
+    qualifiers: List[Tuple[str, str]] = []
 
     for part in parts:
         m = _ADV_TOKEN_RE.match(part)
@@ -167,83 +409,90 @@ def parse_advanced_query(raw: str) -> AdvancedQuery:
         if key == 'board':
             # slug
             filters.append(f"board_slug = '{value}'")
+            qualifiers.append((key, value))
             continue
         if key == 'author':
             filters.append(f"author_username = '{value}'")
+            qualifiers.append((key, value))
             continue
         if key == 'status':
             if value in {'published', 'pending', 'rejected'}:
                 filters.append(f"status = '{value}'")
+                qualifiers.append((key, value))
             continue
         if key == 'is':
             if value == 'locked':
                 filters.append('is_locked = true')
+                qualifiers.append((key, value))
             elif value == 'pinned':
                 filters.append('is_pinned = true')
+                qualifiers.append((key, value))
             continue
 
         # Unknown key => treat as normal text to avoid surprising behavior.
         text_parts.append(part)
 
-    return AdvancedQuery(text=' '.join(text_parts).strip(), filters=filters)
+    return AdvancedQuery(text=' '.join(text_parts).strip(), filters=filters, qualifiers=qualifiers)
 
 
-def build_visibility_filter(*, user) -> Optional[str]:
-    """Translate DRF visibility logic into a Meilisearch filter string."""
+def build_visibility_filter(*, user, status_field: str = 'status', author_field: str = 'author_id') -> Optional[str]:
+    """Translate DRF visibility logic into a Meilisearch filter string.
+
+    The field names let other indexes with the same rules reuse it
+    (resources: created_by_id).
+    """
 
     if user and getattr(user, 'is_authenticated', False):
         if getattr(user, 'is_staff', False):
             return None
         # Normal authed users: published or own posts
-        return f"(status = 'published') OR (author_id = {int(user.id)})"
+        return f"({status_field} = 'published') OR ({author_field} = {int(user.id)})"
     # Anonymous: published only
-    return "status = 'published'"
-
+    return f"{status_field} = 'published'"
 
-def search_posts(*, user, raw_query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
-    """Search posts with highlight positions and facet aggregations."""
 
-    index = get_posts_index()
+def posts_search_params(aq: AdvancedQuery, *, user, limit: int, offset: int = 0) -> Dict[str, Any]:
+    """Search parameters for the posts index (also used by federated multi-search)."""
 
-    aq = parse_advanced_query(raw_query)
     visibility = build_visibility_filter(user=user)
-
     combined_filters: List[str] = []
     if visibility:
         combined_filters.append(f"({visibility})")
     combined_filters.extend(aq.filters)
 
-    filter_expr = ' AND '.join(combined_filters) if combined_filters else None
+    # Hits carry a cropped, highlighted `_formatted.body_plain` instead of the
+    # full body, so the response size doesn't grow with post length.
+    return {
+        'limit': int(max(1, min(limit, 50))),
+        'offset': int(max(0, offset)),
+        'filter': ' AND '.join(combined_filters) if combined_filters else None,
+        'attributesToRetrieve': SEARCH_HIT_ATTRIBUTES + ['body_plain'],
+        'attributesToCrop': ['body_plain'],
+        'cropLength': SNIPPET_CROP_WORDS,
+        'cropMarker': CROP_MARKER,
+        'attributesToHighlight': ['title', 'body_plain'],
+        'highlightPreTag': HIGHLIGHT_PRE_TAG,
+        'highlightPostTag': HIGHLIGHT_POST_TAG,
+        'showMatchesPosition': True,
+    }
+
 
+def search_posts(*, user, raw_query: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """Search posts with highlight positions and facet aggregations."""
+
+    index = get_posts_index()
+
+    aq = parse_advanced_query(raw_query)
+    params = posts_search_params(aq, user=user, limit=limit, offset=offset)
     # facetsDistribution provides aggregation counts.
-    res = index.search(
-        aq.text or '',
-        {
-            'limit': int(max(1, min(limit, 50))),
-            'offset': int(max(0, offset)),
-            'filter': filter_expr,
-            'attributesToRetrieve': [
-                'id',
-                'title',
-                'body',
-                'status',
-                'board_id',
-                'board_slug',
-                'author_id',
-                'author_username',
-                'created_at',
-                'updated_at',
-            ],
-            'showMatchesPosition': True,
-            'facets': ['board_slug', 'author_username'],
-        },
-    )
+    params['facets'] = ['board_slug', 'author_username']
+    res = index.search(aq.text or '', params)
 
     return {
         'engine': 'meili',
         'query': raw_query,
-        'parsed': {'text': aq.text, 'filters': aq.filters, 'visibility': visibility},
-        'hits': res.get('hits', []),
+        'parsed': {'text': aq.text, 'filters': aq.filters, 'visibility': build_visibility_filter(user=user)},
+        'hits': [compact_hit(hit) for hit in res.get('hits', [])],
         'total': res.get('estimatedTotalHits', res.get('nbHits', 0)),
         'limit': res.get('limit', limit),
         'offset': res.get('offset', offset),
@@ -251,6 +500,19 @@ def search_posts(*, user, raw_query: str, limit: int = 20, offset: int = 0) -> D
     }
 
 
+def compact_hit(hit: Dict[str, Any]) -> Dict[str, Any]:
+    formatted = hit.get('_formatted') or {}
+    out = {key: hit.get(key) for key in SEARCH_HIT_ATTRIBUTES}
+    out['_formatted'] = {
+        'title': safe_formatted(formatted.get('title', hit.get('title'))),
+        'body_plain': safe_formatted(formatted.get('body_plain', '')),
+    }
+    # Only title offsets: body offsets would point into text we no longer send.
+    positions = hit.get('_matchesPosition') or {}
+    out['_matchesPosition'] = {'title': positions['title']} if positions.get('title') else {}
+    return out
+
+
 def suggest_posts(*, user, raw_query: str, limit: int = 8) -> Dict[str, Any]:
     """Return lightweight suggestions for topbar autocomplete."""
 
@@ -280,3 +542,4 @@ def suggest_posts(*, user, raw_query: str, limit: int = 8) -> Dict[str, Any]:
         'query': raw_query,
         'hits': res.get('hits', []),
     }
+
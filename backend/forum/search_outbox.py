@@ -0,0 +1,152 @@
+"""Transactional outbox for incremental search indexing.
+
+Write path:
+- enqueue_post_changes() / enqueue_search_changes() insert SearchOutbox rows
+  inside the caller's transaction, so the index is only told about changes
+  that committed. Rows carry the entity (posts, comments, users, tags,
+  resources; see search_federated for the non-post indexes).
+
+Drain path (`python manage.py search_sync`):
+- drain_search_outbox() claims a batch of rows in a short transaction (SKIP
+  LOCKED where supported so several workers can run) and commits, so no lock
+  is held across HTTP calls. It coalesces the rows per object, reads each
+  object's current state, then sends one add_documents and one
+  delete_documents call per entity index. Claims older than
+  SEARCH_OUTBOX_CLAIM_SECONDS (a worker died mid-batch) are taken over.
+- Comments are only indexed while their post is published. The outbox does
+  not know a post's previous status, so every drained post re-enqueues its
+  comments: hiding a post deletes them, and publishing it (including
+  approving an edit that had sent it back to pending) adds them again.
+- Rows are deleted only after Meilisearch accepted the batch; on failure the
+  claim is released and they are retried on the next run.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Comment, Post, SearchOutbox
+from .search_meili import INDEX_TIMEOUT_SECONDS, get_index, get_posts_index, meili_enabled, post_to_document
+from .suggest_index import note_post_changes
+
+
+SEARCH_OUTBOX_BATCH_SIZE = 500
+# Longer than one batch can take (a few index calls of INDEX_TIMEOUT_SECONDS).
+SEARCH_OUTBOX_CLAIM_SECONDS = 300
+
+
+def enqueue_post_changes(post_ids: Iterable[int], *, op: str = SearchOutbox.Op.UPSERT) -> None:
+    """Record that some posts need (re)indexing.
+
+    The database index (see search_backends) is updated once the caller's
+    transaction commits, so writers do not hold their transaction open while
+    posts are tokenized; a failure there is logged and `rebuild_search_index`
+    repairs it. It is also maintained when Meilisearch is configured, because
+    search fails over to it while the Meilisearch circuit is open.
+    """
+
+    ids = list(dict.fromkeys(int(x) for x in post_ids if x))
+    if not ids:
+        return
+    from .search_backends import get_database_backend
+
+    transaction.on_commit(lambda: note_post_changes(ids))
+    transaction.on_commit(lambda: get_database_backend().index_posts(ids), robust=True)
+    if not meili_enabled():
+        return
+    SearchOutbox.objects.bulk_create([SearchOutbox(object_id=post_id, op=op) for post_id in ids])
+
+
+def enqueue_search_changes(entity: str, object_ids: Iterable[int], *, op: str = SearchOutbox.Op.UPSERT) -> None:
+    """Record changes to comments, users, tags or resources.
+
+    Only Meilisearch indexes these; without it the federated search reads the
+    tables directly, so there is nothing to do.
+    """
+
+    ids = list(dict.fromkeys(int(x) for x in object_ids if x))
+    if not ids or not meili_enabled():
+        return
+    SearchOutbox.objects.bulk_create([SearchOutbox(entity=entity, object_id=object_id, op=op) for object_id in ids])
+
+
+def drain_search_outbox(*, batch_size: int = SEARCH_OUTBOX_BATCH_SIZE) -> Dict[str, int]:
+    """Process one batch. Returns counts: rows, upserted, deleted."""
+
+    rows = _claim_rows(max(1, int(batch_size)))
+    if not rows:
+        return {'rows': 0, 'upserted': 0, 'deleted': 0}
+    row_ids = [row_id for row_id, _entity, _object_id in rows]
+
+    # Coalesce: the object's current state decides, the queued op is only a hint.
+    by_entity: Dict[str, List[int]] = {}
+    for _id, entity, object_id in rows:
+        by_entity.setdefault(entity, [])
+        if object_id not in by_entity[entity]:
+            by_entity[entity].append(object_id)
+
+    upserted = deleted = 0
+    try:
+        for entity, object_ids in by_entity.items():
+            if entity == SearchOutbox.Entity.POSTS:
+                docs, to_delete = _post_documents(object_ids)
+                index = get_posts_index(timeout=INDEX_TIMEOUT_SECONDS)
+            else:
+                from .search_federated import entity_documents, entity_index_name
+
+                docs, to_delete = entity_documents(entity, object_ids)
+                index = get_index(entity_index_name(entity), timeout=INDEX_TIMEOUT_SECONDS)
+            if docs:
+                index.add_documents(docs, primary_key='id')
+            if to_delete:
+                index.delete_documents([str(x) for x in to_delete])
+            upserted += len(docs)
+            deleted += len(to_delete)
+    except Exception:
+        SearchOutbox.objects.filter(id__in=row_ids).update(claimed_at=None)
+        raise
+
+    SearchOutbox.objects.filter(id__in=row_ids).delete()
+    return {'rows': len(rows), 'upserted': upserted, 'deleted': deleted}
+
+
+def _claim_rows(batch_size: int) -> List[Tuple[int, str, int]]:
+    """Mark a batch of unclaimed (or stale) rows as taken, and commit."""
+
+    now = timezone.now()
+    with transaction.atomic():
+        qs = SearchOutbox.objects.filter(
+            Q(claimed_at__isnull=True) | Q(claimed_at__lt=now - timedelta(seconds=SEARCH_OUTBOX_CLAIM_SECONDS))
+        ).order_by('id')
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        rows = list(qs.values_list('id', 'entity', 'object_id')[:batch_size])
+        if rows:
+            SearchOutbox.objects.filter(id__in=[row_id for row_id, _entity, _object_id in rows]).update(claimed_at=now)
+    return rows
+
+
+def _post_documents(post_ids: List[int]) -> Tuple[List[dict], List[int]]:
+    posts = {
+        p.id: p
+        for p in Post.objects.select_related('board', 'author').filter(id__in=post_ids)
+    }
+
+    docs: List[dict] = []
+    to_delete: List[int] = []
+    for post_id in post_ids:
+        post = posts.get(post_id)
+        if post is None or post.is_deleted:
+            to_delete.append(int(post_id))
+        else:
+            docs.append(post_to_document(post))
+
+    if posts:
+        comment_ids = Comment.objects.filter(post_id__in=list(posts), is_deleted=False).values_list('id', flat=True)
+        enqueue_search_changes(SearchOutbox.Entity.COMMENTS, list(comment_ids))
+    return docs, to_delete
@@ -3,9 +3,13 @@ import json
 from django.db.models import F
 from rest_framework import serializers
 
-from .models import Board, BoardHeroSlide, Comment, HomeHeroSlide, Post, Tag
-from .image_utils import validate_and_process_uploaded_image
+from .models import Board, BoardHeroSlide, Comment, HomeHeroSlide, ImageJob, Post, SavedSearch, SearchOutbox, Tag
+from .image_jobs import cancel_image_jobs, job_payload, queue_image_job
+from .image_utils import inspect_uploaded_image
+from .image_variants import image_meta, image_srcset
 from .sanitize import sanitize_user_html_in_markdown
+from .saved_searches import SavedSearchError, create_saved_search
+from .search_outbox import enqueue_search_changes
 
 
 class PostResourceLinkInputSerializer(serializers.Serializer):
@@ -68,7 +72,9 @@ class TagNameField(serializers.SlugRelatedField):
         if len(value) > 100:
             raise serializers.ValidationError('Tag name too long.')
 
-        tag, _ = Tag.objects.get_or_create(name=value)
+        tag, created = Tag.objects.get_or_create(name=value)
+        if created:
+            enqueue_search_changes(SearchOutbox.Entity.TAGS, [tag.id])
         return tag
 
 
@@ -78,6 +84,13 @@ class PostSerializer(serializers.ModelSerializer):
     author_pid = serializers.CharField(source='author.pid', read_only=True)
     board_slug = serializers.CharField(source='board.slug', read_only=True)
     cover_image_url = serializers.SerializerMethodField(read_only=True)
+    # {"webp": "<url> 320w, ...", "avif": ...}; empty until variants exist.
+    cover_image_srcset = serializers.SerializerMethodField(read_only=True)
+    # {"width", "height", "bytes", "format", "dominant_color", "placeholder"} or null.
+    cover_image_meta = serializers.SerializerMethodField(read_only=True)
+    # Set on create/update when a new cover was uploaded; it replaces
+    # cover_image_url once processed (poll /api/posts/images/<id>/).
+    cover_image_job = serializers.SerializerMethodField(read_only=True)
     tags = TagNameField(many=True, slug_field='name', queryset=Tag.objects.all(), required=False)
     tags_details = TagSerializer(source='tags', many=True, read_only=True)
     # Social fields (interaction layer)
@@ -110,6 +123,9 @@ class PostSerializer(serializers.ModelSerializer):
             'title',
 			'cover_image',
 			'cover_image_url',
+			'cover_image_srcset',
+			'cover_image_meta',
+			'cover_image_job',
             'remove_cover_image',
             'body',
             'tags',
@@ -149,6 +165,9 @@ class PostSerializer(serializers.ModelSerializer):
             'author_pid',
             'board_slug',
             'cover_image_url',
+            'cover_image_srcset',
+            'cover_image_meta',
+            'cover_image_job',
             'hot_score_100',
             'likes_count',
             'favorites_count',
@@ -183,12 +202,35 @@ class PostSerializer(serializers.ModelSerializer):
         except Exception:
             return ''
 
+    def get_cover_image_srcset(self, obj):
+        return image_srcset(self, obj, 'cover_image')
+
+    def get_cover_image_meta(self, obj):
+        return image_meta(self, obj, 'cover_image')
+
+    def get_cover_image_job(self, obj):
+        job = getattr(obj, '_cover_image_job', None)
+        return job_payload(job) if job is not None else None
+
     def validate_cover_image(self, value):
+        # Header checks only; decoding/re-encoding happens in an ImageJob after save.
         if value is None:
             return value
-        processed = validate_and_process_uploaded_image(uploaded_file=value, field_name='cover_image')
-        processed.content.name = f"cover.{processed.ext}"
-        return processed.content
+        inspect_uploaded_image(uploaded_file=value, field_name='cover_image')
+        return value
+
+    def _queue_cover(self, post, upload):
+        request = self.context.get('request')
+        user = getattr(request, 'user', None) if request is not None else None
+        if user is None or not getattr(user, 'is_authenticated', False):
+            user = post.author
+        post._cover_image_job = queue_image_job(
+            user=user,
+            uploaded_file=upload,
+            kind=ImageJob.Kind.COVER,
+            target_id=post.id,
+            field_name='cover_image',
+        )
 
     def validate_body(self, value):
         # Whitelist raw HTML in markdown (XSS defense-in-depth).
@@ -202,10 +244,13 @@ class PostSerializer(serializers.ModelSerializer):
         tags = validated_data.pop('tags', [])
 
         # For create, allow clients to explicitly indicate no cover.
+        cover = validated_data.pop('cover_image', None)
         if remove_cover:
-            validated_data.pop('cover_image', None)
+            cover = None
 
         post = super().create(validated_data)
+        if cover is not None:
+            self._queue_cover(post, cover)
         if tags:
             post.tags.set(tags)
             Tag.objects.filter(id__in=[t.id for t in tags]).update(usage_count=F('usage_count') + 1)
@@ -214,11 +259,16 @@ class PostSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         # Ignore serializer-only inputs (resource_links handled by view).
         validated_data.pop('resource_links', None)
+        cover = validated_data.pop('cover_image', None)
         if validated_data.pop('remove_cover_image', False):
+            # The cover's PostImage row (and blob count) follows on sync_post_images().
             instance.cover_image = None
+            cancel_image_jobs(kind=ImageJob.Kind.COVER, target_id=instance.id)
 
         tags = validated_data.pop('tags', None)
         updated = super().update(instance, validated_data)
+        if cover is not None:
+            self._queue_cover(updated, cover)
 
         if tags is not None:
             old_ids = set(updated.tags.values_list('id', flat=True))
@@ -403,6 +453,8 @@ class CommentCreateSerializer(serializers.Serializer):
 
 class HomeHeroSlideSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField(read_only=True)
+    image_srcset = serializers.SerializerMethodField(read_only=True)
+    image_meta = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = HomeHeroSlide
@@ -413,6 +465,8 @@ class HomeHeroSlideSerializer(serializers.ModelSerializer):
             'description',
             'link_url',
             'image_url',
+            'image_srcset',
+            'image_meta',
         )
 
     def get_image_url(self, obj):
@@ -422,13 +476,23 @@ class HomeHeroSlideSerializer(serializers.ModelSerializer):
         except Exception:
             return ''
 
+    def get_image_srcset(self, obj):
+        return image_srcset(self, obj, 'image')
+
+    def get_image_meta(self, obj):
+        return image_meta(self, obj, 'image')
+
 
 class BoardHeroSlideSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField(read_only=True)
+    image_srcset = serializers.SerializerMethodField(read_only=True)
+    image_meta = serializers.SerializerMethodField(read_only=True)
     post_id = serializers.IntegerField(source='post.id', read_only=True)
     post_title = serializers.CharField(source='post.title', read_only=True)
     post_author_username = serializers.CharField(source='post.author.username', read_only=True)
     post_cover_image_url = serializers.SerializerMethodField(read_only=True)
+    post_cover_image_srcset = serializers.SerializerMethodField(read_only=True)
+    post_cover_image_meta = serializers.SerializerMethodField(read_only=True)
 
     class Meta:
         model = BoardHeroSlide
@@ -439,10 +503,14 @@ class BoardHeroSlideSerializer(serializers.ModelSerializer):
             'title',
             'description',
             'image_url',
+            'image_srcset',
+            'image_meta',
             'post_id',
             'post_title',
             'post_author_username',
             'post_cover_image_url',
+            'post_cover_image_srcset',
+            'post_cover_image_meta',
         )
 
     def get_image_url(self, obj):
@@ -459,6 +527,18 @@ class BoardHeroSlideSerializer(serializers.ModelSerializer):
         except Exception:
             return ''
 
+    def get_image_srcset(self, obj):
+        return image_srcset(self, obj, 'image')
+
+    def get_image_meta(self, obj):
+        return image_meta(self, obj, 'image')
+
+    def get_post_cover_image_srcset(self, obj):
+        return image_srcset(self, obj, 'post.cover_image')
+
+    def get_post_cover_image_meta(self, obj):
+        return image_meta(self, obj, 'post.cover_image')
+
 
 class PostRevisionSerializer(serializers.Serializer):
     id = serializers.IntegerField()
@@ -473,6 +553,8 @@ class PostRevisionDiffSerializer(serializers.Serializer):
     title_diff = serializers.CharField()
     body_diff = serializers.CharField()
     cover_changed = serializers.BooleanField()
+    mode = serializers.CharField(default='line')
+    truncated = serializers.BooleanField(default=False)
 
     def validate(self, attrs):
         request = self.context.get('request')
@@ -490,4 +572,28 @@ class PostRevisionDiffSerializer(serializers.Serializer):
         }
         if any(k in attrs for k in protected):
             raise serializers.ValidationError('Not allowed.')
-        return attrs
\ No newline at end of file
+        return attrs
+
+
+class SavedSearchSerializer(serializers.ModelSerializer):
+    """Saved query alerts. `query` uses the /api/posts/search/ syntax and can't be edited."""
+
+    class Meta:
+        model = SavedSearch
+        fields = ('id', 'query', 'text', 'qualifiers', 'is_active', 'created_at')
+        read_only_fields = ('text', 'qualifiers', 'created_at')
+
+    def validate_query(self, value):
+        if self.instance is not None and value != self.instance.query:
+            raise serializers.ValidationError('Query cannot be changed; create a new saved search.')
+        return value
+
+    def create(self, validated_data):
+        try:
+            saved = create_saved_search(user=self.context['request'].user, raw_query=validated_data['query'])
+        except SavedSearchError as exc:
+            raise serializers.ValidationError({'query': str(exc)})
+        if validated_data.get('is_active') is False:
+            saved.is_active = False
+            saved.save(update_fields=['is_active'])
+        return saved
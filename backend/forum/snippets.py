@@ -0,0 +1,141 @@
+"""Plain text and cropped/highlighted snippets for search hits.
+
+- markdown_to_plain(): what we index as `body_plain` (no markup, URLs or HTML),
+  so snippets read like prose and link targets don't match queries.
+- format_snippet(): the in-database equivalent of Meilisearch's
+  attributesToCrop/cropLength + attributesToHighlight. It cuts a window of
+  SNIPPET_CROP_WORDS words around the first match and wraps matches in <mark>.
+- safe_formatted(): HTML-escapes everything except our <mark> tags. Meilisearch
+  returns highlighted text unescaped, so its `_formatted` goes through this too.
+
+Counting "words" like Meilisearch: each CJK character counts as one.
+"""
+
+from __future__ import annotations
+
+import html
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import bleach
+
+
+SNIPPET_CROP_WORDS = 30
+# Hard cap for text without spaces (long tokens would otherwise count as one word).
+MAX_SNIPPET_CHARS = 400
+MAX_MATCHES_PER_FIELD = 20
+CROP_MARKER = '…'
+HIGHLIGHT_PRE_TAG = '<mark>'
+HIGHLIGHT_POST_TAG = '</mark>'
+
+_CJK = r'\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af'
+_WORD_RE = re.compile(rf'[{_CJK}]|[^\s{_CJK}]+')
+
+_FENCE_RE = re.compile(r'^\s*(```|~~~).*$', re.MULTILINE)
+_IMAGE_RE = re.compile(r'!\[([^\]]*)\]\([^)]*\)')
+_LINK_RE = re.compile(r'\[([^\]]+)\]\([^)]*\)')
+_AUTOLINK_RE = re.compile(r'<(https?://[^>]+)>')
+_URL_RE = re.compile(r'https?://\S+')
+_LINE_PREFIX_RE = re.compile(r'^\s{0,3}(?:#{1,6}\s+|>\s?|[-*+]\s+|\d+[.)]\s+)', re.MULTILINE)
+_EMPHASIS_RE = re.compile(r'(\*\*|__|~~|\*|`)')
+_SPACE_RE = re.compile(r'\s+')
+_MARK_RE = re.compile(f'({re.escape(HIGHLIGHT_PRE_TAG)}|{re.escape(HIGHLIGHT_POST_TAG)})')
+
+
+def markdown_to_plain(text: str) -> str:
+    """Best-effort markdown -> single-line plain text."""
+
+    if not text:
+        return ''
+    out = _FENCE_RE.sub(' ', str(text))
+    out = _IMAGE_RE.sub(r'\1', out)
+    out = _LINK_RE.sub(r'\1', out)
+    out = _AUTOLINK_RE.sub(' ', out)
+    out = bleach.clean(out, tags=[], strip=True)
+    out = html.unescape(out)
+    out = _URL_RE.sub(' ', out)
+    out = _LINE_PREFIX_RE.sub('', out)
+    out = _EMPHASIS_RE.sub('', out)
+    return _SPACE_RE.sub(' ', out).strip()
+
+
+def match_positions(text: str, terms: Sequence[str]) -> List[Dict[str, int]]:
+    """Merged [{start, length}] spans of `terms` in `text` (case-insensitive)."""
+
+    lowered = (text or '').lower()
+    spans: List[Tuple[int, int]] = []
+    for term in terms:
+        if not term:
+            continue
+        start = lowered.find(term)
+        while start != -1 and len(spans) < MAX_MATCHES_PER_FIELD * 4:
+            spans.append((start, start + len(term)))
+            start = lowered.find(term, start + len(term))
+    spans.sort()
+    merged: List[List[int]] = []
+    for start, end in spans:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [{'start': s, 'length': e - s} for s, e in merged[:MAX_MATCHES_PER_FIELD]]
+
+
+def _spans(text: str, terms: Sequence[str]) -> List[Tuple[int, int]]:
+    return [(m['start'], m['start'] + m['length']) for m in match_positions(text, terms)]
+
+
+def highlight(text: str, terms: Sequence[str]) -> str:
+    """HTML-escaped `text` with matches wrapped in <mark>."""
+
+    out: List[str] = []
+    cursor = 0
+    for start, end in _spans(text, terms):
+        out.append(html.escape(text[cursor:start]))
+        out.append(HIGHLIGHT_PRE_TAG + html.escape(text[start:end]) + HIGHLIGHT_POST_TAG)
+        cursor = end
+    out.append(html.escape(text[cursor:]))
+    return ''.join(out)
+
+
+def crop(text: str, terms: Sequence[str], *, crop_length: int = SNIPPET_CROP_WORDS) -> str:
+    """About `crop_length` words (at most MAX_SNIPPET_CHARS) of `text` around the first match."""
+
+    text = text or ''
+    words = [(m.start(), m.end()) for m in _WORD_RE.finditer(text)]
+    if not words:
+        return ''
+
+    spans = _spans(text, terms)
+    anchor = spans[0][0] if spans else words[0][0]
+    first = next((i for i, (_s, e) in enumerate(words) if e > anchor), 0)
+    count = min(crop_length, len(words))
+    start = max(0, min(first - count // 3, len(words) - count))
+    lo, hi = words[start][0], words[start + count - 1][1]
+    if hi - lo > MAX_SNIPPET_CHARS:
+        lo = max(lo, min(anchor - MAX_SNIPPET_CHARS // 3, hi - MAX_SNIPPET_CHARS))
+        hi = lo + MAX_SNIPPET_CHARS
+
+    snippet = text[lo:hi]
+    if lo > words[0][0]:
+        snippet = CROP_MARKER + snippet
+    if hi < words[-1][1]:
+        snippet = snippet + CROP_MARKER
+    return snippet
+
+
+def format_snippet(text: str, terms: Sequence[str], *, crop_length: int = SNIPPET_CROP_WORDS) -> str:
+    return highlight(crop(text, terms, crop_length=crop_length), terms)
+
+
+def safe_formatted(value) -> str:
+    """Escape HTML in an already-highlighted string, keeping only <mark>...</mark>."""
+
+    parts = _MARK_RE.split(str(value or ''))
+    return ''.join(p if p in (HIGHLIGHT_PRE_TAG, HIGHLIGHT_POST_TAG) else html.escape(p) for p in parts)
+
+
+def formatted_fields(*, title: str, body_plain: str, terms: Sequence[str]) -> Dict[str, str]:
+    """`_formatted` for a hit, matching the Meilisearch request in search_posts()."""
+
+    return {'title': highlight(title or '', terms), 'body_plain': format_snippet(body_plain or '', terms)}
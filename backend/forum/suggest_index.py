@@ -0,0 +1,313 @@
+"""Per-process prefix index for /api/posts/suggest/.
+
+Suggest fires on every keystroke, so it is answered from memory:
+- keys: sorted list of normalized title tokens (search_local.tokenize: words +
+  CJK bigrams); each key maps to post ids ordered by popularity.
+- per post: title, status, author, board/author labels and a popularity weight
+  (views + 5 * likes, same as the "hot" widget). Visibility is checked per
+  request from these flags, so no query is needed for any user.
+- A query matches when every token but the last is a key and the last token
+  is a key prefix (bisect on the sorted keys).
+
+Freshness:
+- Post writes call note_post_changes() (via enqueue_post_changes, on commit):
+  it appends the changed ids to the PostChange table. The default cache is
+  per process, so the log lives in the database where every worker sees it.
+- Each process reads the log past the last id it applied at most every
+  CHECK_INTERVAL_SECONDS and re-reads only the changed posts. If more than
+  MAX_CATCHUP_CHANGES are pending, or after MAX_AGE_SECONDS (views/likes
+  drift), it rebuilds from the database.
+
+Full builds run on a background thread, never inside a request: requests keep
+being answered from the previous snapshot meanwhile, and until a process has
+its first snapshot suggest_posts() returns None so the view falls back to the
+search backend.
+"""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Post, PostChange
+from .search_local import tokenize
+
+
+logger = logging.getLogger(__name__)
+
+CHECK_INTERVAL_SECONDS = 2.0
+MAX_AGE_SECONDS = 600.0
+MAX_POSTS = 200_000
+MAX_CATCHUP_CHANGES = 1000
+CHANGE_LOG_TTL_SECONDS = 3600
+MAX_SCANNED_KEYS = 200
+MAX_TITLE_KEYS = 64
+
+# post_id -> (title, status, author_id, weight, board_slug, author_username, keys)
+_PostEntry = Tuple[str, str, Optional[int], int, str, str, Tuple[str, ...]]
+
+
+def posts_version() -> int:
+    """Moved by note_post_changes() in every process; lets caches key on "no post changed since"."""
+
+    return int(PostChange.objects.order_by('-id').values_list('id', flat=True).first() or 0)
+
+
+def note_post_changes(post_ids: Iterable[int]) -> None:
+    """Tell every process these posts changed (call after commit)."""
+
+    ids = sorted({int(x) for x in post_ids if x})
+    if ids:
+        PostChange.objects.bulk_create([PostChange(post_id=post_id) for post_id in ids])
+
+
+def prune_post_changes() -> int:
+    """Drop log rows no process can still need (every snapshot is younger than MAX_AGE_SECONDS)."""
+
+    cutoff = timezone.now() - timedelta(seconds=CHANGE_LOG_TTL_SECONDS)
+    return PostChange.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+def _title_keys(title: str) -> Tuple[str, ...]:
+    return tuple(dict.fromkeys(tokenize(title)))[:MAX_TITLE_KEYS]
+
+
+class _SuggestIndex:
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._refresh_lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self.keys: List[str] = []
+        self.postings: Dict[str, List[int]] = {}
+        self.posts: Dict[int, _PostEntry] = {}
+        self.version: Optional[int] = None
+        self.built_at = 0.0
+        self.checked_at = 0.0
+
+    # --- loading ---
+
+    @staticmethod
+    def _rows(post_ids: Optional[List[int]] = None):
+        qs = Post.objects.filter(is_deleted=False)
+        if post_ids is not None:
+            qs = qs.filter(id__in=post_ids)
+        qs = qs.annotate(n_likes=Count('likes')).order_by('-id')
+        if post_ids is None:
+            qs = qs[:MAX_POSTS]
+        return qs.values_list('id', 'title', 'status', 'author_id', 'views_count', 'n_likes', 'board__slug', 'author__username')
+
+    @staticmethod
+    def _entry(row) -> Tuple[int, _PostEntry]:
+        post_id, title, status, author_id, views, likes, board_slug, username = row
+        weight = int(views or 0) + 5 * int(likes or 0)
+        return int(post_id), (title or '', status, author_id, weight, board_slug or '', username or '', _title_keys(title))
+
+    def _weight(self, post_id: int) -> int:
+        entry = self.posts.get(post_id)
+        return entry[3] if entry else 0
+
+    def rebuild(self) -> None:
+        version = posts_version()
+        posts: Dict[int, _PostEntry] = {}
+        postings: Dict[str, List[int]] = {}
+        for row in self._rows():
+            post_id, entry = self._entry(row)
+            posts[post_id] = entry
+            for key in entry[6]:
+                postings.setdefault(key, []).append(post_id)
+        for ids in postings.values():
+            ids.sort(key=lambda i: (-posts[i][3], -i))
+        # Not in the middle of applying a change log to the old snapshot.
+        with self._refresh_lock, self._lock:
+            self.posts = posts
+            self.postings = postings
+            self.keys = sorted(postings)
+            self.version = version
+            self.built_at = self.checked_at = time.monotonic()
+
+    def _remove(self, post_id: int) -> None:
+        entry = self.posts.pop(post_id, None)
+        if entry is None:
+            return
+        for key in entry[6]:
+            ids = self.postings.get(key)
+            if not ids:
+                continue
+            try:
+                ids.remove(post_id)
+            except ValueError:
+                pass
+            if not ids:
+                del self.postings[key]
+                i = bisect_left(self.keys, key)
+                if i < len(self.keys) and self.keys[i] == key:
+                    del self.keys[i]
+
+    def refresh(self, post_ids: List[int]) -> None:
+        rows = {int(r[0]): r for r in self._rows(post_ids)}
+        with self._lock:
+            for post_id in post_ids:
+                self._remove(post_id)
+                row = rows.get(post_id)
+                if row is None:
+                    continue
+                post_id, entry = self._entry(row)
+                self.posts[post_id] = entry
+                for key in entry[6]:
+                    ids = self.postings.get(key)
+                    if ids is None:
+                        self.postings[key] = [post_id]
+                        insort(self.keys, key)
+                        continue
+                    ids.append(post_id)
+                    ids.sort(key=lambda i: (-self._weight(i), -i))
+
+    def _build_in_background(self) -> None:
+        try:
+            self.rebuild()
+            prune_post_changes()
+        except Exception:
+            logger.exception('could not build the suggest index')
+        finally:
+            connection.close()
+            self._build_lock.release()
+
+    def start_rebuild(self) -> None:
+        """Rebuild on a background thread unless one is already running."""
+
+        if not self._build_lock.acquire(blocking=False):
+            return
+        try:
+            threading.Thread(target=self._build_in_background, name='suggest-index', daemon=True).start()
+        except Exception:
+            self._build_lock.release()
+            raise
+
+    def ensure_fresh(self) -> bool:
+        """Apply pending changes, scheduling a rebuild when needed. False until a snapshot exists."""
+
+        now = time.monotonic()
+        if self.version is not None and now - self.checked_at < CHECK_INTERVAL_SECONDS:
+            return True
+        # One thread refreshes; the others keep serving the current snapshot.
+        if self._refresh_lock.acquire(blocking=False):
+            try:
+                self._catch_up(now)
+            finally:
+                self._refresh_lock.release()
+        return self.version is not None
+
+    def _catch_up(self, now: float) -> None:
+        if self.version is None or now - self.built_at > MAX_AGE_SECONDS:
+            self.start_rebuild()
+            return
+        self.checked_at = now
+
+        logged = list(
+            PostChange.objects.filter(id__gt=self.version)
+            .order_by('id')
+            .values_list('id', 'post_id')[: MAX_CATCHUP_CHANGES + 1]
+        )
+        if not logged:
+            return
+        if len(logged) > MAX_CATCHUP_CHANGES:
+            self.start_rebuild()
+            return
+        self.refresh(sorted({post_id for _id, post_id in logged}))
+        self.version = logged[-1][0]
+
+    # --- querying ---
+
+    def _prefix_ids(self, prefix: str) -> List[int]:
+        i = bisect_left(self.keys, prefix)
+        seen: Dict[int, None] = {}
+        scanned = 0
+        while i < len(self.keys) and self.keys[i].startswith(prefix) and scanned < MAX_SCANNED_KEYS:
+            for post_id in self.postings.get(self.keys[i], ()):
+                seen.setdefault(post_id, None)
+            i += 1
+            scanned += 1
+        return list(seen)
+
+    def suggest(self, *, user, terms: List[str], limit: int) -> List[Dict[str, Any]]:
+        if not terms:
+            return []
+        is_staff = bool(user and getattr(user, 'is_authenticated', False) and getattr(user, 'is_staff', False))
+        user_id = getattr(user, 'id', None) if user and getattr(user, 'is_authenticated', False) else None
+
+        with self._lock:
+            ids = self._prefix_ids(terms[-1])
+            for term in terms[:-1]:
+                exact = set(self.postings.get(term, ()))
+                ids = [i for i in ids if i in exact]
+            entries = []
+            for post_id in ids:
+                entry = self.posts.get(post_id)
+                if entry is None:
+                    continue
+                if not is_staff and entry[1] != Post.Status.PUBLISHED and (user_id is None or entry[2] != user_id):
+                    continue
+                entries.append((post_id, entry))
+
+        entries.sort(key=lambda item: (-item[1][3], -item[0]))
+        return [
+            {'id': post_id, 'title': entry[0], 'board_slug': entry[4], 'author_username': entry[5]}
+            for post_id, entry in entries[:limit]
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'posts': len(self.posts),
+                'keys': len(self.keys),
+                'version': self.version,
+                'building': self._build_lock.locked(),
+                'age_seconds': round(time.monotonic() - self.built_at, 1) if self.version is not None else None,
+            }
+
+
+_index = _SuggestIndex()
+
+
+def suggest_posts(*, user, raw_query: str, limit: int = 8) -> Optional[Dict[str, Any]]:
+    """Suggest response from memory, or None when the query needs a real backend.
+
+    That is the case for qualifiers, and while this process's first snapshot
+    is still being built.
+    """
+
+    from .search_backends import matches_position
+    from .search_meili import parse_advanced_query
+
+    aq = parse_advanced_query(raw_query)
+    if aq.qualifiers:
+        return None
+    terms = list(dict.fromkeys(tokenize(aq.text)))
+    hits: List[Dict[str, Any]] = []
+    if terms:
+        if not _index.ensure_fresh():
+            return None
+        hits = _index.suggest(user=user, terms=terms, limit=int(max(1, min(limit, 20))))
+        for hit in hits:
+            hit['_matchesPosition'] = matches_position({'title': hit['title']}, terms)
+    return {'engine': 'memory', 'query': raw_query, 'hits': hits}
+
+
+def suggest_index_stats() -> Dict[str, Any]:
+    return _index.stats()
+
+
+def invalidate_suggest_index() -> None:
+    """Drop this process's snapshot; the next suggest call starts a rebuild."""
+
+    with _index._lock:
+        _index.version = None
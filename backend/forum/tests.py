@@ -1,5 +1,8 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.core.cache import cache
+from django.test import TestCase, TransactionTestCase
 
 from rest_framework.test import APIClient
 
@@ -31,3 +34,1017 @@ class PostCreateSerializerExtrasTests(TestCase):
 		post = Post.objects.get(id=post_id)
 		self.assertFalse(bool(post.cover_image))
 		self.assertIn(getattr(post.cover_image, 'name', None), (None, ''))
+
+
+class ModerationClaimNextTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		User = get_user_model()
+		self.author = User.objects.create_user(username='@author', password='pw')
+		self.mod1 = User.objects.create_superuser(username='@mod1', password='pw')
+		self.mod2 = User.objects.create_superuser(username='@mod2', password='pw')
+		self.board = Board.objects.create(slug='test-queue', title='queue', description='', sort_order=0, is_active=True)
+		self.posts = [
+			Post.objects.create(board=self.board, author=self.author, title=f'p{i}', body='x', status=Post.Status.PENDING)
+			for i in range(5)
+		]
+
+	def test_claim_next_never_hands_out_the_same_post_twice(self):
+		self.client.force_authenticate(user=self.mod1)
+		r1 = self.client.post('/api/posts/moderation/claim-next/', {'count': 3}, format='json')
+		self.assertEqual(r1.status_code, 200, r1.content)
+		self.assertEqual(r1.data['claimed'], 3)
+
+		self.client.force_authenticate(user=self.mod2)
+		r2 = self.client.post('/api/posts/moderation/claim-next/', {'count': 3}, format='json')
+		self.assertEqual(r2.data['claimed'], 2)
+
+		ids1 = {p['id'] for p in r1.data['results']}
+		ids2 = {p['id'] for p in r2.data['results']}
+		self.assertFalse(ids1 & ids2)
+
+	def test_stale_claims_are_released(self):
+		from datetime import timedelta
+
+		from django.utils import timezone
+
+		from .moderation import release_stale_claims
+
+		Post.objects.filter(id=self.posts[0].id).update(
+			moderation_claimed_by=self.mod1,
+			moderation_claimed_at=timezone.now() - timedelta(days=1),
+		)
+		self.assertEqual(release_stale_claims(), 1)
+		self.assertIsNone(Post.objects.get(id=self.posts[0].id).moderation_claimed_by_id)
+
+
+class BulkModerationTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		User = get_user_model()
+		self.author = User.objects.create_user(username='@author2', password='pw')
+		self.mod = User.objects.create_user(username='@scoped', password='pw', is_staff=True, staff_board_scoped=True)
+		self.b1 = Board.objects.create(slug='bulk-b1', title='b1', description='', sort_order=0, is_active=True)
+		self.b2 = Board.objects.create(slug='bulk-b2', title='b2', description='', sort_order=0, is_active=True)
+		from accounts.models import StaffBoardPermission
+
+		StaffBoardPermission.objects.create(user=self.mod, board=self.b1, can_moderate=True)
+		self.p1 = Post.objects.create(board=self.b1, author=self.author, title='a', body='x', status=Post.Status.PENDING)
+		self.p2 = Post.objects.create(board=self.b1, author=self.author, title='b', body='x', status=Post.Status.PENDING)
+		self.p3 = Post.objects.create(board=self.b2, author=self.author, title='c', body='x', status=Post.Status.PENDING)
+
+	def test_bulk_reject_respects_board_permissions(self):
+		from accounts.models import AuditLog
+		from notifications.models import Notification
+
+		self.client.force_authenticate(user=self.mod)
+		resp = self.client.post(
+			'/api/posts/moderation/bulk/',
+			{'ids': [self.p1.id, self.p2.id, self.p3.id], 'action': 'reject', 'reason': 'spam'},
+			format='json',
+		)
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual(sorted(resp.data['updated']), sorted([self.p1.id, self.p2.id]))
+		self.assertEqual(resp.data['skipped'], {str(self.p3.id): 'forbidden'})
+
+		self.assertEqual(Post.objects.filter(status=Post.Status.REJECTED, reject_reason='spam').count(), 2)
+		self.assertEqual(Post.objects.get(id=self.p3.id).status, Post.Status.PENDING)
+		self.assertEqual(AuditLog.objects.filter(action='post.reject').count(), 2)
+		self.assertEqual(Notification.objects.filter(recipient=self.author, type=Notification.Type.POST_REJECTED).count(), 2)
+
+	def test_bulk_moderation_skips_posts_that_are_not_pending(self):
+		from accounts.models import AuditLog
+
+		Post.objects.filter(id=self.p2.id).update(status=Post.Status.PUBLISHED)
+		self.client.force_authenticate(user=self.mod)
+		resp = self.client.post('/api/posts/moderation/bulk/', {'ids': [self.p1.id, self.p2.id], 'action': 'reject'}, format='json')
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual(resp.data['updated'], [self.p1.id])
+		self.assertEqual(resp.data['skipped'], {str(self.p2.id): 'not_pending'})
+		self.assertEqual(Post.objects.get(id=self.p2.id).status, Post.Status.PUBLISHED)
+		self.assertEqual(AuditLog.objects.filter(action='post.reject').count(), 1)
+
+
+class RevisionDeltaStorageTests(TestCase):
+	def setUp(self):
+		self.user = get_user_model().objects.create_user(username='@writer', password='pw')
+		self.board = Board.objects.create(slug='test-revs', title='revs', description='', sort_order=0, is_active=True)
+		self.post = Post.objects.create(board=self.board, author=self.user, title='t', body='line 0\n', status=Post.Status.PUBLISHED)
+
+	def _edit_many(self, n):
+		from .revisions import create_revision
+
+		expected = {}
+		for i in range(1, n + 1):
+			self.post.body = ''.join(f'line {j}\n' for j in range(i)) + ('tail' if i % 2 else '')
+			self.post.save(update_fields=['body'])
+			expected[create_revision(post=self.post, editor=self.user).sequence] = self.post.body
+		return expected
+
+	def test_bodies_round_trip_through_snapshots_and_deltas(self):
+		from .models import PostRevision
+		from .revisions import revision_bodies
+
+		expected = self._edit_many(23)
+		storages = dict(PostRevision.objects.filter(post=self.post).values_list('sequence', 'storage'))
+		self.assertEqual([s for s, k in storages.items() if k == PostRevision.Storage.FULL], [1, 11, 21])
+		self.assertEqual(revision_bodies(self.post.id, list(expected)), expected)
+
+	def test_compaction_rewrites_full_copies(self):
+		from .models import PostRevision
+		from .revisions import compact_post_revisions, revision_bodies
+
+		for i in range(1, 13):
+			PostRevision.objects.create(post=self.post, editor=self.user, sequence=i, title='t', body=f'v{i}\n' * i)
+		self.assertEqual(compact_post_revisions(self.post.id), 10)
+		self.assertEqual(compact_post_revisions(self.post.id), 0)
+		bodies = revision_bodies(self.post.id, list(range(1, 13)))
+		self.assertEqual(bodies, {i: f'v{i}\n' * i for i in range(1, 13)})
+
+	def test_stale_full_save_does_not_reuse_a_sequence(self):
+		from .models import PostRevision
+		from .revisions import create_revision
+
+		# Two writers load the post, then both record a revision.
+		other = Post.objects.get(id=self.post.id)
+		self.assertEqual(create_revision(post=self.post, editor=self.user).sequence, 1)
+		self.assertEqual(create_revision(post=other, editor=self.user).sequence, 2)
+
+		# A full save() writes every field back, including the stale counter.
+		stale = Post.objects.get(id=self.post.id)
+		create_revision(post=self.post, editor=self.user)
+		stale.title = 'renamed'
+		stale.save()
+		self.assertEqual(Post.objects.get(id=self.post.id).revision_seq, 2)
+
+		self.assertEqual(create_revision(post=stale, editor=self.user).sequence, 4)
+		seqs = list(PostRevision.objects.filter(post=self.post).values_list('sequence', flat=True))
+		self.assertEqual(seqs, [1, 2, 3, 4])
+
+	def test_unified_diff_uses_the_difflib_format(self):
+		import difflib
+
+		from .textdiff import unified_diff
+
+		a = ''.join(f'line {i}\n' for i in range(20))
+		b = a.replace('line 5\n', 'line five\n').replace('line 15\n', '') + 'tail\n'
+		expected = ''.join(difflib.unified_diff(a.splitlines(True), b.splitlines(True), fromfile='r1', tofile='r2', lineterm=''))
+		self.assertEqual(unified_diff(a, b, fromfile='r1', tofile='r2'), (expected, True))
+
+	def test_revision_diff_endpoint_line_and_word_modes(self):
+		from .models import PostRevision
+
+		self._edit_many(3)
+		staff = get_user_model().objects.create_superuser(username='@boss', password='pw')
+		client = APIClient()
+		client.force_authenticate(user=staff)
+
+		listing = client.get(f'/api/posts/{self.post.id}/revisions/?order=desc&limit=2')
+		self.assertEqual([r['sequence'] for r in listing.data], [3, 2])
+
+		rev = PostRevision.objects.get(post=self.post, sequence=3)
+		line = client.get(f'/api/posts/{self.post.id}/revisions/{rev.id}/diff/')
+		self.assertEqual(line.status_code, 200, line.content)
+		self.assertFalse(line.data['truncated'])
+		self.assertIn('+line 2\n', line.data['body_diff'])
+
+		word = client.get(f'/api/posts/{self.post.id}/revisions/{rev.id}/diff/?mode=word')
+		self.assertEqual(word.data['mode'], 'word')
+		self.assertIn('{+', word.data['body_diff'])
+
+		# Same pair of revisions, but ?from= labels the old side by its number.
+		prev = PostRevision.objects.get(post=self.post, sequence=2)
+		explicit = client.get(f'/api/posts/{self.post.id}/revisions/{rev.id}/diff/?from={prev.id}')
+		self.assertTrue(line.data['body_diff'].startswith('--- body(prev)+++ body(rev 3)'))
+		self.assertTrue(explicit.data['body_diff'].startswith('--- body(rev 2)+++ body(rev 3)'))
+
+
+class SearchOutboxTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		User = get_user_model()
+		self.author = User.objects.create_user(username='@outbox', password='pw')
+		self.board = Board.objects.create(slug='outbox-b', title='b', description='', sort_order=0, is_active=True)
+
+	def test_writes_enqueue_and_drain_coalesces_per_post(self):
+		from unittest import mock
+
+		from .models import SearchOutbox
+		from .search_outbox import drain_search_outbox
+
+		index = mock.Mock()
+		with mock.patch('forum.search_outbox.meili_enabled', return_value=True), mock.patch('forum.search_outbox.get_posts_index', return_value=index):
+			self.client.force_authenticate(user=self.author)
+			resp = self.client.post('/api/posts/', {'board': self.board.id, 'title': 't', 'body': 'one'}, format='json')
+			self.assertEqual(resp.status_code, 201, resp.content)
+			post_id = resp.data['id']
+			self.client.patch(f'/api/posts/{post_id}/', {'body': 'two'}, format='json')
+			other = Post.objects.create(board=self.board, author=self.author, title='o', body='x')
+			self.client.delete(f'/api/posts/{other.id}/')
+
+			self.assertEqual(SearchOutbox.objects.filter(object_id=post_id).count(), 2)
+			result = drain_search_outbox()
+
+		self.assertEqual(result, {'rows': 3, 'upserted': 1, 'deleted': 1})
+		docs = index.add_documents.call_args[0][0]
+		self.assertEqual([d['body'] for d in docs], ['two'])
+		index.delete_documents.assert_called_once_with([str(other.id)])
+		self.assertFalse(SearchOutbox.objects.exists())
+
+	def test_comments_return_when_an_edited_post_is_approved(self):
+		from unittest import mock
+
+		from .models import Comment
+		from .search_outbox import drain_search_outbox
+
+		post = Post.objects.create(board=self.board, author=self.author, title='t', body='x', status=Post.Status.PUBLISHED)
+		comment = Comment.objects.create(post=post, author=self.author, body='reply')
+		mod = get_user_model().objects.create_superuser(username='@outbox-mod', password='pw')
+		posts_index, comments_index = mock.Mock(), mock.Mock()
+
+		def drain():
+			while drain_search_outbox()['rows']:
+				pass
+
+		with mock.patch('forum.search_outbox.meili_enabled', return_value=True), \
+			mock.patch('forum.search_outbox.get_posts_index', return_value=posts_index), \
+			mock.patch('forum.search_outbox.get_index', return_value=comments_index):
+			self.client.force_authenticate(user=self.author)
+			resp = self.client.patch(f'/api/posts/{post.id}/', {'body': 'edited'}, format='json')
+			self.assertEqual(resp.status_code, 200, resp.content)
+			self.assertEqual(Post.objects.get(id=post.id).status, Post.Status.PENDING)
+			drain()
+			comments_index.delete_documents.assert_called_once_with([str(comment.id)])
+
+			self.client.force_authenticate(user=mod)
+			self.assertEqual(self.client.post(f'/api/posts/{post.id}/approve/').status_code, 200)
+			drain()
+		docs = comments_index.add_documents.call_args[0][0]
+		self.assertEqual([d['id'] for d in docs], [comment.id])
+
+	def test_drain_claims_rows_and_releases_them_on_failure(self):
+		from unittest import mock
+
+		from .models import SearchOutbox
+		from .search_outbox import drain_search_outbox
+
+		post = Post.objects.create(board=self.board, author=self.author, title='t', body='x', status=Post.Status.PUBLISHED)
+		SearchOutbox.objects.create(object_id=post.id)
+		claimed = []
+		index = mock.Mock()
+
+		with mock.patch('forum.search_outbox.get_posts_index', return_value=index):
+			index.add_documents.side_effect = RuntimeError('meili down')
+			with self.assertRaises(RuntimeError):
+				drain_search_outbox()
+			self.assertEqual(list(SearchOutbox.objects.values_list('object_id', 'claimed_at')), [(post.id, None)])
+
+			index.add_documents.side_effect = lambda *a, **k: claimed.append(SearchOutbox.objects.filter(claimed_at__isnull=False).count())
+			self.assertEqual(drain_search_outbox()['upserted'], 1)
+		# The HTTP call ran against claimed rows; the delete came after it.
+		self.assertEqual(claimed, [1])
+		self.assertFalse(SearchOutbox.objects.exists())
+
+
+	def test_reindex_posts_resumes_after_the_last_checkpoint(self):
+		import json
+		import os
+		import shutil
+		import tempfile
+		from types import SimpleNamespace
+		from unittest import mock
+
+		from django.core.management import CommandError, call_command
+
+		ids = [Post.objects.create(board=self.board, author=self.author, title=f'r{i}', body='x').id for i in range(5)]
+		folder = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, folder, True)
+		checkpoint = os.path.join(folder, 'reindex.json')
+		sent = []
+
+		def add_documents(docs, primary_key):
+			if len(sent) == 2 and fail:
+				raise RuntimeError('meili down')
+			sent.append([d['id'] for d in docs])
+			return SimpleNamespace(task_uid=len(sent))
+
+		index = mock.Mock()
+		index.add_documents.side_effect = add_documents
+		client = mock.Mock()
+		client.wait_for_task.return_value = SimpleNamespace(uid=1, status='succeeded', error=None)
+		module = 'forum.management.commands.reindex_posts'
+		args = ['reindex_posts', '--chunk-size', '2', '--workers', '1', '--checkpoint', checkpoint]
+		with mock.patch(f'{module}.meili_enabled', return_value=True), mock.patch(f'{module}.get_client', return_value=client), mock.patch(
+			f'{module}.get_posts_index', return_value=index
+		), mock.patch(f'{module}.ensure_posts_index_settings'):
+			fail = True
+			with self.assertRaises(CommandError):
+				call_command(*args, stdout=StringIO())
+			with open(checkpoint, encoding='utf-8') as f:
+				self.assertEqual(json.load(f)['last_id'], ids[3])
+
+			fail = False
+			call_command(*args, '--resume', stdout=StringIO())
+
+		self.assertEqual(sent, [ids[0:2], ids[2:4], ids[4:]])
+		self.assertFalse(os.path.exists(checkpoint))
+
+
+class LocalSearchTests(TestCase):
+	def setUp(self):
+		self.client = APIClient()
+		User = get_user_model()
+		self.author = User.objects.create_user(username='@searcher', password='pw')
+		cache.clear()
+		self.board = Board.objects.create(slug='tools', title='t', description='', sort_order=0, is_active=True)
+		other = Board.objects.create(slug='misc', title='m', description='', sort_order=0, is_active=True)
+		self.client.force_authenticate(user=self.author)
+		self.p1 = self._post(self.board, 'PLC 数据库 backup', 'how to back up the plc database')
+		self.p2 = self._post(other, 'Motor wiring', 'plc mentioned once')
+		self.p3 = self._post(self.board, 'Unrelated', 'nothing here')
+
+	def _post(self, board, title, body):
+		from .search_backends import get_database_backend
+
+		post = Post.objects.create(board=board, author=self.author, title=title, body=body, status=Post.Status.PUBLISHED)
+		get_database_backend().index_posts([post.id])
+		return post.id
+
+	def test_search_ranks_and_applies_qualifiers(self):
+		resp = self.client.get('/api/posts/search/', {'q': 'plc'})
+		self.assertEqual(resp.data['engine'], 'sqlite_fts')
+		self.assertEqual([h['id'] for h in resp.data['hits']], [self.p1, self.p2])
+		self.assertEqual(resp.data['hits'][0]['_matchesPosition']['title'], [{'start': 0, 'length': 3}])
+		self.assertNotIn('body', resp.data['hits'][0])
+		self.assertEqual(resp.data['hits'][1]['_formatted']['body_plain'], '<mark>plc</mark> mentioned once')
+		self.assertEqual(resp.data['facets']['board_slug'], {'tools': 1, 'misc': 1})
+
+		resp = self.client.get('/api/posts/search/', {'q': '数据库 board:tools'})
+		self.assertEqual([h['id'] for h in resp.data['hits']], [self.p1])
+
+	def test_total_and_facets_come_from_one_cached_grouped_query(self):
+		from .search_backends import get_database_backend
+
+		backend = get_database_backend()
+		# posts version, grouped total/facets, ranked page, hit rows
+		with self.assertNumQueries(4):
+			data = backend.search(user=self.author, raw_query='PLC')
+		self.assertEqual((data['total'], data['facets']['board_slug']), (2, {'tools': 1, 'misc': 1}))
+		with self.assertNumQueries(3):
+			again = backend.search(user=self.author, raw_query='plc  ')
+		self.assertEqual(again['facets'], data['facets'])
+
+	def test_facets_recompute_after_a_write_from_another_worker(self):
+		from .search_backends import get_database_backend
+		from .suggest_index import note_post_changes
+
+		backend = get_database_backend()
+		self.assertEqual(backend.search(user=self.author, raw_query='plc')['total'], 2)
+		# Another worker writes; its cache is not this one.
+		post_id = self._post(self.board, 'PLC timers', 'plc')
+		note_post_changes([post_id])
+		data = backend.search(user=self.author, raw_query='plc')
+		self.assertEqual((data['total'], data['facets']['board_slug']), (3, {'tools': 2, 'misc': 1}))
+
+	def test_inverted_index_backend_matches_fts_results(self):
+		from .search_backends import InvertedIndexBackend
+
+		backend = InvertedIndexBackend()
+		backend.rebuild()
+		data = backend.search(user=self.author, raw_query='数据库 board:tools')
+		self.assertEqual([h['id'] for h in data['hits']], [self.p1])
+		self.assertEqual([h['id'] for h in backend.suggest(user=self.author, raw_query='mot')['hits']], [self.p2])
+
+	def test_multi_term_queries_require_every_term_on_both_engines(self):
+		from .search_backends import InvertedIndexBackend, get_database_backend
+
+		InvertedIndexBackend().rebuild()
+		for backend in (get_database_backend(), InvertedIndexBackend()):
+			data = backend.search(user=self.author, raw_query='plc database')
+			self.assertEqual(([h['id'] for h in data['hits']], data['total']), ([self.p1], 1), backend.name)
+			self.assertEqual(data['facets']['board_slug'], {'tools': 1}, backend.name)
+
+	def test_index_follows_edits_and_deletes(self):
+		# The index is written after the post's transaction commits.
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.patch(f'/api/posts/{self.p3}/', {'body': 'now about plc'}, format='json')
+		ids = [p['id'] for p in self.client.get('/api/posts/', {'q': 'plc'}).data['results']]
+		self.assertIn(self.p3, ids)
+
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.delete(f'/api/posts/{self.p1}/')
+		resp = self.client.get('/api/posts/search/', {'q': 'plc'})
+		self.assertNotIn(self.p1, [h['id'] for h in resp.data['hits']])
+
+
+class MeiliCircuitBreakerTests(TestCase):
+	"""Against a local stub server speaking just enough of the Meilisearch API."""
+
+	def setUp(self):
+		import json
+		import threading
+		from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+		from .search_backends import get_database_backend
+		from .search_meili import meili_breaker
+
+		stub = self
+		self.fail_with = None
+		self.requests = []
+		self.ports = set()
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1'
+
+			def do_POST(self):
+				self.rfile.read(int(self.headers.get('Content-Length') or 0))
+				stub.requests.append(self.path)
+				stub.ports.add(self.client_address[1])
+				code = stub.fail_with or 200
+				body = json.dumps({'hits': [], 'estimatedTotalHits': 0, 'limit': 20, 'offset': 0, 'facetDistribution': {}}).encode()
+				if code != 200:
+					body = json.dumps({'message': 'down', 'code': 'internal', 'type': 'internal', 'link': ''}).encode()
+				self.send_response(code)
+				self.send_header('Content-Type', 'application/json')
+				self.send_header('Content-Length', str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+
+			def log_message(self, *args):
+				pass
+
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		self.addCleanup(self.server.server_close)
+		self.addCleanup(self.server.shutdown)
+		meili_breaker.reset()
+		self.addCleanup(meili_breaker.reset)
+
+		User = get_user_model()
+		self.user = User.objects.create_user(username='@breaker', password='pw')
+		board = Board.objects.create(slug='breaker', title='b', description='', sort_order=0, is_active=True)
+		post = Post.objects.create(board=board, author=self.user, title='pump failover', body='x', status=Post.Status.PUBLISHED)
+		get_database_backend().index_posts([post.id])
+
+	def test_pooled_client_fails_over_and_recovers(self):
+		from django.test import override_settings
+
+		from .search_backends import get_search_backend
+		from .search_meili import meili_breaker
+
+		url = f'http://127.0.0.1:{self.server.server_address[1]}'
+		with override_settings(MEILI_URL=url, MEILI_BREAKER_FAILURES=2, MEILI_BREAKER_COOLDOWN_SECONDS=60):
+			backend = get_search_backend()
+			for _ in range(3):
+				self.assertEqual(backend.search(user=self.user, raw_query='pump')['engine'], 'meili')
+			self.assertEqual(len(self.ports), 1)  # one keep-alive connection
+
+			self.fail_with = 503
+			with self.assertLogs('forum.search_meili', 'WARNING'):
+				for _ in range(2):
+					self.assertEqual(backend.search(user=self.user, raw_query='pump')['engine'], 'sqlite_fts')
+			sent = len(self.requests)
+			data = backend.search(user=self.user, raw_query='pump')
+			self.assertEqual(len(self.requests), sent)  # open: Meilisearch is not called
+			self.assertEqual([h['title'] for h in data['hits']], ['pump failover'])
+			stats = meili_breaker.stats()
+			self.assertEqual((stats['state'], stats['failovers']), ('open', 3))
+
+		self.fail_with = None
+		with override_settings(MEILI_URL=url, MEILI_BREAKER_COOLDOWN_SECONDS=0):
+			self.assertEqual(backend.search(user=self.user, raw_query='pump')['engine'], 'meili')
+			self.assertEqual(meili_breaker.stats()['state'], 'closed')
+
+	def test_other_exceptions_count_and_release_the_probe(self):
+		from django.test import override_settings
+
+		from .search_meili import CircuitBreaker
+
+		def broken():
+			raise ValueError('not json')
+
+		breaker = CircuitBreaker('test')
+		with override_settings(MEILI_BREAKER_FAILURES=1, MEILI_BREAKER_COOLDOWN_SECONDS=0), self.assertLogs('forum.search_meili', 'WARNING'):
+			with self.assertRaises(ValueError):
+				breaker.call(broken)
+			self.assertEqual(breaker.stats()['consecutive_failures'], 1)
+
+			self.assertEqual(breaker.state, 'half_open')
+			with self.assertRaises(ValueError):
+				breaker.call(broken)  # the probe fails the same way
+			self.assertEqual(breaker.call(lambda: 'ok'), 'ok')  # a new probe is let through
+		self.assertEqual(breaker.state, 'closed')
+
+
+class FederatedSearchTests(TestCase):
+	def setUp(self):
+		from resources.models import ResourceEntry
+
+		from .models import Comment, Tag
+		from .search_backends import get_database_backend
+
+		User = get_user_model()
+		self.author = User.objects.create_user(username='@valveguy', password='pw', nickname='Valve Fan')
+		other = User.objects.create_user(username='@other', password='pw')
+		board = Board.objects.create(slug='fed', title='f', description='', sort_order=0, is_active=True)
+		self.post = Post.objects.create(board=board, author=self.author, title='Valve timing', body='x', status=Post.Status.PUBLISHED)
+		hidden = Post.objects.create(board=board, author=other, title='Valve draft', body='x', status=Post.Status.PENDING)
+		get_database_backend().index_posts([self.post.id, hidden.id])
+		self.comment = Comment.objects.create(post=self.post, author=other, body='check the **valve** <b>first</b>')
+		Comment.objects.create(post=hidden, author=other, body='valve on a hidden post')
+		Tag.objects.create(name='valves')
+		ResourceEntry.objects.create(created_by=other, title='Valve manual', status=ResourceEntry.Status.PUBLISHED)
+		ResourceEntry.objects.create(created_by=other, title='Valve notes', status=ResourceEntry.Status.PENDING)
+
+	def test_local_path_groups_visible_hits(self):
+		resp = APIClient().get('/api/search/all/', {'q': 'valve'})
+		self.assertEqual(resp.status_code, 200)
+		results = resp.data['results']
+		self.assertEqual([h['id'] for h in results['posts']['hits']], [self.post.id])
+		self.assertEqual([h['id'] for h in results['comments']['hits']], [self.comment.id])
+		self.assertEqual(results['comments']['hits'][0]['_formatted']['body_plain'], 'check the <mark>valve</mark> first')
+		self.assertEqual([h['username'] for h in results['users']['hits']], ['@valveguy'])
+		self.assertEqual([h['name'] for h in results['tags']['hits']], ['valves'])
+		self.assertEqual([h['title'] for h in results['resources']['hits']], ['Valve manual'])
+
+		resp = APIClient().get('/api/search/all/', {'q': 'valve', 'types': 'tags,users', 'limit': 1})
+		self.assertEqual(sorted(resp.data['results']), ['tags', 'users'])
+
+	def test_meili_path_sends_one_multi_search(self):
+		from unittest import mock
+
+		from django.test import override_settings
+
+		from .search_meili import meili_breaker
+
+		client = mock.Mock()
+		client.multi_search.return_value = {
+			'results': [
+				{'hits': [{'id': 7, 'name': 'valves', 'usage_count': 3, '_formatted': {'name': '<mark>valve</mark>s<script>'}}], 'estimatedTotalHits': 1},
+				{'hits': [], 'estimatedTotalHits': 0},
+			]
+		}
+		self.addCleanup(meili_breaker.reset)
+		with override_settings(MEILI_URL='http://meili.invalid'), mock.patch('forum.search_federated.get_client', return_value=client):
+			resp = APIClient().get('/api/search/all/', {'q': 'valve', 'types': 'tags,resources'})
+
+		queries = client.multi_search.call_args[0][0]
+		self.assertEqual([q['indexUid'] for q in queries], ['tags', 'resources'])
+		self.assertEqual(queries[1]['filter'], "status = 'published'")
+		self.assertEqual(resp.data['engine'], 'meili')
+		self.assertEqual(resp.data['results']['tags']['hits'][0]['_formatted']['name'], '<mark>valve</mark>s&lt;script&gt;')
+
+
+class SavedSearchTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.watcher = User.objects.create_user(username='@watcher', password='pw')
+		self.other = User.objects.create_user(username='@other', password='pw')
+		self.author = User.objects.create_user(username='@poster', password='pw')
+		self.staff = User.objects.create_user(username='@mod', password='pw', is_staff=True, is_superuser=True)
+		self.tools = Board.objects.create(slug='tools', title='t', description='', sort_order=0, is_active=True)
+		self.misc = Board.objects.create(slug='misc', title='m', description='', sort_order=0, is_active=True)
+
+	def test_published_posts_notify_matching_saved_searches_once(self):
+		from notifications.models import Notification
+
+		from .saved_searches import create_saved_search, percolate_posts
+
+		client = APIClient()
+		client.force_authenticate(user=self.watcher)
+		resp = client.post('/api/saved-searches/', {'query': 'PLC board:tools'}, format='json')
+		self.assertEqual(resp.status_code, 201, resp.content)
+		self.assertEqual(resp.data['qualifiers'], [['board', 'tools']])
+		self.assertEqual(client.post('/api/saved-searches/', {'query': 'board:tools  PLC'}, format='json').status_code, 201)
+		self.assertEqual(client.post('/api/saved-searches/', {'query': 'PLC board:tools'}, format='json').status_code, 400)
+		create_saved_search(user=self.other, raw_query='servo')
+
+		hit = Post.objects.create(board=self.tools, author=self.author, title='Siemens PLC tips', body='x', status=Post.Status.PUBLISHED)
+		wrong_board = Post.objects.create(board=self.misc, author=self.author, title='PLC', body='x', status=Post.Status.PUBLISHED)
+		pending = Post.objects.create(board=self.tools, author=self.author, title='PLC', body='x', status=Post.Status.PENDING)
+
+		with self.assertNumQueries(4):  # posts, candidate keys, existing notifications, insert
+			self.assertEqual(percolate_posts([hit.id, wrong_board.id, pending.id]), 1)
+		self.assertEqual(percolate_posts([hit.id]), 0)
+		n = Notification.objects.get(type=Notification.Type.SAVED_SEARCH_MATCH)
+		self.assertEqual((n.recipient_id, n.post_id), (self.watcher.id, hit.id))
+
+		staff_client = APIClient()
+		staff_client.force_authenticate(user=self.staff)
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = staff_client.post(f'/api/posts/{pending.id}/approve/', format='json')
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertTrue(Notification.objects.filter(type=Notification.Type.SAVED_SEARCH_MATCH, post=pending).exists())
+
+
+class SuggestIndexTests(TestCase):
+	def setUp(self):
+		from .suggest_index import _index
+
+		self.client = APIClient()
+		User = get_user_model()
+		self.author = User.objects.create_user(username='@suggest', password='pw')
+		board = Board.objects.create(slug='sg', title='s', description='', sort_order=0, is_active=True)
+		self.popular = Post.objects.create(board=board, author=self.author, title='Motor wiring', body='', status=Post.Status.PUBLISHED, views_count=50)
+		self.quiet = Post.objects.create(board=board, author=self.author, title='Motors 数据库', body='', status=Post.Status.PUBLISHED)
+		self.pending = Post.objects.create(board=board, author=self.author, title='Motor draft', body='', status=Post.Status.PENDING)
+		_index.rebuild()
+
+	def test_database_answers_until_the_first_build_finishes(self):
+		from unittest import mock
+
+		from .search_backends import get_database_backend
+		from .suggest_index import _index, invalidate_suggest_index
+
+		get_database_backend().index_posts([self.popular.id, self.quiet.id, self.pending.id])
+		invalidate_suggest_index()
+		with mock.patch.object(_index, 'start_rebuild') as start_rebuild:
+			resp = self.client.get('/api/posts/suggest/', {'q': 'mot'})
+		start_rebuild.assert_called_once_with()
+		self.assertNotEqual(resp.data['engine'], 'memory')
+		self.assertEqual({h['id'] for h in resp.data['hits']}, {self.popular.id, self.quiet.id})
+
+		_index.rebuild()  # what the background thread does
+		self.assertEqual(self.client.get('/api/posts/suggest/', {'q': 'mot'}).data['engine'], 'memory')
+
+	def test_prefix_popularity_and_visibility(self):
+		resp = self.client.get('/api/posts/suggest/', {'q': 'mot'})
+		self.assertEqual(resp.data['engine'], 'memory')
+		self.assertEqual([h['id'] for h in resp.data['hits']], [self.popular.id, self.quiet.id])
+		self.assertEqual(resp.data['hits'][0]['_matchesPosition'], {'title': [{'start': 0, 'length': 3}]})
+
+		self.client.force_authenticate(user=self.author)
+		resp = self.client.get('/api/posts/suggest/', {'q': 'motors 数'})
+		self.assertEqual([h['id'] for h in resp.data['hits']], [self.quiet.id])
+		resp = self.client.get('/api/posts/suggest/', {'q': 'draft'})
+		self.assertEqual([h['id'] for h in resp.data['hits']], [self.pending.id])
+
+	def test_changes_are_applied_incrementally(self):
+		from .suggest_index import _index, note_post_changes
+
+		self.client.get('/api/posts/suggest/', {'q': 'mot'})
+		Post.objects.filter(id=self.quiet.id).update(title='Pump curves')
+		note_post_changes([self.quiet.id])
+		_index.checked_at = 0.0
+		resp = self.client.get('/api/posts/suggest/', {'q': 'pum'})
+		self.assertEqual([h['id'] for h in resp.data['hits']], [self.quiet.id])
+		self.assertEqual(_index.stats()['posts'], 3)
+
+	def test_writes_from_another_worker_are_picked_up(self):
+		from .suggest_index import _SuggestIndex, note_post_changes
+
+		other = _SuggestIndex()  # a second gunicorn worker
+		other.rebuild()
+		self.assertEqual({h['id'] for h in other.suggest(user=None, terms=['mot'], limit=10)}, {self.popular.id, self.quiet.id})
+
+		# This worker writes; the other one's cache never sees it.
+		Post.objects.filter(id=self.popular.id).update(is_deleted=True)
+		Post.objects.filter(id=self.quiet.id).update(status=Post.Status.REJECTED)
+		Post.objects.filter(id=self.pending.id).update(title='Valve sizing', status=Post.Status.PUBLISHED)
+		note_post_changes([self.popular.id, self.quiet.id, self.pending.id])
+		cache.clear()
+
+		other.checked_at = 0.0
+		self.assertTrue(other.ensure_fresh())
+		self.assertEqual(other.suggest(user=None, terms=['mot'], limit=10), [])
+		self.assertEqual([h['id'] for h in other.suggest(user=None, terms=['val'], limit=10)], [self.pending.id])
+
+
+class SnippetTests(TestCase):
+	def test_markdown_to_plain_and_bounded_crop(self):
+		from .snippets import MAX_SNIPPET_CHARS, format_snippet, markdown_to_plain
+
+		plain = markdown_to_plain('## Setup\n\nSee [the docs](http://x.io/a) and **<script>x</script>** `code`')
+		self.assertEqual(plain, 'Setup See the docs and x code')
+
+		body = ' '.join(f'w{i}' for i in range(500)) + ' needle <b> ' + 'y' * 10000
+		snippet = format_snippet(body, ['needle'])
+		self.assertIn('<mark>needle</mark> &lt;b&gt;', snippet)
+		self.assertTrue(snippet.startswith('…') and snippet.endswith('…'))
+		self.assertLess(len(snippet), MAX_SNIPPET_CHARS + 50)
+
+
+class ImageJobTests(TestCase):
+	def setUp(self):
+		import shutil
+		import tempfile
+
+		from django.test import override_settings
+
+		media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, media_root, True)
+		settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_PROCESS_WORKERS=0)
+		settings_override.enable()
+		self.addCleanup(settings_override.disable)
+
+		User = get_user_model()
+		self.user = User.objects.create_user(username='@painter', password='pw')
+		self.other = User.objects.create_user(username='@viewer', password='pw')
+		self.board = Board.objects.create(slug='art', title='a', description='', sort_order=0, is_active=True)
+		self.client = APIClient()
+		self.client.force_authenticate(user=self.user)
+
+	def _image(self, size, *, mode='RGB', fmt='PNG', content_type='image/png', name='a.png'):
+		from io import BytesIO
+
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		from PIL import Image
+
+		buf = BytesIO()
+		Image.new(mode, size, (10, 120, 200) if mode == 'RGB' else (10, 120, 200, 128)).save(buf, format=fmt)
+		return SimpleUploadedFile(name, buf.getvalue(), content_type=content_type)
+
+	def test_upload_returns_job_and_processes_after_commit(self):
+		from django.core.files.storage import default_storage
+
+		from .models import ImageJob
+
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post('/api/posts/images/upload/', {'image': self._image((4200, 20))}, format='multipart')
+		self.assertEqual(resp.status_code, 202, resp.content)
+		self.assertEqual((resp.data['status'], resp.data['url']), ('pending', ''))
+
+		job = ImageJob.objects.get(pk=resp.data['id'])
+		self.assertEqual(job.status, ImageJob.Status.READY)
+		self.assertFalse(default_storage.exists(job.source_name))
+		self.assertRegex(job.result_name, r'^images/[0-9a-f]{2}/[0-9a-f]{64}\.jpg$')
+
+		poll = self.client.get(f"/api/posts/images/{resp.data['id']}/")
+		self.assertEqual(poll.status_code, 200, poll.content)
+		self.assertEqual((poll.data['status'], poll.data['width'], poll.data['height']), ('ready', 4096, 19))
+		self.assertTrue(poll.data['url'].endswith(job.result_name))
+
+		other = APIClient()
+		other.force_authenticate(user=self.other)
+		self.assertEqual(other.get(f"/api/posts/images/{resp.data['id']}/").status_code, 404)
+
+		bad = self.client.post(
+			'/api/posts/images/upload/',
+			{'image': self._image((4, 4), fmt='GIF', content_type='image/png', name='a.gif')},
+			format='multipart',
+		)
+		self.assertEqual(bad.status_code, 400, bad.content)
+
+	def test_large_jpeg_is_decoded_scaled_and_rotated(self):
+		from io import BytesIO
+
+		from PIL import Image
+
+		from .image_utils import decoded_size, peak_memory_bound, process_image_bytes
+
+		exif = Image.Exif()
+		exif[0x0112] = 6  # rotate 90 degrees clockwise on display
+		buf = BytesIO()
+		Image.new('RGB', (9000, 3000), (200, 30, 30)).save(buf, format='JPEG', exif=exif)
+
+		data, ext, width, height = process_image_bytes(buf.getvalue(), 'image/jpeg')
+		self.assertEqual((ext, width, height), ('jpg', 1365, 4096))
+		self.assertEqual(Image.open(BytesIO(data)).size, (1365, 4096))
+		self.assertEqual(decoded_size(9000, 3000, 'JPEG'), (4500, 1500))
+		self.assertLess(peak_memory_bound(9000, 3000, 'JPEG'), peak_memory_bound(9000, 3000, 'PNG'))
+
+	def test_process_image_source_reports_stages_and_takes_encoder_overrides(self):
+		from io import BytesIO
+
+		from .image_utils import process_image_source
+
+		stages = {}
+		source = BytesIO(self._image((64, 48), fmt='PNG').read())
+		data, ext, width, height = process_image_source(source, 'image/png', encoders={'jpg': {'quality': 40}}, stages=stages)
+		self.assertEqual((ext, width, height), ('jpg', 64, 48))
+		self.assertTrue({'verify', 'decode', 'encode'} <= set(stages))
+
+	def test_duplicate_upload_reuses_stored_blob(self):
+		import os
+
+		from django.conf import settings
+
+		from .models import ImageBlob, ImageJob
+
+		upload = self._image((30, 30))
+		with self.captureOnCommitCallbacks(execute=True):
+			first = self.client.post('/api/posts/images/upload/', {'image': upload}, format='multipart')
+		self.assertEqual(first.status_code, 202, first.content)
+		upload.seek(0)
+		with self.captureOnCommitCallbacks(execute=True) as callbacks:
+			second = self.client.post('/api/posts/images/upload/', {'image': upload}, format='multipart')
+		self.assertEqual(second.status_code, 201, second.content)
+		self.assertEqual(callbacks, [])  # nothing dispatched
+
+		first_job = ImageJob.objects.get(pk=first.data['id'])
+		self.assertEqual(second.data['url'], self.client.get(f"/api/posts/images/{first.data['id']}/").data['url'])
+		blob = ImageBlob.objects.get()
+		# Counted once a post links it, not per upload.
+		self.assertEqual((blob.name, blob.ref_count), (first_job.result_name, 0))
+		originals = os.path.join(settings.MEDIA_ROOT, 'image_originals')
+		self.assertEqual(os.listdir(originals) if os.path.isdir(originals) else [], [])
+
+	def test_duplicate_used_as_cover_still_gets_variants(self):
+		from .models import ImageAsset, ImageBlob
+
+		upload = self._image((40, 30))
+		with self.captureOnCommitCallbacks(execute=True):
+			self.client.post('/api/posts/images/upload/', {'image': upload}, format='multipart')
+		name = ImageBlob.objects.get().name
+		self.assertFalse(ImageAsset.objects.filter(name=name).exists())
+
+		upload.seek(0)
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post('/api/posts/', {'board': self.board.id, 'title': 't', 'body': 'x', 'cover_image': upload}, format='multipart')
+		self.assertEqual(resp.status_code, 201, resp.content)
+		self.assertEqual(Post.objects.get(pk=resp.data['id']).cover_image.name, name)
+		self.assertTrue(ImageAsset.objects.get(name=name).variants['webp'])
+		self.assertEqual(ImageBlob.objects.get().ref_count, 1)
+
+	def test_cover_is_assigned_when_its_job_finishes(self):
+		from .models import ImageJob
+
+		payload = {'board': self.board.id, 'title': 'cover', 'body': 'x', 'cover_image': self._image((40, 30), mode='RGBA')}
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post('/api/posts/', payload, format='multipart')
+		self.assertEqual(resp.status_code, 201, resp.content)
+		self.assertEqual(resp.data['cover_image_url'], '')
+		self.assertEqual(resp.data['cover_image_job']['status'], 'pending')
+
+		post = Post.objects.get(pk=resp.data['id'])
+		job = ImageJob.objects.get(pk=resp.data['cover_image_job']['id'])
+		self.assertEqual((job.kind, job.target_id, job.status), (ImageJob.Kind.COVER, post.id, ImageJob.Status.READY))
+		self.assertEqual(post.cover_image.name, job.result_name)
+		self.assertTrue(post.cover_image.name.endswith('.png'))
+
+		# Narrower than every cover width: one variant at the source width.
+		detail = self.client.get(f'/api/posts/{post.id}/')
+		self.assertEqual(detail.status_code, 200, detail.content)
+		self.assertRegex(detail.data['cover_image_srcset']['webp'], r'^/media/images/\w\w/variants/\w+-40\.webp 40w$')
+		meta = detail.data['cover_image_meta']
+		self.assertEqual((meta['width'], meta['height'], meta['format']), (40, 30, 'png'))
+		self.assertEqual(meta['bytes'], post.cover_image.size)
+		self.assertEqual(meta['dominant_color'], '#0a78c8')
+		self.assertTrue(meta['placeholder'].startswith('data:image/webp;base64,'))
+
+	def test_avatar_change_is_charged_when_the_job_assigns_it(self):
+		from django.test import override_settings
+
+		get_user_model().objects.filter(pk=self.user.pk).update(avatar='avatars/old.png', activity_score=15)
+		self.client.force_authenticate(user=get_user_model().objects.get(pk=self.user.pk))
+		with override_settings(AVATAR_CHANGE_COST=10), self.captureOnCommitCallbacks() as callbacks:
+			resp = self.client.post('/api/me/avatar/', {'avatar': self._image((32, 32))}, format='multipart')
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual(resp.data['image_job']['status'], 'pending')
+		self.assertEqual(get_user_model().objects.get(pk=self.user.pk).activity_score, 15)
+
+		for callback in callbacks:
+			callback()
+		user = get_user_model().objects.get(pk=self.user.pk)
+		self.assertEqual(user.activity_score, 5)
+		self.assertNotEqual(user.avatar.name, 'avatars/old.png')
+
+	def test_build_image_variants_backfills_hero_slides(self):
+		from django.core.files.storage import default_storage
+		from django.core.management import call_command
+
+		from .models import HomeHeroSlide, ImageAsset
+
+		slide = HomeHeroSlide.objects.create(title='h', image=self._image((1100, 300), fmt='JPEG', name='hero.jpg'))
+		call_command('build_image_variants', '--only', 'hero', '--workers', '1', stdout=StringIO())
+
+		asset = ImageAsset.objects.get(name=slide.image.name)
+		self.assertEqual(sorted(asset.variants['webp'], key=int), ['640', '1024'])
+		self.assertTrue(all(default_storage.exists(n) for n in asset.variants['webp'].values()))
+
+		resp = self.client.get('/api/home/hero/')
+		self.assertEqual(resp.status_code, 200, resp.content)
+		rows = resp.data['results'] if isinstance(resp.data, dict) else resp.data
+		self.assertIn(' 640w, ', rows[0]['image_srcset']['webp'])
+		self.assertEqual(rows[0]['image_meta']['width'], 1100)
+
+		# Assets rendered before metadata existed only get the metadata.
+		variants = asset.variants
+		ImageAsset.objects.filter(pk=asset.pk).update(width=0, placeholder='')
+		call_command('build_image_variants', '--only', 'hero', '--workers', '1', stdout=StringIO())
+		asset.refresh_from_db()
+		self.assertEqual((asset.variants, asset.width, asset.height, asset.format), (variants, 1100, 300, 'jpg'))
+		self.assertTrue(asset.placeholder)
+
+	def test_gc_media_deletes_only_unreferenced_images(self):
+		from django.core.files.base import ContentFile
+		from django.core.files.storage import default_storage
+		from django.core.management import call_command
+
+		from .models import ImageAsset, ImageBlob, ImageJob, PostImage
+
+		def upload(size):
+			with self.captureOnCommitCallbacks(execute=True):
+				resp = self.client.post('/api/posts/images/upload/', {'image': self._image(size)}, format='multipart')
+			return ImageJob.objects.get(pk=resp.data['id']).result_name
+
+		used, unused = upload((20, 20)), upload((21, 21))
+		stray = default_storage.save('uploads/legacy.jpg', ContentFile(b'x'))
+		body = f'![a](http://testserver/media/{used}) and <img src="/media/{used}?v=1">'
+		with self.captureOnCommitCallbacks(execute=True):
+			resp = self.client.post(
+				'/api/posts/',
+				{'board': self.board.id, 'title': 't', 'body': body, 'cover_image': self._image((40, 30), mode='RGBA')},
+				format='multipart',
+			)
+		post_id = resp.data['id']
+		cover = ImageAsset.objects.get()
+		self.assertEqual(
+			set(PostImage.objects.filter(post_id=post_id).values_list('name', 'source')),
+			{(used, 'body'), (cover.name, 'cover')},
+		)
+
+		out = StringIO()
+		call_command('gc_media', '--dry-run', '--grace-hours', '0', stdout=out)
+		self.assertIn('orphaned=2 ', out.getvalue())
+		self.assertTrue(default_storage.exists(unused))
+
+		call_command('gc_media', '--grace-hours', '0', stdout=StringIO())
+		self.assertFalse(default_storage.exists(unused) or default_storage.exists(stray))
+		kept = [used, cover.name] + [n for widths in cover.variants.values() for n in widths.values()]
+		self.assertTrue(all(default_storage.exists(n) for n in kept))
+		self.assertFalse(ImageBlob.objects.filter(name=unused).exists())
+
+		self.assertEqual(ImageBlob.objects.get(name=used).ref_count, 1)
+
+		# Editing the link out of the body releases the image.
+		resp = self.client.patch(f'/api/posts/{post_id}/', {'body': 'no images'}, format='json')
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual(ImageBlob.objects.get(name=used).ref_count, 0)
+		call_command('gc_media', '--grace-hours', '0', '--recount', stdout=StringIO())
+		self.assertFalse(default_storage.exists(used))
+		self.assertEqual(ImageBlob.objects.get(name=cover.name).ref_count, 1)
+
+
+class ImagePoolTests(TransactionTestCase):
+	"""The process pool path (IMAGE_PROCESS_WORKERS > 0)."""
+
+	def setUp(self):
+		import shutil
+		import tempfile
+
+		from django.test import override_settings
+
+		from .image_jobs import shutdown_executor
+
+		media_root = tempfile.mkdtemp()
+		self.addCleanup(shutil.rmtree, media_root, True)
+		settings_override = override_settings(MEDIA_ROOT=media_root, IMAGE_PROCESS_WORKERS=1, IMAGE_PROCESS_MAX_QUEUED=1)
+		settings_override.enable()
+		self.addCleanup(settings_override.disable)
+		self.addCleanup(shutdown_executor)
+		self.user = get_user_model().objects.create_user(username='@pool', password='pw')
+
+	def _upload(self, size):
+		from io import BytesIO
+
+		from django.core.files.uploadedfile import SimpleUploadedFile
+		from PIL import Image
+
+		buf = BytesIO()
+		Image.new('RGB', size, (200, 30, 30)).save(buf, format='PNG')
+		return SimpleUploadedFile('a.png', buf.getvalue(), content_type='image/png')
+
+	def test_jobs_run_in_the_pool_and_overflow_stays_pending(self):
+		from django.db import transaction
+
+		from .image_jobs import pending_job_ids, queue_image_job, run_image_job, shutdown_executor
+		from .models import ImageJob
+
+		with transaction.atomic():
+			first = queue_image_job(user=self.user, uploaded_file=self._upload((30, 20)), kind=ImageJob.Kind.UPLOAD)
+			second = queue_image_job(user=self.user, uploaded_file=self._upload((31, 20)), kind=ImageJob.Kind.UPLOAD)
+		shutdown_executor()  # waits for the pool and its callbacks
+
+		first.refresh_from_db()
+		self.assertEqual((first.status, first.width, first.height), (ImageJob.Status.READY, 30, 20))
+		# One slot: the second job waits for process_image_jobs.
+		self.assertEqual(list(pending_job_ids(10)), [second.pk])
+		self.assertEqual(run_image_job(second.pk), ImageJob.Status.READY)
+
+	def test_callback_on_the_dispatching_thread_keeps_its_connection(self):
+		import threading
+		from concurrent.futures import Future
+		from functools import partial
+
+		from unittest import mock
+
+		from django.core.files.storage import default_storage
+
+		from .image_jobs import _on_done, local_file
+		from .image_utils import process_image_file_with_variants
+		from .models import ImageJob
+
+		source = default_storage.save('image_originals/a.png', self._upload((24, 24)))
+		job = ImageJob.objects.create(user=self.user, source_name=source, content_type='image/png', status=ImageJob.Status.PROCESSING)
+		path, cleanup = local_file(source)
+		future = Future()
+		future.set_result(process_image_file_with_variants(path, 'image/png'))
+		slots = threading.BoundedSemaphore(1)
+		slots.acquire()
+
+		# Already done: add_done_callback runs _on_done right here, on the request's thread.
+		with mock.patch('forum.image_jobs.connection') as conn, mock.patch('forum.image_jobs.close_old_connections') as close_old:
+			future.add_done_callback(partial(_on_done, job, cleanup, slots, threading.get_ident()))
+		self.assertEqual((conn.close.call_count, close_old.call_count), (0, 0))
+		self.assertEqual(ImageJob.objects.get(pk=job.pk).status, ImageJob.Status.READY)
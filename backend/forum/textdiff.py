@@ -0,0 +1,239 @@
+"""Bounded text diffing for revision history.
+
+Why not difflib directly?
+- SequenceMatcher is super-linear on large inputs; one big post could pin a worker.
+- Here lines (or words) are hashed to ints, the common prefix/suffix is trimmed,
+  and the middle runs through Myers' O((N+M)D) algorithm with an edit-distance
+  and wall-clock budget. When the budget runs out we return None and callers
+  degrade to a summary instead of a full diff.
+
+Output uses the format of difflib.unified_diff(..., lineterm='') (headers,
+hunk ranges, context) so existing clients keep parsing it. It is identical
+whenever the edit is unambiguous; otherwise the hunks can differ, because
+Myers finds a shortest edit script and SequenceMatcher does not.
+"""
+
+from __future__ import annotations
+
+import difflib
+import re
+import time
+from collections import Counter
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+# Budgets (per diff call)
+MAX_DIFF_EDIT_DISTANCE = 2000
+MAX_DIFF_SECONDS = 0.25
+MAX_DIFF_TOKENS = 200_000
+
+Opcode = Tuple[str, int, int, int, int]
+
+# CJK characters are single tokens; everything else splits into words, whitespace and punctuation.
+_WORD_RE = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]|\w+|\s+|[^\w\s]', re.UNICODE)
+
+
+def _intern(a: Sequence[Hashable], b: Sequence[Hashable]) -> Tuple[List[int], List[int]]:
+    table: Dict[Hashable, int] = {}
+    ia = [table.setdefault(x, len(table)) for x in a]
+    ib = [table.setdefault(x, len(table)) for x in b]
+    return ia, ib
+
+
+def _myers_edits(a: List[int], b: List[int], *, max_d: int, deadline: Optional[float]) -> Optional[List[Tuple[str, int, int]]]:
+    """Return a forward edit script [('=', i, j) | ('-', i, j) | ('+', i, j)] or None if over budget."""
+
+    n, m = len(a), len(b)
+    if n == 0 and m == 0:
+        return []
+    v: Dict[int, int] = {1: 0}
+    trace: List[Dict[int, int]] = []
+    limit = min(n + m, max_d)
+    for d in range(limit + 1):
+        if deadline is not None and (d & 15) == 0 and time.monotonic() > deadline:
+            return None
+        trace.append(dict(v))
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                x = v[k + 1]
+            else:
+                x = v[k - 1] + 1
+            y = x - k
+            while x < n and y < m and a[x] == b[y]:
+                x += 1
+                y += 1
+            v[k] = x
+            if x >= n and y >= m:
+                return _backtrack(trace, n, m)
+    return None
+
+
+def _backtrack(trace: List[Dict[int, int]], n: int, m: int) -> List[Tuple[str, int, int]]:
+    edits: List[Tuple[str, int, int]] = []
+    x, y = n, m
+    for d in range(len(trace) - 1, -1, -1):
+        v = trace[d]
+        k = x - y
+        if d == 0:
+            prev_x, prev_y = 0, 0
+        else:
+            if k == -d or (k != d and v[k - 1] < v[k + 1]):
+                prev_k = k + 1
+            else:
+                prev_k = k - 1
+            prev_x = v[prev_k]
+            prev_y = prev_x - prev_k
+        while x > prev_x and y > prev_y:
+            x -= 1
+            y -= 1
+            edits.append(('=', x, y))
+        if d > 0:
+            if x == prev_x:
+                y -= 1
+                edits.append(('+', x, y))
+            else:
+                x -= 1
+                edits.append(('-', x, y))
+    edits.reverse()
+    return edits
+
+
+def _edits_to_opcodes(edits: List[Tuple[str, int, int]], offset: int) -> List[Opcode]:
+    ops: List[Opcode] = []
+    i = j = 0
+    idx = 0
+    while idx < len(edits):
+        kind = edits[idx][0]
+        if kind == '=':
+            start_i, start_j = i, j
+            while idx < len(edits) and edits[idx][0] == '=':
+                i += 1
+                j += 1
+                idx += 1
+            ops.append(('equal', start_i + offset, i + offset, start_j + offset, j + offset))
+            continue
+        start_i, start_j = i, j
+        while idx < len(edits) and edits[idx][0] != '=':
+            if edits[idx][0] == '-':
+                i += 1
+            else:
+                j += 1
+            idx += 1
+        if i > start_i and j > start_j:
+            tag = 'replace'
+        elif i > start_i:
+            tag = 'delete'
+        else:
+            tag = 'insert'
+        ops.append((tag, start_i + offset, i + offset, start_j + offset, j + offset))
+    return ops
+
+
+def opcodes(
+    a: Sequence[Hashable],
+    b: Sequence[Hashable],
+    *,
+    max_d: int = MAX_DIFF_EDIT_DISTANCE,
+    max_seconds: Optional[float] = MAX_DIFF_SECONDS,
+    max_tokens: int = MAX_DIFF_TOKENS,
+) -> Optional[List[Opcode]]:
+    """difflib-style opcodes for a -> b, or None when a budget is exceeded."""
+
+    if len(a) + len(b) > max_tokens:
+        return None
+    ia, ib = _intern(a, b)
+
+    prefix = 0
+    while prefix < len(ia) and prefix < len(ib) and ia[prefix] == ib[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < len(ia) - prefix and suffix < len(ib) - prefix and ia[-1 - suffix] == ib[-1 - suffix]:
+        suffix += 1
+
+    mid_a = ia[prefix : len(ia) - suffix]
+    mid_b = ib[prefix : len(ib) - suffix]
+    deadline = (time.monotonic() + max_seconds) if max_seconds else None
+    edits = _myers_edits(mid_a, mid_b, max_d=max_d, deadline=deadline)
+    if edits is None:
+        return None
+
+    ops: List[Opcode] = []
+    if prefix:
+        ops.append(('equal', 0, prefix, 0, prefix))
+    ops.extend(_edits_to_opcodes(edits, prefix))
+    if suffix:
+        ops.append(('equal', len(ia) - suffix, len(ia), len(ib) - suffix, len(ib)))
+    return ops
+
+
+def _format_range_unified(start: int, stop: int) -> str:
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return f'{beginning}'
+    if not length:
+        beginning -= 1
+    return f'{beginning},{length}'
+
+
+def unified_diff(a_text: str, b_text: str, *, fromfile: str, tofile: str, context: int = 3) -> Tuple[str, bool]:
+    """Return (diff, complete). When over budget, diff is a one-line summary and complete=False."""
+
+    a = (a_text or '').splitlines(keepends=True)
+    b = (b_text or '').splitlines(keepends=True)
+    ops = opcodes(a, b)
+    if ops is None:
+        return summarize(a, b, fromfile=fromfile, tofile=tofile), False
+
+    matcher = difflib.SequenceMatcher(None, [], [])
+    matcher.a, matcher.b = a, b
+    matcher.opcodes = ops
+
+    out: List[str] = []
+    for group in matcher.get_grouped_opcodes(context):
+        if not out:
+            out.append(f'--- {fromfile}')
+            out.append(f'+++ {tofile}')
+        first, last = group[0], group[-1]
+        out.append(f'@@ -{_format_range_unified(first[1], last[2])} +{_format_range_unified(first[3], last[4])} @@')
+        for tag, i1, i2, j1, j2 in group:
+            if tag == 'equal':
+                out.extend(' ' + line for line in a[i1:i2])
+                continue
+            if tag in ('replace', 'delete'):
+                out.extend('-' + line for line in a[i1:i2])
+            if tag in ('replace', 'insert'):
+                out.extend('+' + line for line in b[j1:j2])
+    return ''.join(out), True
+
+
+def word_diff(a_text: str, b_text: str) -> Tuple[str, bool]:
+    """Inline word diff in `git diff --word-diff=plain` style: [-removed-]{+added+}."""
+
+    a = _WORD_RE.findall(a_text or '')
+    b = _WORD_RE.findall(b_text or '')
+    ops = opcodes(a, b)
+    if ops is None:
+        return summarize(a, b, fromfile='prev', tofile='rev', unit='words'), False
+    if all(op[0] == 'equal' for op in ops):
+        return '', True
+
+    out: List[str] = []
+    for tag, i1, i2, j1, j2 in ops:
+        if tag == 'equal':
+            out.append(''.join(a[i1:i2]))
+            continue
+        if tag in ('replace', 'delete'):
+            out.append('[-' + ''.join(a[i1:i2]) + '-]')
+        if tag in ('replace', 'insert'):
+            out.append('{+' + ''.join(b[j1:j2]) + '+}')
+    return ''.join(out), True
+
+
+def summarize(a: Sequence[str], b: Sequence[str], *, fromfile: str, tofile: str, unit: str = 'lines') -> str:
+    """Cheap multiset estimate of the change, used when the real diff is over budget."""
+
+    ca, cb = Counter(a), Counter(b)
+    removed = sum((ca - cb).values())
+    added = sum((cb - ca).values())
+    return f'--- {fromfile}\n+++ {tofile}\n@@ diff too large: {len(a)} -> {len(b)} {unit}, about -{removed} +{added} @@\n'
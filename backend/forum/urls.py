@@ -1,6 +1,7 @@
+from django.urls import path
 from rest_framework.routers import DefaultRouter
 
-from .views import BoardViewSet, CommentViewSet, HomeHeroSlideViewSet, PostViewSet, TagViewSet
+from .views import BoardViewSet, CommentViewSet, FederatedSearchView, HomeHeroSlideViewSet, PostViewSet, SavedSearchViewSet, TagViewSet
 
 router = DefaultRouter()
 router.register('boards', BoardViewSet, basename='board')
@@ -8,5 +9,8 @@ router.register('home/hero', HomeHeroSlideViewSet, basename='home-hero')
 router.register('posts', PostViewSet, basename='post')
 router.register('comments', CommentViewSet, basename='comment')
 router.register('tags', TagViewSet, basename='tag')
+router.register('saved-searches', SavedSearchViewSet, basename='saved-search')
 
-urlpatterns = router.urls
\ No newline at end of file
+urlpatterns = [
+    path('search/all/', FederatedSearchView.as_view(), name='search-all'),
+] + router.urls
\ No newline at end of file
@@ -1,13 +1,9 @@
 import json
-import uuid
-
-import difflib
 
 from datetime import timedelta
 
+from django.core.cache import cache
 from django.core.exceptions import ValidationError
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
 from django.db import transaction
 from django.db.models import BooleanField, Count, DateTimeField, Exists, ExpressionWrapper, F, IntegerField, Max, OuterRef, Q, Sum, Value
 from django.db.models.functions import Cast
@@ -19,6 +15,7 @@ from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.filters import SearchFilter
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
 from django_filters.rest_framework import DjangoFilterBackend
 
@@ -40,11 +37,14 @@ from .serializers import (
     PostRevisionDiffSerializer,
     PostRevisionSerializer,
     PostSerializer,
+    SavedSearchSerializer,
     TagSerializer,
 )
-from .image_utils import validate_and_process_uploaded_image
+from .image_jobs import job_payload, queue_image_job
 
-from .models import PostRevision
+from .models import ImageJob, PostRevision, SavedSearch, SearchOutbox
+from .revisions import create_revision, revision_bodies
+from . import textdiff
 
 from notifications.models import Notification
 
@@ -52,7 +52,18 @@ from resources.models import ResourceEntry, ResourceLink
 
 from accounts.models import UserFollow
 
-from .search_meili import meili_enabled
+from .search_backends import get_search_backend, search_health
+from .search_federated import FEDERATED_DEFAULT_LIMIT, federated_search
+from .suggest_index import suggest_index_stats, suggest_posts as suggest_from_memory
+
+from .moderation import BULK_MODERATION_MAX_IDS, bulk_moderate, claim_next_posts, claim_post, claimable_q, notify_moderation_outcome
+from .post_images import sync_post_images
+from .saved_searches import notify_saved_searches
+from .search_outbox import enqueue_post_changes, enqueue_search_changes
+
+
+# Revisions are immutable, so computed diffs can live for a long time.
+REVISION_DIFF_CACHE_SECONDS = 60 * 60 * 24
 
 
 class BoardViewSet(viewsets.ReadOnlyModelViewSet):
@@ -229,6 +240,27 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer = self.get_serializer(obj)
         return Response(serializer.data)
 
+    def _with_social_annotations(self, qs):
+        """Counts + current-user flags used by PostSerializer."""
+
+        user = self.request.user
+        qs = qs.annotate(
+            likes_count=Count('likes', distinct=True),
+            favorites_count=Count('favorites', distinct=True),
+            comments_count=Count('comments', filter=Q(comments__is_deleted=False), distinct=True),
+        )
+        if user and user.is_authenticated:
+            return qs.annotate(
+                is_liked=Exists(PostLike.objects.filter(post_id=OuterRef('pk'), user_id=user.id)),
+                is_favorited=Exists(PostFavorite.objects.filter(post_id=OuterRef('pk'), user_id=user.id)),
+                is_following_author=Exists(UserFollow.objects.filter(follower_id=user.id, following_id=OuterRef('author_id'))),
+            )
+        return qs.annotate(
+            is_liked=Value(False, output_field=BooleanField()),
+            is_favorited=Value(False, output_field=BooleanField()),
+            is_following_author=Value(False, output_field=BooleanField()),
+        )
+
     def get_queryset(self):
         qs = super().get_queryset()
         qs = qs.filter(is_deleted=False)
@@ -266,26 +298,13 @@ class PostViewSet(viewsets.ModelViewSet):
         q = (self.request.query_params.get('q') or '').strip()
         if q:
             q = q[:100]
-            filtered = filtered.filter(Q(title__icontains=q) | Q(body__icontains=q))
+            matches = get_search_backend().matching_post_ids(q)
+            if matches is not None:
+                filtered = filtered.filter(id__in=matches)
+            else:
+                filtered = filtered.filter(Q(title__icontains=q) | Q(body__icontains=q))
 
-        # Social annotations (counts + current-user flags)
-        filtered = filtered.annotate(
-            likes_count=Count('likes', distinct=True),
-            favorites_count=Count('favorites', distinct=True),
-            comments_count=Count('comments', filter=Q(comments__is_deleted=False), distinct=True),
-        )
-        if user and user.is_authenticated:
-            filtered = filtered.annotate(
-                is_liked=Exists(PostLike.objects.filter(post_id=OuterRef('pk'), user_id=user.id)),
-                is_favorited=Exists(PostFavorite.objects.filter(post_id=OuterRef('pk'), user_id=user.id)),
-                is_following_author=Exists(UserFollow.objects.filter(follower_id=user.id, following_id=OuterRef('author_id'))),
-            )
-        else:
-            filtered = filtered.annotate(
-                is_liked=Value(False, output_field=BooleanField()),
-                is_favorited=Value(False, output_field=BooleanField()),
-                is_following_author=Value(False, output_field=BooleanField()),
-            )
+        filtered = self._with_social_annotations(filtered)
 
         # Sorting
         # Supported:
@@ -355,9 +374,14 @@ class PostViewSet(viewsets.ModelViewSet):
             # Defense-in-depth: even if client sends these fields, force them off.
             extra.update({'is_pinned': False, 'is_locked': False})
 
-        post = serializer.save(author=user, status=status_value, **extra)
+        with transaction.atomic():
+            post = serializer.save(author=user, status=status_value, **extra)
+            self._create_revision(post=post, editor=user)
+            sync_post_images([post.id])
+            enqueue_post_changes([post.id])
+            if post.status == Post.Status.PUBLISHED:
+                notify_saved_searches([post.id])
 
-        self._create_revision(post=post, editor=user)
         write_audit_log(actor=user, action='post.create', target_type='post', target_id=str(post.id), request=self.request)
 
         data = getattr(self.request, 'data', {})
@@ -400,6 +424,7 @@ class PostViewSet(viewsets.ModelViewSet):
                 description='',
                 status=resource_status,
             )
+            enqueue_search_changes(SearchOutbox.Entity.RESOURCES, [resource.id])
             link_objs = []
             for item in resource_links:
                 if not isinstance(item, dict):
@@ -423,12 +448,15 @@ class PostViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'], url_path='images/upload', permission_classes=[permissions.IsAuthenticated])
     def upload_image(self, request):
+        """Store the original and queue processing; poll images/<id>/ for the URL."""
+
         f = request.FILES.get('image')
         if not f:
             return Response({'detail': 'Missing image.'}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            processed = validate_and_process_uploaded_image(uploaded_file=f, field_name='image')
+            with transaction.atomic():
+                job = queue_image_job(user=request.user, uploaded_file=f, kind=ImageJob.Kind.UPLOAD, field_name='image')
         except ValidationError as e:
             # Normalize Django ValidationError to DRF-friendly {detail: "..."}
             msg = ''
@@ -448,10 +476,24 @@ class PostViewSet(viewsets.ModelViewSet):
         except Exception:
             return Response({'detail': 'Invalid image.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        path = f"uploads/{uuid.uuid4().hex}.{processed.ext}"
-        saved_path = default_storage.save(path, processed.content)
-        url = default_storage.url(saved_path)
-        return Response({'url': url, 'width': processed.width, 'height': processed.height}, status=status.HTTP_201_CREATED)
+        # Ready already for a re-upload of known content, or after inline processing on commit.
+        job.refresh_from_db()
+        code = status.HTTP_201_CREATED if job.status == ImageJob.Status.READY else status.HTTP_202_ACCEPTED
+        return Response(job_payload(job), status=code)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path=r'images/(?P<job_id>[0-9a-fA-F-]{32,36})',
+        permission_classes=[permissions.IsAuthenticated],
+    )
+    def image_job(self, request, job_id=None):
+        """Status of an image upload (own uploads only)."""
+
+        job = ImageJob.objects.filter(pk=job_id, user=request.user).first()
+        if job is None:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(job_payload(job), status=status.HTTP_200_OK)
 
     def perform_update(self, serializer):
         obj = self.get_object()
@@ -471,6 +513,8 @@ class PostViewSet(viewsets.ModelViewSet):
                 updated.save(update_fields=['status', 'reviewed_by', 'reviewed_at', 'reject_reason'])
 
             self._create_revision(post=updated, editor=user)
+            sync_post_images([updated.id])
+            enqueue_post_changes([updated.id])
 
         write_audit_log(actor=user, action='post.update', target_type='post', target_id=str(obj.id), request=self.request)
 
@@ -483,7 +527,9 @@ class PostViewSet(viewsets.ModelViewSet):
         instance.deleted_by = actor
         instance.moderation_claimed_by = None
         instance.moderation_claimed_at = None
-        instance.save(update_fields=['is_deleted', 'deleted_at', 'deleted_by', 'moderation_claimed_by', 'moderation_claimed_at', 'updated_at'])
+        with transaction.atomic():
+            instance.save(update_fields=['is_deleted', 'deleted_at', 'deleted_by', 'moderation_claimed_by', 'moderation_claimed_at', 'updated_at'])
+            enqueue_post_changes([instance.id], op=SearchOutbox.Op.DELETE)
         write_audit_log(
             actor=actor,
             action='post.delete',
@@ -504,6 +550,8 @@ class PostViewSet(viewsets.ModelViewSet):
         Supports:
         - Autocomplete is handled via /api/posts/suggest/
         - Highlight info via match positions (client-side safe rendering)
+        - Cropped, highlighted snippets in `_formatted` (HTML-escaped except <mark>);
+          hits never include the full body
         - Aggregations (facets) by board/author
 
         Advanced query syntax (space-separated):
@@ -513,7 +561,8 @@ class PostViewSet(viewsets.ModelViewSet):
         - is:locked / is:pinned
 
         Notes:
-        - If Meilisearch is not configured, falls back to DB icontains search.
+        - Engine: Meilisearch when configured, else the database's own full-text
+          search (see forum.search_backends).
         """
 
         q = (request.query_params.get('q') or '').strip()
@@ -528,50 +577,16 @@ class PostViewSet(viewsets.ModelViewSet):
         except ValueError:
             offset_i = 0
 
-        if meili_enabled():
-            from .search_meili import search_posts
-
-            data = search_posts(user=request.user, raw_query=q, limit=limit_i, offset=offset_i)
-            return Response(data, status=status.HTTP_200_OK)
-
-        # DB fallback
-        qs = self.get_queryset()
-        # keep same visibility behavior as list
-        if q:
-            q2 = q[:100]
-            qs = qs.filter(Q(title__icontains=q2) | Q(body__icontains=q2))
-        else:
-            qs = qs.none()
-
-        total = qs.count()
-        items = list(qs.order_by('-created_at')[offset_i : offset_i + min(limit_i, 50)])
-        serializer = self.get_serializer(items, many=True)
+        data = get_search_backend().search(user=request.user, raw_query=q, limit=limit_i, offset=offset_i)
+        return Response(data, status=status.HTTP_200_OK)
 
-        facets = {
-            'board_slug': {},
-            'author_username': {},
-        }
-        try:
-            # Lightweight aggregations (published/visibility already applied by qs).
-            for row in qs.values('board__slug').annotate(c=Count('id')).order_by('-c')[:20]:
-                facets['board_slug'][row['board__slug'] or ''] = int(row['c'])
-            for row in qs.values('author__username').annotate(c=Count('id')).order_by('-c')[:20]:
-                facets['author_username'][row['author__username'] or ''] = int(row['c'])
-        except Exception:
-            pass
+    @action(detail=False, methods=['get'], url_path='search-health', permission_classes=[permissions.IsAdminUser])
+    def search_health(self, request):
+        """Staff: search engines in this process, Meilisearch breaker state and failover count."""
 
-        return Response(
-            {
-                'engine': 'db',
-                'query': q,
-                'hits': serializer.data,
-                'total': total,
-                'limit': min(limit_i, 50),
-                'offset': offset_i,
-                'facets': facets,
-            },
-            status=status.HTTP_200_OK,
-        )
+        data = search_health()
+        data['suggest_index'] = suggest_index_stats()
+        return Response(data, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['get'], url_path='suggest', permission_classes=[permissions.AllowAny])
     def suggest(self, request):
@@ -581,26 +596,11 @@ class PostViewSet(viewsets.ModelViewSet):
         if not q:
             return Response({'engine': 'none', 'query': '', 'hits': []}, status=status.HTTP_200_OK)
 
-        if meili_enabled():
-            from .search_meili import suggest_posts
-
-            data = suggest_posts(user=request.user, raw_query=q, limit=8)
-            return Response(data, status=status.HTTP_200_OK)
-
-        # DB fallback
-        q2 = q[:100]
-        qs = self.get_queryset().filter(Q(title__icontains=q2) | Q(body__icontains=q2)).order_by('-created_at')
-        items = list(qs[:8])
-        data = [
-            {
-                'id': p.id,
-                'title': p.title,
-                'board_slug': getattr(getattr(p, 'board', None), 'slug', ''),
-                'author_username': getattr(getattr(p, 'author', None), 'username', ''),
-            }
-            for p in items
-        ]
-        return Response({'engine': 'db', 'query': q, 'hits': data}, status=status.HTTP_200_OK)
+        # Plain text is answered from the in-process prefix index; qualifiers need the backend.
+        data = suggest_from_memory(user=request.user, raw_query=q[:100], limit=8)
+        if data is None:
+            data = get_search_backend().suggest(user=request.user, raw_query=q[:100], limit=8)
+        return Response(data, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], url_path='like', permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
@@ -914,7 +914,9 @@ class PostViewSet(viewsets.ModelViewSet):
         serializer.is_valid(raise_exception=True)
         parent_obj = serializer.validated_data.get('parent')
         body = serializer.validated_data['body']
-        comment = Comment.objects.create(post=post, author=user, parent=parent_obj, body=body)
+        with transaction.atomic():
+            comment = Comment.objects.create(post=post, author=user, parent=parent_obj, body=body)
+            enqueue_search_changes(SearchOutbox.Entity.COMMENTS, [comment.id])
 
         # PLCoin: first comment of the day +1
         try:
@@ -996,8 +998,9 @@ class PostViewSet(viewsets.ModelViewSet):
             qs = qs.filter(board_id__in=list(allowed_board_ids))
 
         # "mine" means: only show items that are actionable for me (not claimed by others).
+        # Stale claims count as unclaimed.
         if mine:
-            qs = qs.filter(Q(moderation_claimed_by__isnull=True) | Q(moderation_claimed_by_id=request.user.id))
+            qs = qs.filter(claimable_q(user=request.user))
 
         page = self.paginate_queryset(qs)
         items = page if page is not None else list(qs[:200])
@@ -1028,14 +1031,18 @@ class PostViewSet(viewsets.ModelViewSet):
         post.reject_reason = ''
         post.moderation_claimed_by = None
         post.moderation_claimed_at = None
-        post.save(update_fields=['status', 'reviewed_by', 'reviewed_at', 'reject_reason', 'moderation_claimed_by', 'moderation_claimed_at'])
-        write_audit_log(
-            actor=request.user,
-            action='post.approve',
-            target_type='post',
-            target_id=str(post.id),
-            request=request,
-        )
+        with transaction.atomic():
+            post.save(update_fields=['status', 'reviewed_by', 'reviewed_at', 'reject_reason', 'moderation_claimed_by', 'moderation_claimed_at'])
+            write_audit_log(
+                actor=request.user,
+                action='post.approve',
+                target_type='post',
+                target_id=str(post.id),
+                request=request,
+            )
+            notify_moderation_outcome(posts=[post], decision='approve', actor=request.user)
+            enqueue_post_changes([post.id])
+            notify_saved_searches([post.id])
         return Response(self.get_serializer(post).data)
 
     @action(detail=True, methods=['post'], url_path='reject', permission_classes=[IsModerator])
@@ -1058,17 +1065,59 @@ class PostViewSet(viewsets.ModelViewSet):
         post.reject_reason = reason
         post.moderation_claimed_by = None
         post.moderation_claimed_at = None
-        post.save(update_fields=['status', 'reviewed_by', 'reviewed_at', 'reject_reason', 'moderation_claimed_by', 'moderation_claimed_at'])
-        write_audit_log(
-            actor=request.user,
-            action='post.reject',
-            target_type='post',
-            target_id=str(post.id),
-            request=request,
-            metadata={'reason': reason},
-        )
+        with transaction.atomic():
+            post.save(update_fields=['status', 'reviewed_by', 'reviewed_at', 'reject_reason', 'moderation_claimed_by', 'moderation_claimed_at'])
+            write_audit_log(
+                actor=request.user,
+                action='post.reject',
+                target_type='post',
+                target_id=str(post.id),
+                request=request,
+                metadata={'reason': reason},
+            )
+            notify_moderation_outcome(posts=[post], decision='reject', actor=request.user)
+            enqueue_post_changes([post.id])
         return Response(self.get_serializer(post).data, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'], url_path='moderation/bulk', permission_classes=[IsModerator])
+    def bulk_moderation(self, request):
+        """Approve or reject many pending posts in one call.
+
+        Body:
+        - ids: list of post ids (max BULK_MODERATION_MAX_IDS)
+        - action: approve | reject
+        - reason: optional reject reason
+
+        Posts outside my boards, deleted, or claimed by someone else are skipped
+        and reported back in `skipped`.
+        """
+
+        decision = str(request.data.get('action') or '').strip().lower()
+        if decision not in ('approve', 'reject'):
+            return Response({'detail': 'action must be approve or reject.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        raw_ids = request.data.get('ids')
+        if not isinstance(raw_ids, list) or not raw_ids:
+            return Response({'detail': 'ids must be a non-empty list.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(raw_ids) > BULK_MODERATION_MAX_IDS:
+            return Response({'detail': f'At most {BULK_MODERATION_MAX_IDS} ids per call.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ids = [int(x) for x in raw_ids]
+        except (TypeError, ValueError):
+            return Response({'detail': 'ids must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        reason = str(request.data.get('reason') or '')[:200]
+        result = bulk_moderate(user=request.user, post_ids=ids, decision=decision, reason=reason, request=request)
+        return Response(
+            {
+                'action': decision,
+                'updated': result['updated'],
+                'updated_count': len(result['updated']),
+                'skipped': {str(k): v for k, v in result['skipped'].items()},
+            },
+            status=status.HTTP_200_OK,
+        )
+
     @action(detail=True, methods=['post'], url_path='moderation/claim', permission_classes=[IsModerator])
     def claim(self, request, pk=None):
         post = self.get_object()
@@ -1079,13 +1128,10 @@ class PostViewSet(viewsets.ModelViewSet):
         if not staff_can_moderate_board(request.user, getattr(post, 'board_id', None)):
             raise PermissionDenied('Not allowed for this board.')
 
-        if post.moderation_claimed_by_id and post.moderation_claimed_by_id != request.user.id and (not getattr(request.user, 'is_superuser', False)):
+        # Conditional UPDATE: only one concurrent claimer can win.
+        if not claim_post(post_id=post.id, user=request.user, force=bool(getattr(request.user, 'is_superuser', False))):
             return Response({'detail': 'Already claimed.'}, status=status.HTTP_409_CONFLICT)
 
-        post.moderation_claimed_by = request.user
-        post.moderation_claimed_at = timezone.now()
-        post.save(update_fields=['moderation_claimed_by', 'moderation_claimed_at'])
-
         write_audit_log(
             actor=request.user,
             action='post.moderation.claim',
@@ -1096,6 +1142,52 @@ class PostViewSet(viewsets.ModelViewSet):
 
         return Response({'ok': True})
 
+    @action(detail=False, methods=['post'], url_path='moderation/claim-next', permission_classes=[IsModerator])
+    def claim_next(self, request):
+        """Atomically claim the next N unclaimed pending posts in boards I can moderate.
+
+        Body/query params:
+        - count: 1..50 (default 10)
+        - board: optional board id
+        """
+
+        raw_count = request.data.get('count', request.query_params.get('count'))
+        try:
+            count = int(raw_count) if raw_count is not None else 10
+        except (TypeError, ValueError):
+            count = 10
+        count = max(1, min(count, 50))
+
+        raw_board = request.data.get('board', request.query_params.get('board'))
+        try:
+            board_id = int(raw_board) if raw_board not in (None, '') else None
+        except (TypeError, ValueError):
+            board_id = None
+
+        allowed_board_ids = None
+        if not getattr(request.user, 'is_superuser', False):
+            allowed_board_ids = set(staff_allowed_board_ids(request.user, for_action='moderate'))
+
+        ids = claim_next_posts(user=request.user, limit=count, allowed_board_ids=allowed_board_ids, board_id=board_id)
+
+        if ids:
+            write_audit_log(
+                actor=request.user,
+                action='post.moderation.claim_next',
+                target_type='post',
+                target_id=str(ids[0]),
+                request=request,
+                metadata={'post_ids': ids},
+            )
+
+        items = list(
+            Post.objects.select_related('board', 'author', 'moderation_claimed_by')
+            .filter(id__in=ids)
+            .order_by('created_at', 'id')
+        )
+        ser = PostModerationSerializer(items, many=True, context={'request': request, 'allowed_board_ids': allowed_board_ids})
+        return Response({'claimed': len(items), 'results': ser.data})
+
     @action(detail=True, methods=['post'], url_path='moderation/unclaim', permission_classes=[IsModerator])
     def unclaim(self, request, pk=None):
         post = self.get_object()
@@ -1118,10 +1210,36 @@ class PostViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'], url_path='revisions', permission_classes=[IsModerator])
     def revisions(self, request, pk=None):
+        """Revision list for moderators.
+
+        Optional paging for long histories: ?limit=&offset= (newest-first when
+        order=desc). Without limit the full list is returned, as before.
+        """
+
         post = self.get_object()
         if not staff_can_moderate_board(request.user, getattr(post, 'board_id', None)):
             raise PermissionDenied('Not allowed for this board.')
-        qs = PostRevision.objects.select_related('editor').filter(post=post).order_by('sequence')
+        # Bodies (full or delta) are not needed for the listing.
+        order = '-sequence' if (request.query_params.get('order') or '').strip().lower() == 'desc' else 'sequence'
+        qs = (
+            PostRevision.objects.filter(post=post)
+            .select_related('editor')
+            .only('id', 'sequence', 'created_at', 'editor__username')
+            .order_by(order)
+        )
+
+        limit = request.query_params.get('limit')
+        if limit is not None:
+            try:
+                limit_i = max(1, min(int(limit), 100))
+            except ValueError:
+                limit_i = 20
+            try:
+                offset_i = max(0, int(request.query_params.get('offset') or 0))
+            except ValueError:
+                offset_i = 0
+            qs = qs[offset_i : offset_i + limit_i]
+
         data = [
             {
                 'id': r.id,
@@ -1135,33 +1253,59 @@ class PostViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['get'], url_path='revisions/(?P<rev_id>[^/.]+)/diff', permission_classes=[IsModerator])
     def revision_diff(self, request, pk=None, rev_id=None):
+        """Diff a revision against its predecessor (or ?from=<revision id>).
+
+        - mode=line (default): unified diff, same format as before.
+        - mode=word: inline [-removed-]{+added+} diff.
+        Diffs are bounded (see forum.textdiff); over budget they degrade to a
+        summary and `truncated` is true. Revisions are immutable, so results
+        are cached by (from, to, mode, whether ?from was given); the last one
+        decides the 'rev N' / 'prev' header labels.
+        """
+
         post = self.get_object()
         if not staff_can_moderate_board(request.user, getattr(post, 'board_id', None)):
             raise PermissionDenied('Not allowed for this board.')
         try:
-            rev = PostRevision.objects.get(post=post, id=rev_id)
-        except PostRevision.DoesNotExist:
+            rev = PostRevision.objects.defer('body', 'body_delta').get(post=post, id=rev_id)
+        except (PostRevision.DoesNotExist, ValueError):
             return Response({'detail': 'Revision not found.'}, status=status.HTTP_404_NOT_FOUND)
 
-        prev = (
-            PostRevision.objects.filter(post=post, sequence__lt=rev.sequence)
-            .order_by('-sequence')
-            .first()
-        )
+        mode = (request.query_params.get('mode') or 'line').strip().lower()
+        if mode not in ('line', 'word'):
+            mode = 'line'
 
-        def udiff(a: str, b: str, from_name: str, to_name: str) -> str:
-            return ''.join(
-                difflib.unified_diff(
-                    (a or '').splitlines(keepends=True),
-                    (b or '').splitlines(keepends=True),
-                    fromfile=from_name,
-                    tofile=to_name,
-                    lineterm=''
-                )
+        from_raw = (request.query_params.get('from') or '').strip()
+        if from_raw:
+            try:
+                prev = PostRevision.objects.defer('body', 'body_delta').get(post=post, id=int(from_raw))
+            except (PostRevision.DoesNotExist, ValueError):
+                return Response({'detail': 'Revision not found.'}, status=status.HTTP_404_NOT_FOUND)
+        else:
+            prev = (
+                PostRevision.objects.filter(post=post, sequence__lt=rev.sequence)
+                .defer('body', 'body_delta')
+                .order_by('-sequence')
+                .first()
             )
 
-        title_diff = udiff(prev.title if prev else '', rev.title, 'title(prev)', f'title(rev {rev.sequence})')
-        body_diff = udiff(prev.body if prev else '', rev.body, 'body(prev)', f'body(rev {rev.sequence})')
+        prev_label = f'rev {prev.sequence}' if (prev and from_raw) else 'prev'
+        cache_key = f'forum:revdiff:{prev.id if prev else 0}:{rev.id}:{mode}:{"from" if from_raw else "prev"}'
+        out = cache.get(cache_key)
+        if out is not None:
+            return Response(out)
+
+        bodies = revision_bodies(post.id, [rev.sequence] + ([prev.sequence] if prev else []))
+        prev_title = prev.title if prev else ''
+        prev_body = bodies.get(prev.sequence, '') if prev else ''
+        rev_body = bodies.get(rev.sequence, '')
+
+        if mode == 'word':
+            title_diff, title_ok = textdiff.word_diff(prev_title, rev.title)
+            body_diff, body_ok = textdiff.word_diff(prev_body, rev_body)
+        else:
+            title_diff, title_ok = textdiff.unified_diff(prev_title, rev.title, fromfile=f'title({prev_label})', tofile=f'title(rev {rev.sequence})')
+            body_diff, body_ok = textdiff.unified_diff(prev_body, rev_body, fromfile=f'body({prev_label})', tofile=f'body(rev {rev.sequence})')
         cover_changed = (prev.cover_image_name if prev else '') != (rev.cover_image_name or '')
 
         payload = {
@@ -1170,25 +1314,17 @@ class PostViewSet(viewsets.ModelViewSet):
             'title_diff': title_diff,
             'body_diff': body_diff,
             'cover_changed': cover_changed,
+            'mode': mode,
+            'truncated': not (title_ok and body_ok),
         }
-        out = PostRevisionDiffSerializer(payload).data
+        out = dict(PostRevisionDiffSerializer(payload).data)
         # Backward-compatible convenience field for clients that expect a single diff string.
         out['diff'] = (title_diff or '') + ('\n' if (title_diff and body_diff) else '') + (body_diff or '')
+        cache.set(cache_key, out, REVISION_DIFF_CACHE_SECONDS)
         return Response(out)
 
     def _create_revision(self, *, post: Post, editor) -> None:
-        # Sequence monotonic per post
-        with transaction.atomic():
-            last = PostRevision.objects.select_for_update().filter(post=post).order_by('-sequence').first()
-            seq = (last.sequence + 1) if last else 1
-            PostRevision.objects.create(
-                post=post,
-                editor=editor,
-                sequence=seq,
-                title=post.title,
-                body=post.body or '',
-                cover_image_name=(post.cover_image.name if getattr(post, 'cover_image', None) else ''),
-            )
+        create_revision(post=post, editor=editor)
 
 
 class CommentViewSet(viewsets.ModelViewSet):
@@ -1226,7 +1362,9 @@ class CommentViewSet(viewsets.ModelViewSet):
         if not obj.is_deleted:
             obj.is_deleted = True
             obj.body = ''
-            obj.save(update_fields=['is_deleted', 'body', 'updated_at'])
+            with transaction.atomic():
+                obj.save(update_fields=['is_deleted', 'body', 'updated_at'])
+                enqueue_search_changes(SearchOutbox.Entity.COMMENTS, [obj.id], op=SearchOutbox.Op.DELETE)
             write_audit_log(
                 actor=user,
                 action='comment.delete',
@@ -1237,3 +1375,36 @@ class CommentViewSet(viewsets.ModelViewSet):
             )
 
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class SavedSearchViewSet(viewsets.ModelViewSet):
+    """The current user's saved searches; matching new posts arrive as notifications."""
+
+    serializer_class = SavedSearchSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    http_method_names = ['get', 'post', 'patch', 'delete', 'head', 'options']
+
+    def get_queryset(self):
+        return SavedSearch.objects.filter(user=self.request.user)
+
+
+class FederatedSearchView(APIView):
+    """GET /api/search/all/?q=...&limit=5&types=posts,comments,users,tags,resources
+
+    Top hits per entity in one round trip (see forum.search_federated).
+    `types` is optional (default: all); `limit` is per entity (max 20).
+    """
+
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request):
+        q = (request.query_params.get('q') or '').strip()[:200]
+        try:
+            limit = int(request.query_params.get('limit') or FEDERATED_DEFAULT_LIMIT)
+        except ValueError:
+            limit = FEDERATED_DEFAULT_LIMIT
+        types = request.query_params.get('types')
+        entities = [t.strip() for t in types.split(',') if t.strip()] if types else None
+
+        data = federated_search(user=request.user, raw_query=q, limit=limit, entities=entities)
+        return Response(data, status=status.HTTP_200_OK)
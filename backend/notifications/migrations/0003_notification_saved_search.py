@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('forum', '0023_saved_searches'),
+        ('notifications', '0002_notification_moderation_types'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='saved_search',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='notifications', to='forum.savedsearch'),
+        ),
+        migrations.AlterField(
+            model_name='notification',
+            name='type',
+            field=models.CharField(choices=[('comment_on_post', 'Comment on post'), ('reply_to_comment', 'Reply to comment'), ('user_follow', 'User follow'), ('post_approved', 'Post approved'), ('post_rejected', 'Post rejected'), ('saved_search_match', 'Saved search match')], max_length=40),
+        ),
+    ]
@@ -7,6 +7,9 @@ class Notification(models.Model):
         COMMENT_ON_POST = 'comment_on_post', 'Comment on post'
         REPLY_TO_COMMENT = 'reply_to_comment', 'Reply to comment'
         USER_FOLLOW = 'user_follow', 'User follow'
+        POST_APPROVED = 'post_approved', 'Post approved'
+        POST_REJECTED = 'post_rejected', 'Post rejected'
+        SAVED_SEARCH_MATCH = 'saved_search_match', 'Saved search match'
 
     recipient = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -24,6 +27,7 @@ class Notification(models.Model):
 
     post = models.ForeignKey('forum.Post', null=True, blank=True, on_delete=models.CASCADE, related_name='notifications')
     comment = models.ForeignKey('forum.Comment', null=True, blank=True, on_delete=models.CASCADE, related_name='notifications')
+    saved_search = models.ForeignKey('forum.SavedSearch', null=True, blank=True, on_delete=models.SET_NULL, related_name='notifications')
 
     is_read = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -9,6 +9,7 @@ class NotificationSerializer(serializers.ModelSerializer):
     actor_pid = serializers.CharField(source='actor.pid', read_only=True, allow_null=True)
     actor_avatar_url = serializers.SerializerMethodField()
     post_title = serializers.CharField(source='post.title', read_only=True, allow_null=True)
+    saved_search_query = serializers.CharField(source='saved_search.query', read_only=True, allow_null=True)
 
     class Meta:
         model = Notification
@@ -24,6 +25,8 @@ class NotificationSerializer(serializers.ModelSerializer):
             'post',
             'post_title',
             'comment',
+            'saved_search',
+            'saved_search_query',
         )
 
     def get_actor_avatar_url(self, obj) -> str:
@@ -13,7 +13,7 @@ class NotificationViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def get_queryset(self):
-        return Notification.objects.select_related('actor', 'post', 'comment').filter(recipient=self.request.user)
+        return Notification.objects.select_related('actor', 'post', 'comment', 'saved_search').filter(recipient=self.request.user)
 
     @action(detail=False, methods=['get'], url_path='unread-count')
     def unread_count(self, request):
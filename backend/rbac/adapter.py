@@ -1,88 +1,131 @@
 from __future__ import annotations
 
-from typing import Iterable, List
+from typing import Iterable, List, Set, Tuple
 
-from casbin.persist.adapter import Adapter
+from casbin.persist.batch_adapter import BatchAdapter
+from django.db import transaction
+from django.db.models import Q
 
 from .models import CasbinRule
 
 
-class DjangoAdapter(Adapter):
+_FIELDS = ("v0", "v1", "v2", "v3", "v4", "v5")
+
+_RuleKey = Tuple[str, str, str, str, str, str, str]
+
+
+def _rule_key(ptype: str, rule: Iterable[str]) -> _RuleKey:
+    values = [str(x) for x in rule]
+    v = values + [""] * (6 - len(values))
+    return (ptype, v[0], v[1], v[2], v[3], v[4], v[5])
+
+
+def _key_filter(key: _RuleKey) -> Q:
+    return Q(ptype=key[0], **{field: key[i + 1] for i, field in enumerate(_FIELDS)})
+
+
+def _key_to_rule(key: _RuleKey) -> CasbinRule:
+    return CasbinRule(
+        ptype=key[0],
+        v0=key[1],
+        v1=key[2],
+        v2=key[3],
+        v3=key[4],
+        v4=key[5],
+        v5=key[6],
+    )
+
+
+def _delete_keys(keys: List[_RuleKey], *, chunk_size: int = 200) -> None:
+    # OR-ed exact-match filters keep each DELETE on the unique index.
+    for i in range(0, len(keys), chunk_size):
+        q = Q()
+        for key in keys[i : i + chunk_size]:
+            q |= _key_filter(key)
+        CasbinRule.objects.filter(q).delete()
+
+
+class DjangoAdapter(BatchAdapter):
     """Casbin adapter backed by Django ORM."""
 
     def load_policy(self, model):
         for rule in CasbinRule.objects.all().iterator():
-            line = ", ".join(
-                [
-                    rule.ptype,
-                    rule.v0,
-                    rule.v1,
-                    rule.v2,
-                    rule.v3,
-                    rule.v4,
-                    rule.v5,
-                ]
-            ).strip()
+            # Drop trailing empty v* columns so "p, a, b, c, d, , " loads as a 4-field rule.
+            values = [rule.ptype, rule.v0, rule.v1, rule.v2, rule.v3, rule.v4, rule.v5]
+            while values and not values[-1]:
+                values.pop()
+            line = ", ".join(values).strip()
             self._load_policy_line(line, model)
 
     def save_policy(self, model) -> bool:
-        CasbinRule.objects.all().delete()
+        """Persist the model by diffing against stored rules.
 
-        rules: List[CasbinRule] = []
+        Only rows that were added or removed are written, in one transaction.
+        """
 
+        wanted: Set[_RuleKey] = set()
         for ptype, ast in model.model.items():
             for sec, assertion in ast.items():
                 if sec not in ("p", "g"):
                     continue
                 for rule in assertion.policy:
-                    v = list(rule) + [""] * (6 - len(rule))
-                    rules.append(
-                        CasbinRule(
-                            ptype=ptype,
-                            v0=v[0],
-                            v1=v[1],
-                            v2=v[2],
-                            v3=v[3],
-                            v4=v[4],
-                            v5=v[5],
-                        )
-                    )
-
-        CasbinRule.objects.bulk_create(rules, ignore_conflicts=True)
+                    wanted.add(_rule_key(ptype, rule))
+
+        stored: Set[_RuleKey] = set(
+            CasbinRule.objects.values_list("ptype", *_FIELDS)
+        )
+
+        to_add = wanted - stored
+        to_remove = stored - wanted
+        if not to_add and not to_remove:
+            return True
+
+        with transaction.atomic():
+            if to_remove:
+                _delete_keys(sorted(to_remove))
+            if to_add:
+                CasbinRule.objects.bulk_create(
+                    [_key_to_rule(k) for k in sorted(to_add)],
+                    ignore_conflicts=True,
+                )
         return True
 
     def add_policy(self, sec, ptype, rule: Iterable[str]):
-        values = list(rule)
-        v = values + [""] * (6 - len(values))
+        key = _rule_key(ptype, rule)
         CasbinRule.objects.get_or_create(
-            ptype=ptype,
-            v0=v[0],
-            v1=v[1],
-            v2=v[2],
-            v3=v[3],
-            v4=v[4],
-            v5=v[5],
+            ptype=key[0],
+            v0=key[1],
+            v1=key[2],
+            v2=key[3],
+            v3=key[4],
+            v4=key[5],
+            v5=key[6],
         )
 
+    def add_policies(self, sec, ptype, rules: Iterable[Iterable[str]]):
+        keys = sorted({_rule_key(ptype, r) for r in rules})
+        if not keys:
+            return True
+        with transaction.atomic():
+            CasbinRule.objects.bulk_create([_key_to_rule(k) for k in keys], ignore_conflicts=True)
+        return True
+
     def remove_policy(self, sec, ptype, rule: Iterable[str]):
-        values = list(rule)
-        v = values + [""] * (6 - len(values))
-        CasbinRule.objects.filter(
-            ptype=ptype,
-            v0=v[0],
-            v1=v[1],
-            v2=v[2],
-            v3=v[3],
-            v4=v[4],
-            v5=v[5],
-        ).delete()
+        CasbinRule.objects.filter(_key_filter(_rule_key(ptype, rule))).delete()
+
+    def remove_policies(self, sec, ptype, rules: Iterable[Iterable[str]]):
+        keys = sorted({_rule_key(ptype, r) for r in rules})
+        if not keys:
+            return True
+        with transaction.atomic():
+            _delete_keys(keys)
+        return True
 
     def remove_filtered_policy(self, sec, ptype, field_index, *field_values):
         qs = CasbinRule.objects.filter(ptype=ptype)
-        fields = ["v0", "v1", "v2", "v3", "v4", "v5"]
         for idx, field_value in enumerate(field_values):
             if field_value:
-                qs = qs.filter(**{fields[field_index + idx]: field_value})
+                qs = qs.filter(**{_FIELDS[field_index + idx]: field_value})
         qs.delete()
 
     @staticmethod
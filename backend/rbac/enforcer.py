@@ -1,12 +1,105 @@
 from __future__ import annotations
 
-from functools import lru_cache
+import threading
+import uuid
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Tuple
 
 import casbin
 
 from .adapter import DjangoAdapter
+from .models import PolicyVersion
+
+
+# Decision cache
+# - Process-wide bounded LRU keyed by (subject, dom, obj, act, policy_version).
+# - policy_version is the PolicyVersion row's token, so a policy change in one
+#   worker invalidates decisions (and the loaded enforcer) in every worker.
+# - A per-request memo is kept on the user object (DRF builds a fresh user per
+#   request). It holds the version read on the request's first check, so a
+#   request costs one version lookup and repeated checks skip the LRU lock.
+DECISION_CACHE_MAX_ENTRIES = 4096
+_POLICY_VERSION_PK = 1
+_REQUEST_MEMO_ATTR = '_rbac_decision_memo'
+
+_DecisionKey = Tuple[str, str, str, str, str]
+
+
+class _DecisionCache:
+    """Thread-safe bounded LRU for enforce() results."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max(1, int(max_entries))
+        self._data: 'OrderedDict[_DecisionKey, bool]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.request_hits = 0
+        self.evictions = 0
+
+    def get(self, key: _DecisionKey) -> Optional[bool]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def note_request_hit(self) -> None:
+        with self._lock:
+            self.request_hits += 1
+
+    def set(self, key: _DecisionKey, value: bool) -> None:
+        with self._lock:
+            self._data[key] = bool(value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            total = lookups + self.request_hits
+            return {
+                'size': len(self._data),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'request_hits': self.request_hits,
+                'evictions': self.evictions,
+                'hit_rate': (float(self.hits) / lookups) if lookups else 0.0,
+                'overall_hit_rate': (float(self.hits + self.request_hits) / total) if total else 0.0,
+            }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.request_hits = 0
+            self.evictions = 0
+
+
+_decisions = _DecisionCache(DECISION_CACHE_MAX_ENTRIES)
+
+_enforcer_lock = threading.Lock()
+_enforcer: Optional[casbin.Enforcer] = None
+_enforcer_version: Optional[str] = None
+
+
+class _RequestMemo:
+    __slots__ = ('version', 'decisions')
+
+    def __init__(self, version: str) -> None:
+        self.version = version
+        self.decisions: Dict[Tuple[str, str, str], bool] = {}
 
 
 def _model_path() -> str:
@@ -15,13 +108,55 @@ def _model_path() -> str:
     return str(here / "casbin_model.conf")
 
 
-@lru_cache(maxsize=1)
-def get_enforcer() -> casbin.Enforcer:
-    adapter = DjangoAdapter()
-    e = casbin.Enforcer(_model_path(), adapter)
-    e.load_policy()
-    e.enable_auto_save(True)
-    return e
+def get_policy_version() -> str:
+    token = PolicyVersion.objects.filter(pk=_POLICY_VERSION_PK).values_list("token", flat=True).first()
+    return token or ""
+
+
+def _bump_policy_version() -> str:
+    token = uuid.uuid4().hex
+    PolicyVersion.objects.update_or_create(pk=_POLICY_VERSION_PK, defaults={"token": token})
+    return token
+
+
+def get_enforcer(version: Optional[str] = None) -> casbin.Enforcer:
+    """Return the process-wide enforcer, reloading it when the policy version moved."""
+
+    global _enforcer, _enforcer_version
+
+    if version is None:
+        version = get_policy_version()
+    e = _enforcer
+    if e is not None and _enforcer_version == version:
+        return e
+
+    with _enforcer_lock:
+        if _enforcer is None or _enforcer_version != version:
+            adapter = DjangoAdapter()
+            e = casbin.Enforcer(_model_path(), adapter)
+            e.load_policy()
+            e.enable_auto_save(True)
+            _enforcer = e
+            _enforcer_version = version
+            _decisions.clear()
+        return _enforcer
+
+
+def _subject_for(user) -> str:
+    subject: Optional[str] = getattr(user, "pid", None)
+    if not subject:
+        subject = str(getattr(user, "pk", ""))
+    return subject
+
+
+def _cached_enforce(subject: str, dom: str, obj: str, act: str, version: str) -> bool:
+    key = (subject, dom, obj, act, version)
+    cached = _decisions.get(key)
+    if cached is not None:
+        return cached
+    allowed = bool(get_enforcer(version).enforce(subject, dom, obj, act))
+    _decisions.set(key, allowed)
+    return allowed
 
 
 def enforce(user, dom: str, obj: str, act: str) -> bool:
@@ -31,6 +166,9 @@ def enforce(user, dom: str, obj: str, act: str) -> bool:
     - staff: can be granted permissions via direct policy on subject "role:staff"
       even without explicit grouping rules
     - normal users: use subject = user.pid (fallback to str(user.pk))
+
+    Decisions are memoized per request (on the user object) and process-wide
+    in a bounded LRU keyed by the policy version.
     """
 
     if getattr(user, "is_superuser", False):
@@ -38,20 +176,47 @@ def enforce(user, dom: str, obj: str, act: str) -> bool:
     if not getattr(user, "is_authenticated", False):
         return False
 
-    subject: Optional[str] = getattr(user, "pid", None)
-    if not subject:
-        subject = str(getattr(user, "pk", ""))
+    memo = getattr(user, _REQUEST_MEMO_ATTR, None)
+    if memo is None:
+        memo = _RequestMemo(get_policy_version())
+        try:
+            setattr(user, _REQUEST_MEMO_ATTR, memo)
+        except Exception:
+            pass
 
-    e = get_enforcer()
+    memo_key = (dom, obj, act)
+    if memo_key in memo.decisions:
+        _decisions.note_request_hit()
+        return memo.decisions[memo_key]
+
+    allowed = _cached_enforce(_subject_for(user), dom, obj, act, memo.version)
+    if not allowed and getattr(user, "is_staff", False):
+        allowed = _cached_enforce("role:staff", dom, obj, act, memo.version)
+
+    memo.decisions[memo_key] = allowed
+    return allowed
 
-    if e.enforce(subject, dom, obj, act):
-        return True
 
-    if getattr(user, "is_staff", False):
-        return bool(e.enforce("role:staff", dom, obj, act))
+def decision_cache_stats() -> Dict[str, object]:
+    data = _decisions.stats()
+    data['policy_version'] = get_policy_version()
+    return data
 
-    return False
 
+def invalidate_enforcer_cache(*, reload: bool = True) -> None:
+    """Drop cached decisions and force every worker to reload policies.
+
+    reload=False is for callers that just changed policies through this
+    process's enforcer: its in-memory model is already current, so it adopts
+    the new version instead of reloading every rule from the database.
+    """
 
-def invalidate_enforcer_cache() -> None:
-    get_enforcer.cache_clear()
+    global _enforcer_version
+    before = get_policy_version()
+    after = _bump_policy_version()
+    with _enforcer_lock:
+        if reload or _enforcer is None or _enforcer_version != before:
+            _enforcer_version = None
+        else:
+            _enforcer_version = after
+    _decisions.clear()
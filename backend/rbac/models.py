@@ -34,3 +34,18 @@ class CasbinRule(models.Model):
         parts = [self.ptype, self.v0, self.v1, self.v2, self.v3, self.v4, self.v5]
         parts = [p for p in parts if p]
         return ",".join(parts)
+
+
+class PolicyVersion(models.Model):
+    """Single row (pk=1) whose token changes on every policy write.
+
+    Every worker compares it with the token its enforcer and decision cache
+    were built for. A random token rather than a counter, so a rolled-back
+    transaction can never make an older policy state look current.
+    """
+
+    token = models.CharField(max_length=32, blank=True, default="")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return self.token
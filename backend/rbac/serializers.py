@@ -12,3 +12,13 @@ class AssignmentSerializer(serializers.Serializer):
     user = serializers.CharField(max_length=255)
     role = serializers.CharField(max_length=255)
     dom = serializers.CharField(max_length=255, required=False, allow_blank=True, default="*")
+
+
+class PolicyBatchSerializer(serializers.Serializer):
+    add = PolicySerializer(many=True, required=False, default=list, max_length=1000)
+    remove = PolicySerializer(many=True, required=False, default=list, max_length=1000)
+
+
+class AssignmentBatchSerializer(serializers.Serializer):
+    add = AssignmentSerializer(many=True, required=False, default=list, max_length=1000)
+    remove = AssignmentSerializer(many=True, required=False, default=list, max_length=1000)
@@ -0,0 +1,128 @@
+import casbin
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from rest_framework.test import APIClient
+
+from .adapter import DjangoAdapter
+from .enforcer import _bump_policy_version, _model_path, _subject_for, decision_cache_stats, enforce, get_enforcer
+from .models import CasbinRule
+
+
+class DecisionCacheTests(TestCase):
+	def setUp(self):
+		self.staff = get_user_model().objects.create_user(username='@rbac-staff', password='pw', is_staff=True)
+		self.user = get_user_model().objects.create_user(username='@rbac-user', password='pw')
+
+	def _fresh(self, user):
+		# A new request gets a new user object, and with it an empty memo.
+		return get_user_model().objects.get(pk=user.pk)
+
+	def test_one_version_lookup_per_request(self):
+		enforce(self.staff, '*', 'admin.audit', 'read')
+
+		staff = self._fresh(self.staff)
+		before = decision_cache_stats()
+		with self.assertNumQueries(1):
+			self.assertTrue(enforce(staff, '*', 'admin.audit', 'read'))
+			self.assertTrue(enforce(staff, '*', 'admin.audit', 'read'))
+			self.assertTrue(enforce(staff, '*', 'admin.users', 'read'))
+		after = decision_cache_stats()
+		self.assertEqual(after['request_hits'] - before['request_hits'], 1)
+		self.assertGreater(after['hits'], before['hits'])
+
+	def test_policy_change_from_another_worker_is_picked_up(self):
+		self.assertFalse(enforce(self.user, '*', 'admin.audit', 'read'))
+
+		# What another process does: write the rule, then move the shared version.
+		CasbinRule.objects.create(ptype='p', v0=_subject_for(self.user), v1='*', v2='admin.audit', v3='read')
+		_bump_policy_version()
+
+		# The running request keeps its decision; the next one reloads.
+		self.assertFalse(enforce(self.user, '*', 'admin.audit', 'read'))
+		self.assertTrue(enforce(self._fresh(self.user), '*', 'admin.audit', 'read'))
+
+
+def _rules():
+	return set(CasbinRule.objects.values_list('ptype', 'v0', 'v1', 'v2', 'v3'))
+
+
+class AdapterTests(TestCase):
+	def test_save_policy_round_trip_only_writes_the_difference(self):
+		e = get_enforcer()
+		e.enable_auto_save(False)
+		e.add_policy('role:editor', '*', 'posts', 'edit')
+		e.add_grouping_policy('u1', 'role:editor', '*')
+		e.remove_policy('role:staff', '*', 'admin.audit', 'read')
+		untouched = CasbinRule.objects.get(ptype='p', v0='role:staff', v2='admin.users', v3='read').pk
+
+		e.save_policy()
+		e.enable_auto_save(True)
+
+		rules = _rules()
+		self.assertIn(('p', 'role:editor', '*', 'posts', 'edit'), rules)
+		self.assertIn(('g', 'u1', 'role:editor', '*', ''), rules)
+		self.assertNotIn(('p', 'role:staff', '*', 'admin.audit', 'read'), rules)
+		self.assertTrue(CasbinRule.objects.filter(pk=untouched).exists())
+
+		reloaded = casbin.Enforcer(_model_path(), DjangoAdapter())
+		self.assertEqual(sorted(reloaded.get_policy()), sorted(e.get_policy()))
+		self.assertEqual(reloaded.get_grouping_policy(), [['u1', 'role:editor', '*']])
+
+		# Nothing changed: no writes at all.
+		with self.assertNumQueries(1):
+			DjangoAdapter().save_policy(e.get_model())
+
+
+class BatchEndpointTests(TestCase):
+	def setUp(self):
+		User = get_user_model()
+		self.admin = User.objects.create_superuser(username='@rbac-admin', password='pw')
+		self.staff = User.objects.create_user(username='@rbac-staff2', password='pw', is_staff=True)
+		self.client = APIClient()
+
+	def test_policy_batch_skips_duplicates_and_no_ops(self):
+		self.client.force_authenticate(user=self.admin)
+		rule = {'sub': 'role:editor', 'obj': 'posts', 'act': 'edit'}
+		resp = self.client.post(
+			'/api/admin/rbac/policies/batch/',
+			{
+				'add': [rule, rule, {'sub': 'role:staff', 'obj': 'admin.audit', 'act': 'read'}],
+				'remove': [{'sub': 'role:staff', 'obj': 'admin.users', 'act': 'ban'}, {'sub': 'nobody', 'obj': 'x', 'act': 'y'}],
+			},
+			format='json',
+		)
+		self.assertEqual(resp.status_code, 200, resp.content)
+		self.assertEqual((resp.data['added'], resp.data['removed']), (1, 1))
+		rules = _rules()
+		self.assertIn(('p', 'role:editor', '*', 'posts', 'edit'), rules)
+		self.assertNotIn(('p', 'role:staff', '*', 'admin.users', 'ban'), rules)
+
+		resp = self.client.post('/api/admin/rbac/policies/batch/', {'remove': [rule, rule]}, format='json')
+		self.assertEqual((resp.data['added'], resp.data['removed']), (0, 1))
+		self.assertNotIn(('p', 'role:editor', '*', 'posts', 'edit'), _rules())
+
+	def test_assignment_batch_applies_to_the_next_request(self):
+		self.client.force_authenticate(user=self.admin)
+		subject = _subject_for(self.staff)
+		self.client.post('/api/admin/rbac/policies/batch/', {'add': [{'sub': 'role:auditor', 'obj': 'rbac', 'act': 'manage'}]}, format='json')
+		resp = self.client.post(
+			'/api/admin/rbac/assignments/batch/',
+			{'add': [{'user': subject, 'role': 'role:auditor'}, {'user': subject, 'role': 'role:auditor'}]},
+			format='json',
+		)
+		self.assertEqual((resp.data['added'], resp.data['removed']), (1, 0))
+		self.assertEqual(CasbinRule.objects.filter(ptype='g', v0=subject).count(), 1)
+
+		self.client.force_authenticate(user=get_user_model().objects.get(pk=self.staff.pk))
+		self.assertEqual(self.client.get('/api/admin/rbac/assignments/').status_code, 200)
+
+	def test_batch_endpoints_require_rbac_manage(self):
+		before = _rules()
+		payload = {'add': [{'sub': 'role:staff', 'obj': 'rbac', 'act': 'manage'}]}
+		for user in (None, self.staff):
+			self.client.force_authenticate(user=user)
+			for url in ('/api/admin/rbac/policies/batch/', '/api/admin/rbac/assignments/batch/'):
+				resp = self.client.post(url, payload, format='json')
+				self.assertIn(resp.status_code, (401, 403), (url, user))
+		self.assertEqual(_rules(), before)
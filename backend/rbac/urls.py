@@ -1,8 +1,11 @@
 from django.urls import path
 
 from .views import (
+    AssignmentBatchView,
     AssignmentListCreateView,
     AssignmentRemoveView,
+    DecisionCacheStatsView,
+    PolicyBatchView,
     PolicyListCreateView,
     PolicyRemoveView,
 )
@@ -10,10 +13,13 @@ from .views import (
 urlpatterns = [
     path("admin/rbac/policies/", PolicyListCreateView.as_view(), name="rbac-policies"),
     path("admin/rbac/policies/remove/", PolicyRemoveView.as_view(), name="rbac-policies-remove"),
+    path("admin/rbac/policies/batch/", PolicyBatchView.as_view(), name="rbac-policies-batch"),
     path("admin/rbac/assignments/", AssignmentListCreateView.as_view(), name="rbac-assignments"),
     path(
         "admin/rbac/assignments/remove/",
         AssignmentRemoveView.as_view(),
         name="rbac-assignments-remove",
     ),
+    path("admin/rbac/assignments/batch/", AssignmentBatchView.as_view(), name="rbac-assignments-batch"),
+    path("admin/rbac/cache/", DecisionCacheStatsView.as_view(), name="rbac-cache-stats"),
 ]
@@ -1,12 +1,51 @@
-from typing import Any, Dict, cast
+from typing import Any, Dict, List, cast
+
+from django.db import transaction
 
 from rest_framework import status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
-from .enforcer import get_enforcer, invalidate_enforcer_cache
+from .enforcer import decision_cache_stats, get_enforcer, invalidate_enforcer_cache
 from .permissions import CanManageRBAC
-from .serializers import AssignmentSerializer, PolicySerializer
+from .serializers import AssignmentBatchSerializer, AssignmentSerializer, PolicyBatchSerializer, PolicySerializer
+
+
+def _apply_batch(e, *, add: List[List[str]], remove: List[List[str]], grouping: bool) -> Dict[str, int]:
+    """Apply a batch of policy changes in one transaction and one invalidation.
+
+    Rules that are already present (add) or absent (remove) are skipped, since
+    Casbin's batch APIs reject the whole batch if any single rule is a no-op.
+    """
+
+    has = e.has_grouping_policy if grouping else e.has_policy
+    add_rules = e.add_grouping_policies if grouping else e.add_policies
+    remove_rules = e.remove_grouping_policies if grouping else e.remove_policies
+
+    to_remove: List[List[str]] = []
+    for rule in remove:
+        if rule not in to_remove and has(*rule):
+            to_remove.append(rule)
+    removing = {tuple(r) for r in to_remove}
+    to_add: List[List[str]] = []
+    for rule in add:
+        if rule not in to_add and (tuple(rule) in removing or not has(*rule)):
+            to_add.append(rule)
+
+    try:
+        with transaction.atomic():
+            if to_remove:
+                remove_rules(to_remove)
+            if to_add:
+                add_rules(to_add)
+    except Exception:
+        # The in-memory model may be ahead of the database now; reload from storage.
+        invalidate_enforcer_cache()
+        raise
+
+    if to_add or to_remove:
+        invalidate_enforcer_cache(reload=False)
+    return {'added': len(to_add), 'removed': len(to_remove)}
 
 
 class PolicyListCreateView(APIView):
@@ -28,7 +67,7 @@ class PolicyListCreateView(APIView):
 
         e = get_enforcer()
         ok = e.add_policy(d.get("sub", ""), d.get("dom", "*"), d.get("obj", ""), d.get("act", ""))
-        invalidate_enforcer_cache()
+        invalidate_enforcer_cache(reload=False)
         return Response({"ok": bool(ok)}, status=status.HTTP_201_CREATED)
 
 
@@ -42,10 +81,25 @@ class PolicyRemoveView(APIView):
 
         e = get_enforcer()
         ok = e.remove_policy(d.get("sub", ""), d.get("dom", "*"), d.get("obj", ""), d.get("act", ""))
-        invalidate_enforcer_cache()
+        invalidate_enforcer_cache(reload=False)
         return Response({"ok": bool(ok)})
 
 
+class PolicyBatchView(APIView):
+    permission_classes = [CanManageRBAC]
+
+    def post(self, request):
+        ser = PolicyBatchSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        d = cast(Dict[str, Any], ser.validated_data)
+
+        def rules(items):
+            return [[p.get("sub", ""), p.get("dom", "*"), p.get("obj", ""), p.get("act", "")] for p in items]
+
+        result = _apply_batch(get_enforcer(), add=rules(d.get("add") or []), remove=rules(d.get("remove") or []), grouping=False)
+        return Response({"ok": True, **result})
+
+
 class AssignmentListCreateView(APIView):
     permission_classes = [CanManageRBAC]
 
@@ -65,7 +119,7 @@ class AssignmentListCreateView(APIView):
 
         e = get_enforcer()
         ok = e.add_grouping_policy(d.get("user", ""), d.get("role", ""), d.get("dom", "*"))
-        invalidate_enforcer_cache()
+        invalidate_enforcer_cache(reload=False)
         return Response({"ok": bool(ok)}, status=status.HTTP_201_CREATED)
 
 
@@ -79,5 +133,27 @@ class AssignmentRemoveView(APIView):
 
         e = get_enforcer()
         ok = e.remove_grouping_policy(d.get("user", ""), d.get("role", ""), d.get("dom", "*"))
-        invalidate_enforcer_cache()
+        invalidate_enforcer_cache(reload=False)
         return Response({"ok": bool(ok)})
+
+
+class AssignmentBatchView(APIView):
+    permission_classes = [CanManageRBAC]
+
+    def post(self, request):
+        ser = AssignmentBatchSerializer(data=request.data)
+        ser.is_valid(raise_exception=True)
+        d = cast(Dict[str, Any], ser.validated_data)
+
+        def rules(items):
+            return [[g.get("user", ""), g.get("role", ""), g.get("dom", "*")] for g in items]
+
+        result = _apply_batch(get_enforcer(), add=rules(d.get("add") or []), remove=rules(d.get("remove") or []), grouping=True)
+        return Response({"ok": True, **result})
+
+
+class DecisionCacheStatsView(APIView):
+    permission_classes = [CanManageRBAC]
+
+    def get(self, request):
+        return Response(decision_cache_stats())
@@ -1,3 +1,31 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-# Create your tests here.
+from rest_framework.test import APIClient
+
+from forum.models import SearchOutbox
+
+from .models import ResourceEntry, ResourceLink
+
+
+class ResourceLinkSearchTests(TestCase):
+	def test_deleting_a_link_reindexes_its_resource(self):
+		user = get_user_model().objects.create_user(username='@sharer', password='pw')
+		resource = ResourceEntry.objects.create(created_by=user, title='r')
+		# Give the link an id that differs from the resource's.
+		ResourceLink.objects.create(resource=resource, link_type=ResourceLink.LinkType.OTHER, url='https://a.example/')
+		link = ResourceLink.objects.create(resource=resource, link_type=ResourceLink.LinkType.OTHER, url='https://b.example/')
+		SearchOutbox.objects.all().delete()
+
+		client = APIClient()
+		client.force_authenticate(user=user)
+		with mock.patch('forum.search_outbox.meili_enabled', return_value=True):
+			resp = client.delete(f'/api/links/{link.id}/')
+		self.assertEqual(resp.status_code, 204, resp.content)
+
+		self.assertEqual(
+			list(SearchOutbox.objects.values_list('entity', 'object_id', 'op')),
+			[(SearchOutbox.Entity.RESOURCES, resource.id, SearchOutbox.Op.UPSERT)],
+		)
@@ -1,3 +1,4 @@
+from django.db import transaction
 from django.db.models import Q
 from django.utils import timezone
 from django.utils.decorators import method_decorator
@@ -10,6 +11,8 @@ from rest_framework.response import Response
 from accounts.audit import write_audit_log
 from accounts.permissions import IsModerator
 from accounts.services import staff_allowed_board_ids, staff_can_delete_board, staff_can_moderate_board, try_consume_download_quota
+from forum.models import SearchOutbox
+from forum.search_outbox import enqueue_search_changes
 
 from .models import DownloadEvent, ResourceEntry, ResourceLink
 from .permissions import IsResourceOwnerOrStaff, IsResourceOwnerOrStaffOrReadOnly
@@ -40,7 +43,14 @@ class ResourceEntryViewSet(viewsets.ModelViewSet):
         if getattr(user, 'is_currently_muted', False):
             raise PermissionDenied('User is muted.')
         status_value = ResourceEntry.Status.PUBLISHED if user.is_staff else ResourceEntry.Status.PENDING
-        serializer.save(created_by=user, status=status_value)
+        with transaction.atomic():
+            resource = serializer.save(created_by=user, status=status_value)
+            enqueue_search_changes(SearchOutbox.Entity.RESOURCES, [resource.id])
+
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            resource = serializer.save()
+            enqueue_search_changes(SearchOutbox.Entity.RESOURCES, [resource.id])
 
     def destroy(self, request, *args, **kwargs):
         obj = self.get_object()
@@ -51,7 +61,11 @@ class ResourceEntryViewSet(viewsets.ModelViewSet):
                 board_id = getattr(getattr(obj, 'post', None), 'board_id', None)
                 if not staff_can_delete_board(user, board_id):
                     raise PermissionDenied('Not allowed for this board.')
-        return super().destroy(request, *args, **kwargs)
+        # Links are part of their resource's document: re-index the resource.
+        with transaction.atomic():
+            response = super().destroy(request, *args, **kwargs)
+            enqueue_search_changes(SearchOutbox.Entity.RESOURCES, [obj.resource_id])
+        return response
 
     @action(detail=True, methods=['post'], url_path='links/(?P<link_id>[^/.]+)/download', permission_classes=[permissions.IsAuthenticated])
     @method_decorator(ratelimit(key='ip', rate='30/m', block=True))
@@ -142,4 +156,8 @@ class ResourceLinkViewSet(viewsets.ModelViewSet):
                 board_id = getattr(getattr(resource, 'post', None), 'board_id', None)
                 if not staff_can_delete_board(user, board_id):
                     raise PermissionDenied('Not allowed for this board.')
-        return super().destroy(request, *args, **kwargs)
+        # Links are part of their resource's document: re-index the resource.
+        with transaction.atomic():
+            response = super().destroy(request, *args, **kwargs)
+            enqueue_search_changes(SearchOutbox.Entity.RESOURCES, [obj.resource_id])
+        return response
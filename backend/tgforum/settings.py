@@ -43,11 +43,33 @@ env = environ.Env(
 
     # Optional search engine (Meilisearch)
     # Notes:
-    # - If MEILI_URL is empty, the API will fall back to DB icontains search.
+    # - If MEILI_URL is empty, the API uses the database's own full-text search.
     # - Keep these as env-configurable to avoid hard dependency in dev.
     MEILI_URL=(str, ''),
     MEILI_API_KEY=(str, ''),
     MEILI_INDEX_POSTS=(str, 'posts'),
+    # Federated search (/api/search/all/) indexes.
+    MEILI_INDEX_COMMENTS=(str, 'comments'),
+    MEILI_INDEX_USERS=(str, 'users'),
+    MEILI_INDEX_TAGS=(str, 'tags'),
+    MEILI_INDEX_RESOURCES=(str, 'resources'),
+    # Per-call timeout for search requests, and the circuit breaker: after N
+    # consecutive errors or slow calls, search uses the database for a cool-down.
+    MEILI_TIMEOUT_SECONDS=(float, 2.0),
+    MEILI_BREAKER_FAILURES=(int, 5),
+    MEILI_BREAKER_SLOW_SECONDS=(float, 1.0),
+    MEILI_BREAKER_COOLDOWN_SECONDS=(float, 30.0),
+
+    # Moderation queue: claims older than this are treated as released.
+    DJANGO_MODERATION_CLAIM_TTL_MINUTES=(int, 30),
+
+    # Image processing (forum.image_jobs)
+    # - Uploads are stored as originals and re-encoded off the request.
+    # - WORKERS=0 processes inline right after the request's transaction commits.
+    # - At most MAX_QUEUED jobs wait in the pool; the rest stay pending for
+    #   `manage.py process_image_jobs`.
+    IMAGE_PROCESS_WORKERS=(int, 2),
+    IMAGE_PROCESS_MAX_QUEUED=(int, 16),
 )
 
 # Expose as a simple Django setting for app code.
@@ -230,6 +252,9 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # - Our image pipeline enforces per-image constraints in forum.image_utils.
 # - This setting prevents Django from rejecting larger multipart requests too early.
 DATA_UPLOAD_MAX_MEMORY_SIZE = 25 * 1024 * 1024  # 25MB
+# Uploaded files above this are spooled to a temp file instead of kept in memory
+# (Django's default, pinned here because the image pipeline relies on it).
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(2.5 * 1024 * 1024)
 
 
 # Logging (minimal, useful for审计/排错)
@@ -250,6 +275,21 @@ LOGGING = {
 MEILI_URL = env('MEILI_URL')
 MEILI_API_KEY = env('MEILI_API_KEY')
 MEILI_INDEX_POSTS = env('MEILI_INDEX_POSTS')
+MEILI_INDEX_COMMENTS = env('MEILI_INDEX_COMMENTS')
+MEILI_INDEX_USERS = env('MEILI_INDEX_USERS')
+MEILI_INDEX_TAGS = env('MEILI_INDEX_TAGS')
+MEILI_INDEX_RESOURCES = env('MEILI_INDEX_RESOURCES')
+MEILI_TIMEOUT_SECONDS = env.float('MEILI_TIMEOUT_SECONDS')
+MEILI_BREAKER_FAILURES = env.int('MEILI_BREAKER_FAILURES')
+MEILI_BREAKER_SLOW_SECONDS = env.float('MEILI_BREAKER_SLOW_SECONDS')
+MEILI_BREAKER_COOLDOWN_SECONDS = env.float('MEILI_BREAKER_COOLDOWN_SECONDS')
+
+# Moderation
+MODERATION_CLAIM_TTL_MINUTES = env.int('DJANGO_MODERATION_CLAIM_TTL_MINUTES')
+
+# Image processing
+IMAGE_PROCESS_WORKERS = env.int('IMAGE_PROCESS_WORKERS')
+IMAGE_PROCESS_MAX_QUEUED = env.int('IMAGE_PROCESS_MAX_QUEUED')
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
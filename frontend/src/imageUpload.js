@@ -20,3 +20,26 @@ export function validateSingleImageFile(file) {
   }
   return { ok: true, message: '' }
 }
+
+// Editor uploads are processed off-request: the upload returns a job
+// ({ id, status, url }) and we poll /api/posts/images/<id>/ until it is ready.
+const POLL_INTERVAL_MS = 700
+const POLL_TIMEOUT_MS = 60000
+
+export async function uploadEditorImage(api, file) {
+  const form = new FormData()
+  form.append('image', file)
+  let { data } = await api.post('/api/posts/images/upload/', form)
+  const deadline = Date.now() + POLL_TIMEOUT_MS
+  while (data && (data.status === 'pending' || data.status === 'processing')) {
+    if (Date.now() > deadline) throw new Error('图片处理超时，请稍后重试。')
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS))
+    ;({ data } = await api.get(`/api/posts/images/${data.id}/`))
+  }
+  if (data?.status === 'failed') {
+    const err = new Error(data.error || '图片处理失败。')
+    err.response = { data: { detail: data.error || '图片处理失败。' } }
+    throw err
+  }
+  return data?.url || ''
+}